@@ -164,6 +164,7 @@ class RequestHandler(webapp.RequestHandler):
         # TODO: Move this logic somewhere else and remove the restaurants import
         restaurants.LabelProvider().move_user_data(local_viewer, remote_viewer)
         remote_viewer.merge(local_viewer)
+        remote_session["viewer"] = remote_viewer
         
         local_session.kill()
         local_session = None
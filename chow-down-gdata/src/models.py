@@ -176,7 +176,18 @@ class FriendConnectUser(User):
     user = FriendConnectUser.get_or_insert(**params)
     user.__person = person
     return user
-    
+
+  def set_person(self, person):
+    """ Attaches OpenSocial Person data to a user read from the data store.
+
+    Unlike from_person, this does not touch the data store, so it can be used
+    when the user's record has already been fetched.
+
+    Args:
+      person: An OpenSocial Person object for this user.
+    """
+    self.__person = person
+
   @property
   def user_type(self):
     """ Gets a string representing the type of user this represents. 
@@ -19,6 +19,8 @@ __author__ = 'davidbyttow@google.com (David Byttow)'
 
 
 import httplib
+import Queue
+import threading
 import urllib
 import urlparse
 
@@ -31,6 +33,13 @@ from errors import *
 from request import *
 
 
+# The most requests sent in a single JSON-RPC call.
+MAX_BATCH_SIZE = 20
+
+# The most HTTP requests sent at once for a single batch.
+MAX_WORKERS = 4
+
+
 class ContainerConfig(object):
   """Setup parameters for connecting to a container."""
   
@@ -67,7 +76,8 @@ class ContainerContext(object):
 
   """
   
-  def __init__(self, config, url_fetch=None):
+  def __init__(self, config, url_fetch=None, max_batch_size=MAX_BATCH_SIZE,
+               max_workers=MAX_WORKERS):
     """Constructor for ContainerContext.
     
     If a UrlFetch implementation is not given, will attempt to construct
@@ -76,9 +86,16 @@ class ContainerContext(object):
     Args:
       config: The ContainerConfig to use for this connection.
       url_fetch: (optional) An implementation of the UrlFetch interface.
+      max_batch_size: int (optional) The most requests sent in a single 
+      JSON-RPC call. Larger batches are split.
+      max_workers: int (optional) The most HTTP requests sent at once for a
+      batch. The UrlFetch implementation must be safe to use from several
+      threads if this is more than 1.
 
     """
     self.config = config
+    self.max_batch_size = max_batch_size
+    self.max_workers = max_workers
     if not self.config:
       raise ConfigError('Invalid ContainerConfig.')
     self.url_fetch = url_fetch or http.get_default_urlfetch()
@@ -156,24 +173,43 @@ class ContainerContext(object):
   def send_request_batch(self, batch, use_rest=False):
     """Send a batch of requests.
     
-    Batches are only useful when RPC is supported. Otherwise, all requests
-    are sent synchronously. May throw a BadRequest, BadResponse or
-    UnauthorizedRequest exceptions.
+    When RPC is supported, the batch is split into JSON-RPC calls of at most
+    max_batch_size requests. Otherwise, every request is sent on its own. In
+    both cases up to max_workers HTTP requests are sent at once. Errors are
+    recorded in the batch for each request which failed, a BadRequest, 
+    BadResponse or UnauthorizedRequest exception for a whole JSON-RPC call 
+    is recorded for every request in it.
 
     Args:
       batch: The RequestBatch object.
       use_rest: bool (optional) If True, will just use the REST protocol.
 
     """
+    keys = batch.requests.keys()
     if not use_rest and self.supports_rpc():
-      self._send_rpc_requests(batch)
+      size = max(self.max_batch_size, 1)
+      chunks = [keys[i:i + size] for i in xrange(0, len(keys), size)]
+      send_chunk = lambda chunk: self._send_rpc_requests(batch, chunk)
+      outcomes = _run_concurrently(send_chunk, chunks, self.max_workers)
+      for chunk, (results, error) in zip(chunks, outcomes):
+        if error is not None:
+          results = dict([(key, (None, error)) for key in chunk])
+        for key, (data, error) in results.iteritems():
+          if error is None:
+            batch._set_data(key, data)
+          else:
+            batch._set_error(key, error)
     else:
       """REST protocol does not support batching, so just process each
       request individually.
       """
-      for key, request in batch.requests.iteritems():
-        result = self._send_rest_request(request)
-        batch._set_data(key, result)
+      send_one = lambda key: self._send_rest_request(batch.requests[key])
+      outcomes = _run_concurrently(send_one, keys, self.max_workers)
+      for key, (data, error) in zip(keys, outcomes):
+        if error is None:
+          batch._set_data(key, data)
+        else:
+          batch._set_error(key, error)
   
   def _send_rest_request(self, request):
     http_request = request.make_rest_request(self.config.server_rest_base)
@@ -181,14 +217,25 @@ class ContainerContext(object):
     json = self._handle_response(http_response)
     return request.process_json(json)
     
-  def _send_rpc_requests(self, batch):
+  def _send_rpc_requests(self, batch, keys):
+    """Sends some of the requests in a batch as one JSON-RPC call.
+    
+    Args:
+      batch: The RequestBatch object.
+      keys: list The keys of the requests to send.
+      
+    Returns: A dict mapping each key to a (data, error) tuple, in which error
+    is None if the request succeeded.
+
+    """
     rpcs = []
     id_to_key_map = {}
     query_params = {}
     """Build up a list of RPC calls. Also, create a mapping of RPC request id's
     to batch keys in order to populate the batch object with the responses.
     """
-    for key, request in batch.requests.iteritems():
+    for key in keys:
+      request = batch.requests[key]
       query_params.update(request.get_query_params())
       rpc_body = request.get_rpc_body()
       rpc_id = rpc_body.get('id')
@@ -203,13 +250,28 @@ class ContainerContext(object):
     http_response = self._send_http_request(http_request)
     json = self._handle_response(http_response)
     
-    """Pull out all of the results and insert them into the batch object."""
+    """Pull out all of the results. Requests which the container reported an
+    error for, or did not answer at all, get an error of their own.
+    """
+    results = {}
     for response in json:
-      id = response.get('id')
-      json = response.get('data')
-      key = id_to_key_map[id]
+      key = id_to_key_map.get(response.get('id'))
+      if key is None:
+        continue
+      if 'error' in response:
+        error = response.get('error') or {}
+        results[key] = (None, BatchRequestError(error.get('code'),
+                                                error.get('message')))
+        continue
       request = batch.requests[key]
-      batch._set_data(key, request.process_json(json))
+      try:
+        results[key] = (request.process_json(response.get('data')), None)
+      except Exception, e:
+        results[key] = (None, e)
+    for key in keys:
+      if key not in results:
+        results[key] = (None, BatchRequestError(None, 'No response'))
+    return results
       
   def _send_http_request(self, http_request):
     if self.config.security_token:
@@ -237,3 +299,49 @@ class ContainerContext(object):
       return json
     else:
       raise BadRequestError(http_response)
+
+
+def _run_concurrently(function, items, max_workers):
+  """Calls a function for every item, on up to max_workers threads.
+  
+  The calling thread is one of the workers. If no more threads can be 
+  started, for example in environments which do not allow threads, the 
+  calling thread handles all of the items.
+  
+  Args:
+    function: The function to call with each item.
+    items: list The items to pass to the function.
+    max_workers: int The most calls made at once.
+    
+  Returns: A list with a (result, error) tuple for each item, in the same
+  order, in which error is the exception raised by the call or None.
+
+  """
+  outcomes = [None] * len(items)
+  pending = Queue.Queue()
+  for index in xrange(len(items)):
+    pending.put(index)
+    
+  def work():
+    while True:
+      try:
+        index = pending.get_nowait()
+      except Queue.Empty:
+        return
+      try:
+        outcomes[index] = (function(items[index]), None)
+      except Exception, e:
+        outcomes[index] = (None, e)
+
+  threads = []
+  for i in xrange(min(max_workers, len(items)) - 1):
+    thread = threading.Thread(target=work)
+    try:
+      thread.start()
+    except Exception:
+      break
+    threads.append(thread)
+  work()
+  for thread in threads:
+    thread.join()
+  return outcomes
@@ -45,6 +45,20 @@ class BadRequestError(Error):
                                          self.response.content)
 
 
+class BatchRequestError(Error):
+  """Recorded when a single request in a batch fails.
+  
+  The rest of the batch may still have succeeded.
+
+  """
+  def __init__(self, code, description):
+    self.code = code
+    self.description = description
+    
+  def __str__(self):
+    return 'CODE: %s\nDESCRIPTION: %s' % (self.code, self.description)
+
+
 class UnauthorizedRequestError(Error):
   """Raised when a request failed due to bad authorization credentials."""
   def __init__(self, response):
@@ -227,11 +227,17 @@ class RpcRequestInfo(object):
 
 
 class RequestBatch(object):
-  """This class will manage the batching of requests."""
+  """This class will manage the batching of requests.
+  
+  Requests which fail do not fail the whole batch. Their errors are kept in
+  the errors dict, by request key.
+
+  """
   
   def __init__(self):
     self.requests = {}
     self.data = {}
+    self.errors = {}
   
   def add_request(self, key, request):
     """Adds a request to this batch.
@@ -252,14 +258,35 @@ class RequestBatch(object):
     """
     return self.data.get(key)
 
+  def get_error(self, key):
+    """Get the error for a given request key.
+    
+    Args:
+      key: str The key to retrieve.
+      
+    Returns: The exception recorded for the request, or None if it did not
+    fail.
+
+    """
+    return self.errors.get(key)
+
   def send(self, container):
     """Execute the batch with the specified container.
     
+    Errors for single requests are recorded in the errors dict. An error is
+    only raised if every request in the batch failed.
+    
     Args:
       container: The container to execute this batch on.
 
     """
+    self.errors.clear()
     container.send_request_batch(self, False)
+    if self.requests and len(self.errors) == len(self.requests):
+      raise self.errors.values()[0]
 
   def _set_data(self, key, data):
     self.data[key] = data
+
+  def _set_error(self, key, error):
+    self.errors[key] = error
@@ -16,10 +16,15 @@
 
 The following classes are exported:
   LabelProvider: Provides methods to work with saving bookmarks and invites.
+  RestaurantIndex: Answers restaurant searches from earlier search results.
   RestaurantProvider: Delivers restaurant data from a web service.
 """
 
 # Python imports
+import math
+import re
+import threading
+import time
 import urllib
 import logging
 
@@ -144,6 +149,333 @@ class LabelProvider(object):
       label.put()
     
     
+##### Geohashes #####
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def _geohash_encode(lat, lon, precision):
+  """ Gets the geohash of the cell which contains a point.
+  
+  Args:
+    lat: The latitude of the point.
+    lon: The longitude of the point.
+    precision: The number of characters in the geohash.  Five characters 
+        give cells about 5km wide.
+        
+  Returns:
+    The geohash string.
+  """
+  lat_range = [-90.0, 90.0]
+  lon_range = [-180.0, 180.0]
+  chars = []
+  bits = 0
+  bit_count = 0
+  use_lon = True
+  while len(chars) < precision:
+    if use_lon:
+      value, value_range = lon, lon_range
+    else:
+      value, value_range = lat, lat_range
+    middle = (value_range[0] + value_range[1]) / 2
+    bits <<= 1
+    if value >= middle:
+      bits |= 1
+      value_range[0] = middle
+    else:
+      value_range[1] = middle
+    use_lon = not use_lon
+    bit_count += 1
+    if bit_count == 5:
+      chars.append(_GEOHASH_ALPHABET[bits])
+      bits = 0
+      bit_count = 0
+  return "".join(chars)
+
+def _geohash_neighbors(lat, lon, precision):
+  """ Gets the geohashes of the cell containing a point and the cells around it.
+  
+  Args:
+    lat: The latitude of the point.
+    lon: The longitude of the point.
+    precision: The number of characters in each geohash.
+    
+  Returns:
+    A list of up to nine geohashes, starting with the cell of the point.
+  """
+  lon_bits = (precision * 5 + 1) // 2
+  lat_bits = precision * 5 // 2
+  lat_step = 180.0 / (1 << lat_bits)
+  lon_step = 360.0 / (1 << lon_bits)
+  hashes = []
+  for lat_offset in (0, -1, 1):
+    for lon_offset in (0, -1, 1):
+      cell_lat = lat + lat_offset * lat_step
+      if cell_lat < -90.0 or cell_lat > 90.0:
+        continue
+      cell_lon = (lon + lon_offset * lon_step + 180.0) % 360.0 - 180.0
+      geohash = _geohash_encode(cell_lat, cell_lon, precision)
+      if geohash not in hashes:
+        hashes.append(geohash)
+  return hashes
+
+def _distance(lat1, lon1, lat2, lon2):
+  """ Gets the approximate distance between two nearby points, in km. """
+  x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+  y = math.radians(lat2 - lat1)
+  return math.sqrt(x * x + y * y) * 6371.0
+
+def _tokenize(text):
+  """ Splits text into lowercased words for the search index. """
+  return re.findall(r"\w+", (text or "").lower(), re.UNICODE)
+
+
+class RestaurantIndex(object):
+  """ Answers restaurant searches from earlier search results.
+  
+  Restaurants returned by searches are kept in geohash cells, stored through
+  utils.cache_set under "search_cell".  Each cell has an inverted index from
+  words in the restaurant's name, its categories, and the search terms which 
+  returned it, to the restaurant's ID.  Location strings are resolved to the
+  center of the restaurants found for them, since this site has no geocoder.
+
+  A search is answered from the cells around the location when they hold
+  enough restaurants matching every word of the term, or when the same term
+  was searched there recently and found no more than the index holds.  
+  Restaurants fetched more than settings.SEARCH_INDEX_MAX_AGE seconds ago are
+  not used.
+
+  Counters for every index in this instance are returned by stats.
+  """
+  _stats_lock = threading.Lock()
+  _stats = {
+    "searches" : 0,
+    "index_hits" : 0,
+    "gap_fills" : 0,
+    "misses" : 0,
+    "served" : 0,
+    "served_age_total" : 0.0,
+    "served_age_max" : 0.0,
+  }
+
+  def __init__(self, precision=None, max_age=None, cell_size=None):
+    """ Constructor.
+    
+    Args:
+      precision: The length of the geohashes used for cells, 
+          settings.SEARCH_INDEX_PRECISION by default.
+      max_age: The time in seconds after which indexed restaurants are not 
+          used, settings.SEARCH_INDEX_MAX_AGE by default.
+      cell_size: The number of restaurants kept in each cell, 
+          settings.SEARCH_INDEX_CELL_SIZE by default.  The restaurants fetched
+          longest ago are dropped first.
+    """
+    self.precision = precision or settings.SEARCH_INDEX_PRECISION
+    self.max_age = max_age or settings.SEARCH_INDEX_MAX_AGE
+    self.cell_size = cell_size or settings.SEARCH_INDEX_CELL_SIZE
+
+  def _location_key(self, location):
+    words = " ".join(_tokenize(location)).encode("utf-8")
+    return hashlib.sha1(words).hexdigest()
+
+  def _query_key(self, term):
+    return " ".join(sorted(set(_tokenize(term))))
+
+  def get_center(self, location):
+    """ Gets the point which a location string was resolved to.
+    
+    Args:
+      location: A string representing the location to search in.  Case, 
+          punctuation and spacing are ignored.
+          
+    Returns:
+      A (lat, lon) tuple, or None if the location has not been searched.
+    """
+    return utils.cache_get("search_location", self._location_key(location))
+
+  def search(self, term, location, limit):
+    """ Searches the index for restaurants near a location.
+    
+    Args:
+      term: The search term to use.  Restaurants must match every word.
+      location: A string representing the location to search in.
+      limit: The number of restaurants wanted.
+      
+    Returns:
+      A (restaurants, complete) tuple.  restaurants is a list of up to limit 
+      models.Restaurant objects, nearest first.  complete is True if the 
+      list can be used as the search result without asking the web service.
+    """
+    self._count("searches")
+    center = self.get_center(location)
+    if center is None:
+      self._count("misses")
+      return [], False
+
+    now = time.time()
+    words = set(_tokenize(term))
+    hashes = _geohash_neighbors(center[0], center[1], self.precision)
+    cells = utils.cache_get_multi(hashes, "search_cell")
+    matches = {}
+    for cell in cells.itervalues():
+      ids = None
+      for word in words:
+        word_ids = cell["terms"].get(word, ())
+        if ids is None:
+          ids = set(word_ids)
+        else:
+          ids.intersection_update(word_ids)
+      if ids is None:
+        ids = cell["restaurants"].keys()
+      for restaurant_id in ids:
+        restaurant, fetched = cell["restaurants"][restaurant_id]
+        if now - fetched > self.max_age:
+          continue
+        distance = _distance(center[0], center[1], restaurant.location.lat,
+                             restaurant.location.lon)
+        matches[restaurant_id] = (distance, fetched, restaurant)
+
+    ordered = sorted(matches.values())[:limit]
+    complete = len(ordered) >= limit
+    center_cell = cells.get(hashes[0])
+    if not complete and center_cell:
+      # A recent web service search for the same term found no more 
+      # restaurants than the index holds, so asking again would not help.
+      query = self._query_key(term)
+      asked = center_cell["queries"].get(query)
+      found = center_cell["query_counts"].get(query, 0)
+      complete = (asked is not None and now - asked <= self.max_age and
+                  len(ordered) >= found)
+    if complete:
+      self._count("index_hits")
+      for distance, fetched, restaurant in ordered:
+        self._count_served(now - fetched)
+    elif ordered:
+      self._count("gap_fills")
+    else:
+      self._count("misses")
+    return [restaurant for distance, fetched, restaurant in ordered], complete
+
+  def add(self, term, location, restaurants):
+    """ Adds the results of a web service search to the index.
+    
+    Args:
+      term: The search term which was used.
+      location: The location string which was used.
+      restaurants: The list of models.Restaurant objects which were found,
+          which may be empty.
+    """
+    now = time.time()
+    center = self.get_center(location)
+    if center is None:
+      if not restaurants:
+        return
+      lat = sum([r.location.lat for r in restaurants]) / len(restaurants)
+      lon = sum([r.location.lon for r in restaurants]) / len(restaurants)
+      center = (lat, lon)
+      utils.cache_set(center, "search_location", self._location_key(location),
+                      time=self.max_age)
+
+    center_hash = _geohash_encode(center[0], center[1], self.precision)
+    by_cell = {}
+    for restaurant in restaurants:
+      geohash = _geohash_encode(restaurant.location.lat, 
+                                restaurant.location.lon, self.precision)
+      by_cell.setdefault(geohash, []).append(restaurant)
+    hashes = by_cell.keys()
+    if center_hash not in by_cell:
+      hashes.append(center_hash)
+    cells = utils.cache_get_multi(hashes, "search_cell")
+
+    term_words = _tokenize(term)
+    for geohash in hashes:
+      cell = cells.get(geohash)
+      if cell is None:
+        cell = {"restaurants" : {}, "terms" : {}, "queries" : {}, 
+                "query_counts" : {}}
+        cells[geohash] = cell
+      for restaurant in by_cell.get(geohash, []):
+        cell["restaurants"][restaurant.restaurant_id] = (restaurant, now)
+        words = term_words + _tokenize(restaurant.name)
+        for category in restaurant.categories:
+          words.extend(_tokenize(category))
+        for word in words:
+          cell["terms"].setdefault(word, set()).add(restaurant.restaurant_id)
+      if geohash == center_hash:
+        cell["queries"][self._query_key(term)] = now
+        cell["query_counts"][self._query_key(term)] = len(restaurants)
+      self._prune(cell, now)
+    utils.cache_set_multi(cells, "search_cell", time=self.max_age)
+
+  def _prune(self, cell, now):
+    """ Drops expired restaurants, and the oldest ones if the cell is full. """
+    restaurants = cell["restaurants"]
+    by_age = sorted([(fetched, restaurant_id) for restaurant_id, 
+                     (restaurant, fetched) in restaurants.iteritems()])
+    dropped = set()
+    for fetched, restaurant_id in by_age:
+      if now - fetched > self.max_age or (
+          len(restaurants) - len(dropped) > self.cell_size):
+        dropped.add(restaurant_id)
+    if not dropped:
+      return
+    for restaurant_id in dropped:
+      del restaurants[restaurant_id]
+    for word, ids in cell["terms"].items():
+      ids.difference_update(dropped)
+      if not ids:
+        del cell["terms"][word]
+    for query, asked in cell["queries"].items():
+      if now - asked > self.max_age:
+        del cell["queries"][query]
+        cell["query_counts"].pop(query, None)
+
+  @classmethod
+  def _count(cls, name, amount=1):
+    cls._stats_lock.acquire()
+    try:
+      cls._stats[name] += amount
+    finally:
+      cls._stats_lock.release()
+
+  @classmethod
+  def _count_served(cls, age):
+    cls._stats_lock.acquire()
+    try:
+      cls._stats["served"] += 1
+      cls._stats["served_age_total"] += age
+      cls._stats["served_age_max"] = max(cls._stats["served_age_max"], age)
+    finally:
+      cls._stats_lock.release()
+
+  @classmethod
+  def stats(cls):
+    """ Returns counters for the searches made in this instance.
+    
+    Returns:
+      A dict with the following keys: searches counts the calls to search, 
+      index_hits those answered from the index, gap_fills those where the 
+      index had some but not enough restaurants, and misses those where it 
+      had none.  hit_rate is the share of searches answered from the index.
+      served counts the restaurants returned from the index, and 
+      served_age_mean and served_age_max give their age in seconds.
+    """
+    cls._stats_lock.acquire()
+    try:
+      stats = dict(cls._stats)
+    finally:
+      cls._stats_lock.release()
+    hit_rate = 0.0
+    if stats["searches"]:
+      hit_rate = float(stats["index_hits"]) / stats["searches"]
+    stats["hit_rate"] = hit_rate
+    served_age_mean = 0.0
+    if stats["served"]:
+      served_age_mean = stats["served_age_total"] / stats["served"]
+    stats["served_age_mean"] = served_age_mean
+    del stats["served_age_total"]
+    return stats
+    
+    
 class RestaurantProvider(object):
   """ Provides data about restaurants from the YQL web service.
   
@@ -160,6 +492,7 @@ class RestaurantProvider(object):
         "id", "Title", "Address", "City", "State", "Rating.AverageRating", 
         "Rating.TotalRatings", "BusinessUrl", "Categories", "Latitude", 
         "Longitude"])
+    self.index = RestaurantIndex()
         
   def _cache_restaurant(self, restaurant):
     """ Stores a restaurant in the memory cache.
@@ -230,6 +563,9 @@ class RestaurantProvider(object):
   def _yql_query(self, query):
     """ Performs a query on the YQL web service interface.
     
+    Results are cached by the query's hash.  Queries which return nothing are
+    cached too, for a shorter time, so they are not repeated on every request.
+
     Args:
       query: A string query in the YQL query syntax.
       
@@ -238,29 +574,36 @@ class RestaurantProvider(object):
       was passed back.  None otherwise.
     """
     query_hash = hashlib.sha1(query).hexdigest()
-    result = utils.cache_get("yql_query", query_hash)
-    if result is None:
-      logging.info("Fetching yql query: %s" % query)
-      query = urllib.quote_plus(query)
-      url = "http://query.yahooapis.com/v1/public/yql?q=%s&format=json" % query
-      response = simplejson.loads(urlfetch.fetch(url).content)
-      
-      if response is None:
-        return None
+    return utils.cache_get_or_set(lambda: self._yql_fetch(query),
+                                  "yql_query", query_hash)
+
+  def _yql_fetch(self, query):
+    """ Sends a query to the YQL web service, without caching.
+    
+    Args:
+      query: A string query in the YQL query syntax.
       
-      response = response["query"]
+    Returns:
+      If a result was returned, a dict representing the data structure which
+      was passed back.  None otherwise.
+    """
+    logging.info("Fetching yql query: %s" % query)
+    query = urllib.quote_plus(query)
+    url = "http://query.yahooapis.com/v1/public/yql?q=%s&format=json" % query
+    response = simplejson.loads(urlfetch.fetch(url).content)
     
-      if response is None or int(response["count"]) == 0:
-        return None
-        
-      # Result set is inconsistent if there is only one result
-      if int(response["count"]) == 1:
-        result = [response["results"]["Result"]]
-      else:
-        result = response["results"]["Result"]
-        
-      utils.cache_set(result, "yql_query", query_hash) 
-    return result
+    if response is None:
+      return None
+    
+    response = response["query"]
+  
+    if response is None or int(response["count"]) == 0:
+      return None
+      
+    # Result set is inconsistent if there is only one result
+    if int(response["count"]) == 1:
+      return [response["results"]["Result"]]
+    return response["results"]["Result"]
     
   def _yql_restaurant_search(self, term, location):
     """ Performs a Yahoo! local search, limiting results to restaurants only.
@@ -337,6 +680,10 @@ class RestaurantProvider(object):
     not necessarily written to the data store, to prevent the store being
     flooded with every search result.  This way, we only store restaurants that
     have been bookmarked by at least one user.
+
+    Searches are answered from the RestaurantIndex when it holds fresh enough
+    results for the term near the location.  Otherwise the web service is 
+    searched and its results are added to the index.
     
     Args:
       term: The search term to use.
@@ -346,7 +693,13 @@ class RestaurantProvider(object):
       A list of models.Restaurant objects corresponding to the results of the
       query, or None if no restaurants were found.
     """
+    indexed, complete = self.index.search(term, location, 
+                                          settings.SEARCH_RESULTS)
+    if complete:
+      return indexed or None
+
     restaurants = self._yql_restaurant_search(term, location)
+    self.index.add(term, location, restaurants or [])
     if restaurants:
       for restaurant in restaurants:
         self._cache_restaurant(restaurant)
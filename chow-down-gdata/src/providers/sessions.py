@@ -16,6 +16,10 @@
 
 The following classes are exported:
   SessionProvider: Acts as a dict to store data for a user across many requests.
+  SessionMiddleware: Writes the sessions used by a request once it is done.
+
+The following methods are exported:
+  flush_sessions: Writes every session opened during the current request.
 """
 
 # Python imports
@@ -33,13 +37,21 @@ import controller
 import settings
 import utils 
 
+# Sessions opened during the current request, written by flush_sessions.
+_open_sessions = []
+
+
 class SessionProvider(dict):
   """ Acts as a dict to store data for a user across many requests.
   
   All session data is stored as a dictionary written to memcache.  When the
   data times out of memcache, then the session is expired and all data
-  will be lost.  Data cached as a property of this object and written to 
-  memcache upon write, but not fetched from memcache upon read.  Theoretically
+  will be lost.  Data is cached as a property of this object and written to
+  memcache once, when the request is done, if any item was set or deleted.
+  Changing a stored object in place does not mark the session as changed, so
+  the object has to be set again.  Sessions which were not changed are only
+  written again every settings.SESSION_TOUCH_INTERVAL seconds to refresh 
+  their timeout, reusing the data which was read.  Theoretically
   this means that there could be multiple session provider objects instantiated
   for the same session overwriting each other's data, but the extra complexity
   of avoiding this was undesirable for what is essentially a sample about
@@ -48,8 +60,9 @@ class SessionProvider(dict):
   instead of rolling their own- Django has an implementation which works on
   App Engine.
   
-  When this object is garbage collected, it attempts to write its local data
-  back into memcache.
+  Sessions are written by flush_sessions, which SessionMiddleware calls at
+  the end of each request.  When this object is garbage collected, it also 
+  attempts to write its local data back into memcache.
   
   SessionProvider inherits from dict, so you can do the following:
       session = SessionProvider()
@@ -59,6 +72,9 @@ class SessionProvider(dict):
   """
   __key = None
   __killed = False
+  __dirty = False
+  __written = None
+  __stored_data = None
   
   def __new__(cls, key=None, auto_create=False):
     """ Gets a session with the corresponding key.
@@ -78,15 +94,43 @@ class SessionProvider(dict):
     if key is None:
       key = SessionProvider.generate_session_key()
     else:
-      data = utils.cache_get("session", key)
-      if data is not None:
-        session = pickle.loads(data)
+      session = cls._read_session(key)
         
-    if not session:    
+    if session is None:
       session = dict.__new__(cls, {})
       session.__key = key
       session["started"] = time.time()
       
+    _open_sessions.append(session)
+    return session
+
+  @classmethod
+  def _read_session(cls, key):
+    """ Reads a session from the memory cache.
+    
+    Args:
+      key: The key corresponding to the session to read.
+      
+    Returns:
+      A SessionProvider holding the stored data, or None if no session was
+      stored with the given key.
+    """
+    data = utils.cache_get("session", key)
+    if data is None:
+      return None
+
+    session = dict.__new__(cls, {})
+    session.__key = key
+    if isinstance(data, tuple):
+      session.__written, session.__stored_data = data
+      dict.update(session, pickle.loads(session.__stored_data))
+    else:
+      # Sessions used to be stored by pickling the whole object.  Rewrite 
+      # them in the current format.
+      old_session = pickle.loads(data)
+      old_session.__killed = True
+      dict.update(session, old_session)
+      session.__dirty = True
     return session
     
   def __init__(self, *args, **kwargs):
@@ -96,14 +140,11 @@ class SessionProvider(dict):
   def __del__(self):
     """ Writes the current data to the session when this object is collected.
     
-    When the session provider is garbage collected, the session data which 
-    is stored as a property on the object is written to the data store again.
-    This is mostly to refresh the session timeout value, so that the session
-    is deleted settings.SESSION_TIMEOUT seconds from its last access, not its
-    last write.
+    Sessions are normally written by flush_sessions at the end of the 
+    request, in which case this does nothing.
     """
     try:
-      self._write_session()
+      self.save()
       logging.info("Session garbage collection cleanup succeeded")
     except Exception:
       logging.critical("Session garbage collection cleanup failed")
@@ -111,14 +152,14 @@ class SessionProvider(dict):
   def __setitem__(self, key, value):
     """ Stores an item in the session.
     
-    Writes the entire session data to the memory cache.
+    The session is marked as changed, to be written when the request is done.
     
     Args:
       key: The key under which to store this data.  
       value: The value to store.
     """
     super(SessionProvider, self).__setitem__(key, value)
-    self._write_session()  
+    self.__dirty = True
     
   def __getitem__(self, key):
     """ Gets an item from the session.
@@ -145,20 +186,33 @@ class SessionProvider(dict):
       key: The key corresponding to the data to be removed.
     """
     super(SessionProvider, self).__delitem__(key)
-    self._write_session()
+    self.__dirty = True
     
-  def _write_session(self):
-    """ Writes a serialized version of this object to the memory cache.
+  def save(self):
+    """ Writes the session to the memory cache if needed.
     
-    This method writes the serialized version of this class to the memory cache
-    for settings.SESSION_TIMEOUT seconds from now, meaning that all session 
-    data is cleared that many seconds from its last write.
+    A changed session is serialized with the binary pickle protocol and 
+    written to the memory cache for settings.SESSION_TIMEOUT seconds from 
+    now, meaning that all session data is cleared that many seconds from its
+    last write.  An unchanged session is only written again if it was last
+    written more than settings.SESSION_TOUCH_INTERVAL seconds ago, using the
+    serialized data which was read, so the timeout is refreshed without 
+    serializing the session again.
     
     If the session has been marked as being "killed", no data will be written.
     """
-    if not self.__killed:
-      lifespan = settings.SESSION_TIMEOUT
-      utils.cache_set(pickle.dumps(self), "session", self.key, time=lifespan)
+    if self.__killed:
+      return
+    now = time.time()
+    if self.__dirty or self.__stored_data is None:
+      self.__stored_data = pickle.dumps(dict(self), pickle.HIGHEST_PROTOCOL)
+    elif now - self.__written < settings.SESSION_TOUCH_INTERVAL:
+      return
+    self.__dirty = False
+    self.__written = now
+    lifespan = settings.SESSION_TIMEOUT
+    utils.cache_set((now, self.__stored_data), "session", self.key,
+                    time=lifespan)
 
   @property
   def key(self):
@@ -207,3 +261,38 @@ class SessionProvider(dict):
     """
     return utils.cache_get("session", session_key) is not None
     
+
+
+def flush_sessions():
+  """ Writes every session opened during the current request. 
+  
+  Each session is written at most once, see SessionProvider.save.
+  """
+  while _open_sessions:
+    session = _open_sessions.pop()
+    try:
+      session.save()
+    except Exception:
+      logging.exception("Could not write session %s" % session.key)
+
+
+class SessionMiddleware(object):
+  """ Writes the sessions used by a request once it is done. 
+  
+  Wraps a WSGI application so that flush_sessions is called after the 
+  response has been written.
+  """
+  def __init__(self, application):
+    """ Constructor.
+    
+    Args:
+      application: The WSGI application to wrap.
+    """
+    self.application = application
+    
+  def __call__(self, environ, start_response):
+    """ Runs the wrapped application, then writes the sessions. """
+    try:
+      return self.application(environ, start_response)
+    finally:
+      flush_sessions()
@@ -39,6 +39,11 @@ class UserProvider(object):
   
   Provides methods to register, authenticate, and fetch data about local 
   users.  
+
+  A provider is created for each request, so users fetched by their key names
+  are remembered for the rest of the request.  Views which show many users 
+  should pass every key name they need to prefetch_users first, so that all
+  of them are fetched together by the next lookup.
   """
   def __init__(self, session):
     """ Initialize with a session object for storing data. 
@@ -47,6 +52,8 @@ class UserProvider(object):
       A sessions.SessionProvider object which can be used to persist data.
     """
     self._session = session
+    self._loaded_users = {}
+    self._pending_key_names = set()
         
   def __hash_password(self, password):
     """ Converts a password into a hashed value.
@@ -113,10 +120,27 @@ class UserProvider(object):
     if users:
       return users[0]
     return None
+
+  def prefetch_users(self, key_names):
+    """ Marks users to be fetched by the next call to get_users_by_key_name.
+
+    Nothing is fetched by this method.  The users are fetched together with
+    the ones passed to the next lookup, so a view can collect the key names
+    for a whole page and then look them up piece by piece.
+
+    Args:
+      key_names: A collection of database keys representing users.
+    """
+    for key_name in key_names:
+      if key_name not in self._loaded_users:
+        self._pending_key_names.add(key_name)
     
   def get_users_by_key_name(self, key_names):
     """ Returns several users by their database key names.
     
+    Users which have not been fetched during this request are fetched 
+    together with any users marked by prefetch_users.
+
     Args:
       key_names: A collection of database keys representing users.
       
@@ -125,13 +149,37 @@ class UserProvider(object):
       value is the user object itself.  Invalid keys are not represented
       in the returned object.
     """
-    users = models.User.get_by_key_name(key_names)
+    self.prefetch_users(key_names)
+    if self._pending_key_names:
+      pending = list(self._pending_key_names)
+      self._pending_key_names.clear()
+      loaded = self._load_users(pending)
+      for key_name in pending:
+        self._loaded_users[key_name] = loaded.get(key_name)
+
     result = {}
-    for user in users:
+    for key_name in key_names:
+      user = self._loaded_users.get(key_name)
       if user:
         result[user.provider_id] = user
       
     return result
+
+  def _load_users(self, key_names):
+    """ Fetches users from the data store with a single batch get.
+
+    Args:
+      key_names: A list of database keys representing users.
+
+    Returns:
+      A dict mapping each key name which matched a user to the user object.
+    """
+    result = {}
+    users = models.User.get_by_key_name(key_names)
+    for key_name, user in zip(key_names, users):
+      if user:
+        result[key_name] = user
+    return result
     
   def authenticate(self, user_name, password):
     """ Authenticates user credentials and registers a viewer if valid.
@@ -230,6 +278,16 @@ class TwoLeggedProvider(UserProvider):
           cache key.
     """
     utils.cache_set(user, "fcuser", user.provider_id)
+
+  def _cache_users(self, users):
+    """ Stores several Friend Connect users in the cache with one call.
+
+    Args:
+      users: A list of users to store in the cache.
+    """
+    if users:
+      mapping = dict((user.provider_id, user) for user in users)
+      utils.cache_set_multi(mapping, "fcuser")
     
   def _cache_get_user(self, user_id):
     """ Gets a Friend Connect user from the cache.
@@ -240,7 +298,20 @@ class TwoLeggedProvider(UserProvider):
     Returns:
       The user with the specified ID if they exist in the cache, None otherwise.
     """
-    utils.cache_get("fcuser", user_id)
+    return utils.cache_get("fcuser", user_id)
+
+  def _cache_get_users(self, user_ids):
+    """ Gets several Friend Connect users from the cache with one call.
+
+    Args:
+      user_ids: The IDs of the users to fetch from the cache.
+
+    Returns:
+      A dict mapping the ID of each user found in the cache to the user.
+    """
+    if not user_ids:
+      return {}
+    return utils.cache_get_multi(user_ids, "fcuser")
     
   def get_profile_fields(self):
     """ Returns a list of profile fields to request from Friend Connect.
@@ -253,51 +324,58 @@ class TwoLeggedProvider(UserProvider):
     """
     return [ "profileUrl" ]
 
-  def get_users_by_key_name(self, user_keys):
-    """ Returns a list of users given their database keys.
+  def _load_users(self, key_names):
+    """ Fetches users and attaches their Friend Connect profiles.
     
     The base class implements this function by pulling models.User instances
     from the data store by their database key.  However, in the case of 
     Friend Connect users, the models.FriendConnectUser instances returned
     will not have profile information attached because that information is
     not stored in the data store.  This method extends the base implementation
-    by seeing which FriendConnectUsers have been returned and then creating
-    a batch OpenSocial request to pull each record from the Friend Connect
-    servers.  Caching is used to limit the amount of requests that have to
-    be made to the remote servers.
+    by looking up all of the returned FriendConnectUsers in the cache with 
+    one call, and then creating a single batch OpenSocial request to pull 
+    the remaining records from the Friend Connect servers.
     
     Args:
-      user_keys: A collection of database keys representing users.
+      key_names: A list of database keys representing users.
       
     Returns:
-      A dict where the key corresponds with the user's provider ID and the
-      value is the user object itself.  Invalid keys are not represented
-      in the returned object.  FriendConnectUser objects are populated with
-      data from the Friend Connect servers.
+      A dict mapping each key name which matched a user to the user object.
+      FriendConnectUser objects are populated with data from the cache or 
+      the Friend Connect servers where it was available.
     """
-    users = super(TwoLeggedProvider, self).get_users_by_key_name(user_keys)
-    
+    users = super(TwoLeggedProvider, self)._load_users(key_names)
+    friendconnect_users = {}
+    for key_name, user in users.iteritems():
+      if isinstance(user, models.FriendConnectUser):
+        friendconnect_users[key_name] = user
+    if not friendconnect_users:
+      return users
+
+    provider_ids = [user.provider_id for user in friendconnect_users.values()]
+    cached_users = self._cache_get_users(provider_ids)
     batch_added = False
     batch = opensocial.RequestBatch()
-    for user_id, user in users.iteritems():
-      if isinstance(user, models.FriendConnectUser):
-        cached_user = self._cache_get_user(user.provider_id)
-        if cached_user:
-          users[cached_user.provider_id] = cached_user
-        else:
-          batch_added = True
-          params = [ user_id, self.get_profile_fields() ]
-          request = opensocial.request.FetchPersonRequest(*params)       
-          batch.add_request("user%s" % user_id, request)
+    for key_name, user in friendconnect_users.iteritems():
+      cached_user = cached_users.get(user.provider_id)
+      if cached_user:
+        users[key_name] = cached_user
+      else:
+        batch_added = True
+        params = [ user.provider_id, self.get_profile_fields() ]
+        request = opensocial.request.FetchPersonRequest(*params)       
+        batch.add_request("user%s" % user.provider_id, request)
 
     try:
       if batch_added:
         batch.send(self.__container)
-        for user_id, user in users.iteritems():
-          person = batch.get("user%s" % user_id)
-          parsed_user = models.FriendConnectUser.from_person(person)
-          users[user_id] = parsed_user
-          self._cache_user(parsed_user)
+        fetched_users = []
+        for key_name, user in friendconnect_users.iteritems():
+          person = batch.get("user%s" % user.provider_id)
+          if person:
+            user.set_person(person)
+            fetched_users.append(user)
+        self._cache_users(fetched_users)
     except:
       logging.exception("OpenSocial Exception")
       
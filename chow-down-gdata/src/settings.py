@@ -34,12 +34,24 @@ except ImportError:
 SITE_TITLE = "The Chow Down"
 DEBUG = False
 CACHE_TIME = 3600
+NEGATIVE_CACHE_TIME = 300
+CACHE_STALE_TIME = 300
+CACHE_LOCK_TIME = 30
+LOCAL_CACHE_SIZE = 1000
+LOCAL_CACHE_TIME = 60
+# Keys which are read, changed and written back, such as "search_cell", must
+# not be listed here, or a stale local copy would overwrite newer data.
+LOCAL_CACHE_PREFIXES = ("fcuser", "restaurant", "yql_query", "search_location")
 FRIEND_PAGE_SIZE = 2        
 URL_TEMPLATE_THUMBNAIL = "/static/profilephotos/%s"
 SEARCH_RESULTS = 5
+SEARCH_INDEX_PRECISION = 5
+SEARCH_INDEX_MAX_AGE = 1800
+SEARCH_INDEX_CELL_SIZE = 200
 
 # Session settings
 SESSION_TIMEOUT = 3600
+SESSION_TOUCH_INTERVAL = 300
 SESSION_COOKIE_PATH = "/"
 SESSION_COOKIE_NAME = "sessid"
 
@@ -14,10 +14,23 @@
 
 """ Utility methods for the general functionality of this application.
 
+Cached data is kept in memcache.  Keys whose first part is listed in 
+settings.LOCAL_CACHE_PREFIXES are also kept for a short time in a bounded
+cache inside the running instance, so hot keys do not need a memcache round
+trip on every request.
+
+The following classes are exported:
+  LocalCache: A bounded in-process cache which drops the least recently used
+      entries.
+
 The following methods are exported:
   cache_set: Sets an object to a memory cache.
   cache_get: Gets an object from a memory cache.
   cache_delete: Deletes an object from a memory cache.
+  cache_get_multi: Gets several objects from a memory cache in one call.
+  cache_set_multi: Sets several objects to a memory cache in one call.
+  cache_get_or_set: Gets an object from a memory cache or computes it once.
+  cache_stats: Returns hit and miss counters for the memory caches.
   cache: Decorator which caches the result of the method which it decorates.
   require_login_or_redirect: Redirects the user if they are not logged in.
   require_loggedout_or_redirect: Redirects the user if they are logged in.
@@ -25,6 +38,12 @@ The following methods are exported:
 
 # Python imports
 import logging
+import threading
+import time
+try:
+  import cPickle as pickle
+except ImportError:
+  import pickle
 
 # AppEngine imports
 from google.appengine.api import memcache
@@ -33,6 +52,183 @@ from google.appengine.ext import db
 # Local imports
 import settings
 import models
+
+##### Local Cache #####
+
+class LocalCache(object):
+  """ A bounded in-process cache which drops the least recently used entries.
+  
+  Entries are kept in a dict for lookups and in a circular linked list ordered
+  by use, so lookups, updates and evictions take constant time.  Data is 
+  stored pickled, the same as in memcache, so a caller which changes an 
+  object it got from the cache does not change the cached copy.
+  """
+  # Positions in the list kept for each entry.
+  _PREV, _NEXT, _KEY, _DATA, _EXPIRES = range(5)
+
+  def __init__(self, max_entries=1000):
+    """ Creates an empty cache.
+    
+    Args:
+      max_entries: The number of entries to keep.  When the cache is full,
+          the least recently used entry is dropped.
+    """
+    self.max_entries = max_entries
+    self._entries = {}
+    self._root = [None, None, None, None, None]
+    self._root[self._PREV] = self._root[self._NEXT] = self._root
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    """ Gets an object from the cache.
+    
+    Args:
+      key: The cache key.
+      
+    Returns:
+      A (found, data) tuple.  found is False if the key was not in the cache
+      or had expired, in which case data is None.
+    """
+    self._lock.acquire()
+    try:
+      link = self._entries.get(key)
+      if link is None:
+        return False, None
+      self._unlink(link)
+      if link[self._EXPIRES] <= time.time():
+        del self._entries[key]
+        return False, None
+      self._link_first(link)
+      pickled = link[self._DATA]
+    finally:
+      self._lock.release()
+    return True, pickle.loads(pickled)
+
+  def set(self, key, data, lifespan):
+    """ Sets an object to the cache.
+    
+    Args:
+      key: The cache key.
+      data: The data to cache.
+      lifespan: The time in seconds that the object may be held in the cache.
+    """
+    pickled = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+    expires = time.time() + lifespan
+    self._lock.acquire()
+    try:
+      link = self._entries.get(key)
+      if link is None:
+        link = [None, None, key, pickled, expires]
+        self._entries[key] = link
+      else:
+        self._unlink(link)
+        link[self._DATA] = pickled
+        link[self._EXPIRES] = expires
+      self._link_first(link)
+      while len(self._entries) > self.max_entries:
+        oldest = self._root[self._PREV]
+        self._unlink(oldest)
+        del self._entries[oldest[self._KEY]]
+    finally:
+      self._lock.release()
+
+  def delete(self, key):
+    """ Deletes an object from the cache. 
+    
+    Args:
+      key: The cache key.
+    """
+    self._lock.acquire()
+    try:
+      link = self._entries.pop(key, None)
+      if link is not None:
+        self._unlink(link)
+    finally:
+      self._lock.release()
+
+  def clear(self):
+    """ Deletes every object from the cache. """
+    self._lock.acquire()
+    try:
+      self._entries.clear()
+      self._root[self._PREV] = self._root[self._NEXT] = self._root
+    finally:
+      self._lock.release()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def _unlink(self, link):
+    link[self._PREV][self._NEXT] = link[self._NEXT]
+    link[self._NEXT][self._PREV] = link[self._PREV]
+
+  def _link_first(self, link):
+    first = self._root[self._NEXT]
+    link[self._PREV] = self._root
+    link[self._NEXT] = first
+    first[self._PREV] = link
+    self._root[self._NEXT] = link
+
+
+class _CacheEntry(object):
+  """ Data stored by cache_get_or_set, with the time it should be replaced.
+  
+  The entry is kept in memcache for a while after it expires, so that stale
+  data can be served while a single request computes the new value.  None 
+  is stored as data to remember that there was nothing to cache.
+  """
+  def __init__(self, data, expires):
+    self.data = data
+    self.expires = expires
+
+
+_local_cache = LocalCache(settings.LOCAL_CACHE_SIZE)
+
+_stats_lock = threading.Lock()
+_stats = {
+  "local_hits" : 0,
+  "memcache_hits" : 0,
+  "negative_hits" : 0,
+  "stale_hits" : 0,
+  "misses" : 0,
+  "recomputes" : 0,
+}
+
+def _count(name, amount=1):
+  """ Adds to one of the counters returned by cache_stats. """
+  _stats_lock.acquire()
+  try:
+    _stats[name] += amount
+  finally:
+    _stats_lock.release()
+
+def _uses_local_cache(cache_key):
+  """ Returns True if the key should be kept in the in-process cache. """
+  return cache_key.split("|", 1)[0] in settings.LOCAL_CACHE_PREFIXES
+
+def _local_get(cache_key):
+  """ Gets an object from the in-process cache, as a (found, data) tuple. """
+  if _uses_local_cache(cache_key):
+    return _local_cache.get(cache_key)
+  return False, None
+
+def _local_set(cache_key, data, lifespan):
+  """ Sets an object to the in-process cache, for a short time at most. """
+  if _uses_local_cache(cache_key):
+    if lifespan <= 0 or lifespan > settings.LOCAL_CACHE_TIME:
+      lifespan = settings.LOCAL_CACHE_TIME
+    _local_cache.set(cache_key, data, lifespan)
+
+def _unwrap(data):
+  """ Returns the data held by a _CacheEntry, or the data itself. """
+  if isinstance(data, _CacheEntry):
+    return data.data
+  return data
+
+def _count_hit(name, data):
+  _count(name)
+  if isinstance(data, _CacheEntry) and data.data is None:
+    _count("negative_hits")
   
 ##### Utility Methods #####
 
@@ -44,41 +240,211 @@ def cache_set(data, *args, **kwargs):
     time: If specified, sets the time that this object may be held in the cache.
     args: Any non-keyword arguments are concatenated and used as the cache key.
   """
-  time = settings.CACHE_TIME if not kwargs.has_key("time") else kwargs["time"]
+  lifespan = kwargs.get("time", settings.CACHE_TIME)
   cache_key = "|".join(args)
-  logging.debug("Set cache:  %s (%s seconds)" % (cache_key, time))
-  memcache.set(cache_key, data, time)
+  logging.debug("Set cache:  %s (%s seconds)" % (cache_key, lifespan))
+  memcache.set(cache_key, data, lifespan)
+  _local_set(cache_key, data, lifespan)
   return data
 
 def cache_get(*args):
   """ Gets an object from a memory cache.
   
   Args:
-    data: The data to cache.
-    time: If specified, sets the time that this object may be held in the cache.
     args: Any non-keyword arguments are concatenated and used as the cache key.
+
+  Returns:
+    The cached data, or None if the key was not found or the cache 
+    remembered that there was no data for it.
   """
   cache_key = "|".join(args)
+  found, data = _local_get(cache_key)
+  if found:
+    logging.debug("Local cache hit:  %s" % cache_key)
+    _count_hit("local_hits", data)
+    return _unwrap(data)
+
   data = memcache.get(cache_key)
   if data is None:
     logging.debug("Cache miss: %s" % cache_key)
+    _count("misses")
   else:
     logging.debug("Cache hit:  %s" % cache_key)
-  return data
+    _count_hit("memcache_hits", data)
+    _local_set(cache_key, data, settings.LOCAL_CACHE_TIME)
+  return _unwrap(data)
   
 def cache_delete(*args):
   """ Deletes an object from a memory cache.
 
+  Only the copy in this instance is removed from the in-process cache, other
+  instances may keep serving their copy for settings.LOCAL_CACHE_TIME.
+
   Args:
     args: Any non-keyword arguments are concatenated and used as the cache key.
   """
   cache_key = "|".join(args)
   logging.debug ("Cache delete: %s" % cache_key)
+  if _uses_local_cache(cache_key):
+    _local_cache.delete(cache_key)
   return memcache.delete(cache_key)
+
+def cache_get_multi(keys, *args):
+  """ Gets several objects from a memory cache in one call.
+
+  Keys found in the in-process cache are not requested from memcache, the
+  rest are requested with a single call.
+
+  Args:
+    keys: The keys of the objects to fetch.
+    args: Any non-keyword arguments are concatenated and used as a prefix for
+        each of the keys.
+
+  Returns:
+    A dict mapping each key which was found in the cache to its data.  Keys
+    which were not found, or which the cache remembered had no data, are 
+    left out.
+  """
+  prefix = "|".join(args + ("",)) if args else ""
+  result = {}
+  remaining = []
+  for key in keys:
+    key = str(key)
+    found, data = _local_get(prefix + key)
+    if found:
+      _count_hit("local_hits", data)
+      result[key] = data
+    else:
+      remaining.append(key)
+
+  if remaining:
+    fetched = memcache.get_multi(remaining, key_prefix=prefix)
+    for key, data in fetched.iteritems():
+      _count_hit("memcache_hits", data)
+      _local_set(prefix + key, data, settings.LOCAL_CACHE_TIME)
+      result[key] = data
+    _count("misses", len(remaining) - len(fetched))
+  logging.debug("Cache get multi: %s (%s of %s found)" % (prefix, len(result),
+                                                          len(keys)))
+
+  for key, data in result.items():
+    result[key] = _unwrap(data)
+    if result[key] is None:
+      del result[key]
+  return result
+
+def cache_set_multi(mapping, *args, **kwargs):
+  """ Sets several objects to a memory cache in one call.
+
+  Args:
+    mapping: A dict mapping keys to the data to cache.
+    time: If specified, sets the time that the objects may be held in the
+        cache.
+    args: Any non-keyword arguments are concatenated and used as a prefix for
+        each of the keys.
+  """
+  lifespan = kwargs.get("time", settings.CACHE_TIME)
+  prefix = "|".join(args + ("",)) if args else ""
+  logging.debug("Set cache multi: %s (%s keys, %s seconds)" % (
+      prefix, len(mapping), lifespan))
+  memcache.set_multi(mapping, lifespan, key_prefix=prefix)
+  for key, data in mapping.iteritems():
+    _local_set(prefix + str(key), data, lifespan)
+  return mapping
+
+def cache_get_or_set(function, *args, **kwargs):
+  """ Gets an object from a memory cache or computes it once.
+  
+  If the key is not cached, function is called and its result is cached.  A
+  result of None is cached too, for a shorter time, so that lookups which 
+  found nothing are not repeated on every request.
+
+  Data is kept in memcache for settings.CACHE_STALE_TIME after it expires.
+  The first request to see expired data takes a lock in memcache and calls
+  function, while other requests keep returning the expired data until the
+  new data has been cached.  This keeps many requests from computing the same
+  expensive value at once.
+
+  Args:
+    function: Called without arguments to compute the data.
+    time: If specified, sets the time that the data may be held in the cache.
+    negative_time: If specified, sets the time that a result of None may be
+        held in the cache.
+    args: Any non-keyword arguments are concatenated and used as the cache key.
+
+  Returns:
+    The cached or newly computed data.
+  """
+  lifespan = kwargs.get("time", settings.CACHE_TIME)
+  negative_time = kwargs.get("negative_time", settings.NEGATIVE_CACHE_TIME)
+  cache_key = "|".join(args)
+  lock_key = "lock|%s" % cache_key
+
+  found, entry = _local_get(cache_key)
+  if found and isinstance(entry, _CacheEntry) and entry.expires > time.time():
+    _count_hit("local_hits", entry)
+    return entry.data
+
+  locked = False
+  entry = memcache.get(cache_key)
+  if isinstance(entry, _CacheEntry):
+    remaining = entry.expires - time.time()
+    if remaining > 0:
+      _count_hit("memcache_hits", entry)
+      _local_set(cache_key, entry, remaining)
+      return entry.data
+    locked = memcache.add(lock_key, 1, settings.CACHE_LOCK_TIME)
+    if not locked:
+      logging.debug("Cache stale: %s (being refreshed)" % cache_key)
+      _count("stale_hits")
+      return entry.data
+  else:
+    _count("misses")
+
+  logging.debug("Cache compute: %s" % cache_key)
+  _count("recomputes")
+  try:
+    data = function()
+  finally:
+    if locked:
+      memcache.delete(lock_key)
+
+  if data is None:
+    lifespan = negative_time
+  entry = _CacheEntry(data, time.time() + lifespan)
+  memcache.set(cache_key, entry, lifespan + settings.CACHE_STALE_TIME)
+  _local_set(cache_key, entry, lifespan)
+  return data
+
+def cache_stats():
+  """ Returns hit and miss counters for the memory caches.
+  
+  The counters cover every lookup made by this instance since it started.
+  
+  Returns:
+    A dict with the following keys: local_hits and memcache_hits count the
+    keys found in each cache, negative_hits counts the hits which remembered
+    that there was no data, stale_hits counts expired data returned while 
+    another request computed new data, misses counts keys found in neither
+    cache, and recomputes counts the calls made by cache_get_or_set.  
+    hit_rate is the share of lookups which were hits, and local_entries is 
+    the size of the in-process cache.
+  """
+  _stats_lock.acquire()
+  try:
+    stats = dict(_stats)
+  finally:
+    _stats_lock.release()
+  hits = stats["local_hits"] + stats["memcache_hits"] + stats["stale_hits"]
+  lookups = hits + stats["misses"]
+  stats["hit_rate"] = lookups and float(hits) / lookups or 0.0
+  stats["local_entries"] = len(_local_cache)
+  return stats
         
 ##### Decorators #####
 
-def cache(key_format, time=settings.CACHE_TIME):
+def cache(key_format, time=settings.CACHE_TIME,
+          negative_time=settings.NEGATIVE_CACHE_TIME):
   """ Decorator which caches the result of the method which it decorates.
   
   Stores the output of the method this decorates in memcache. Based off of the
@@ -92,6 +458,8 @@ def cache(key_format, time=settings.CACHE_TIME):
         the token replacement.
     time: Optional argument specifying how long in seconds the result should
         be cached for.
+    negative_time: Optional argument specifying how long in seconds a result
+        of None should be cached for.
     
   Returns:
     The result of calling the decorated method with the supplied arguments,
@@ -105,11 +473,10 @@ def cache(key_format, time=settings.CACHE_TIME):
           key_args.append(arg.key().id_or_name())
         else:
           key_args.append(str(arg))
-      data = cache_get(key_format % tuple(key_args))
-      if data:
-        return data
-      data = method(*args, **kwargs)
-      return cache_set(key, data, time)
+      def compute():
+        return method(*args, **kwargs)
+      return cache_get_or_set(compute, key_format % tuple(key_args), 
+                              time=time, negative_time=negative_time)
     return method_wrapper
   return method_decorator
   
@@ -28,6 +28,7 @@ from google.appengine.ext.webapp.util import run_wsgi_app
 
 # Local imports
 from providers import restaurants
+from providers import sessions
 import controller
 import utils
 import settings
@@ -258,15 +259,30 @@ class JsonRestaurantsView(controller.JsonRenderer):
     provider = restaurants.LabelProvider()
     viewer = self.request.users.get_viewer()
     labels = provider.get_by_user(viewer)
+    invites = provider.get_by_invitee(viewer)
+
+    # Collect every user shown on the page first, so that the user provider
+    # fetches them all at once instead of once per label and invite.  The
+    # owner's key is read without dereferencing the invite's user property.
+    owner_guids = {}
+    guids = []
+    for label in labels:
+      guids.extend(label.invited_guids)
+    for invite in invites or []:
+      owner_key = models.Label.user.get_value_for_datastore(invite)
+      owner_guids[invite.key()] = str(owner_key.id_or_name())
+      guids.append(owner_guids[invite.key()])
+    self.request.users.prefetch_users(guids)
+
     for label in labels:
       invitees = self.request.users.get_users_by_key_name(label.invited_guids)
       if invitees:
         label.invitees = invitees.itervalues()
-        
-    invites = provider.get_by_invitee(viewer)
+
     if invites:
       for invite in invites:
-        invite.user = self.request.users.get_user_by_key_name(invite.user.guid)
+        owner_guid = owner_guids[invite.key()]
+        invite.user = self.request.users.get_user_by_key_name(owner_guid)
       
     data.update({
       "labels" : labels,
@@ -371,4 +387,5 @@ if __name__ == '__main__':
       ('/json/restaurants', JsonRestaurantsView),
       ('/(.*)', IndexView),
   ]
-  run_wsgi_app(webapp.WSGIApplication(handlers, debug=settings.DEBUG))
\ No newline at end of file
+  application = webapp.WSGIApplication(handlers, debug=settings.DEBUG)
+  run_wsgi_app(sessions.SessionMiddleware(application))
\ No newline at end of file
@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2009 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+# This module is used for version 2 of the Google Data APIs.
+
+
+"""An event loop based HTTP client which runs many requests in one thread.
+
+The AsyncHttpClient has the same request(http_request) interface as
+atom.http_core.HttpClient, so it can be used as the http_client of an
+atom.client.AtomPubClient or gdata.client.GDClient. In addition, its submit
+method starts a request without waiting for it and returns an HttpFuture.
+All submitted requests progress together on non-blocking sockets whenever
+the event loop is run, which happens when a future's result is requested or
+when run is called.
+
+  client = gdata.client.GDClient(
+      http_client=atom.async_http_core.AsyncHttpClient())
+  futures = [client.submit('GET', uri, desired_class=gdata.data.GDFeed)
+             for uri in feed_uris]
+  feeds = [future.result() for future in futures]
+"""
+
+
+import asyncore
+import errno
+import socket
+import sys
+import time
+import atom.http_core
+ssl = None
+try:
+  import ssl
+except ImportError:
+  pass
+
+
+class Error(atom.http_core.Error):
+  pass
+
+
+class ConnectionClosed(Error):
+  pass
+
+
+class Timeout(Error):
+  pass
+
+
+class HttpFuture(object):
+  """The eventual result of a request submitted to an AsyncHttpClient."""
+
+  def __init__(self, client):
+    self._client = client
+    self._done = False
+    self._result = None
+    self._exception = None
+    self._callbacks = []
+
+  def done(self):
+    return self._done
+
+  def result(self, timeout=None):
+    """Runs the event loop until the request completes.
+
+    Other submitted requests continue to make progress while waiting.
+
+    Args:
+      timeout: float (optional) The number of seconds to wait before
+               raising a Timeout error. The request itself is not cancelled.
+
+    Returns:
+      The result of the request, an atom.http_core.HttpResponse unless the
+      future was created with then.
+    """
+    deadline = None
+    if timeout is not None:
+      deadline = time.time() + timeout
+    while not self._done:
+      if deadline is not None and time.time() >= deadline:
+        raise Timeout('Request did not complete in %s seconds' % timeout)
+      self._client.poll()
+    if self._exception is not None:
+      raise self._exception
+    return self._result
+
+  def exception(self):
+    """Returns the error raised by the request, if any, once it is done."""
+    return self._exception
+
+  def add_done_callback(self, callback):
+    """Calls callback with this future once the request completes."""
+    if self._done:
+      callback(self)
+    else:
+      self._callbacks.append(callback)
+
+  def then(self, function):
+    """Returns a new future for the result of calling function(result).
+
+    If this future fails, or function raises an exception, the new future
+    fails with the same exception.
+    """
+    chained = HttpFuture(self._client)
+    def on_done(future):
+      if future._exception is not None:
+        chained.set_exception(future._exception)
+        return
+      try:
+        value = function(future._result)
+      except Exception, e:
+        chained.set_exception(e)
+      else:
+        chained.set_result(value)
+    self.add_done_callback(on_done)
+    return chained
+
+  def set_result(self, result):
+    self._result = result
+    self._finish()
+
+  def set_exception(self, exception):
+    self._exception = exception
+    self._finish()
+
+  def _finish(self):
+    self._done = True
+    callbacks = self._callbacks
+    self._callbacks = []
+    for callback in callbacks:
+      callback(self)
+
+
+class AsyncHttpResponse(atom.http_core.HttpResponse):
+  """An HttpResponse whose header lookups ignore case, like httplib's."""
+
+  def getheader(self, name, default=None):
+    return self._headers.get(name.lower(), default)
+
+  def getheaders(self):
+    return self._headers.items()
+
+
+class AsyncHttpClient(object):
+  """Performs HTTP requests concurrently on non-blocking sockets."""
+  debug = None
+
+  def __init__(self, max_connections=100, timeout=60):
+    """Creates a client with its own event loop.
+
+    Args:
+      max_connections: int (optional) The number of requests which may be
+                       in flight at once. Further requests wait in a queue.
+      timeout: float (optional) The number of seconds after which a request
+               which is still in flight fails with a Timeout error.
+    """
+    self.max_connections = max_connections
+    self.timeout = timeout
+    self._map = {}
+    self._active = []
+    self._queue = []
+
+  def request(self, http_request):
+    return self.submit(http_request).result()
+
+  Request = request
+
+  def submit(self, http_request):
+    """Starts a request and returns an HttpFuture for its response."""
+    future = HttpFuture(self)
+    self._queue.append((http_request, future))
+    self._start_queued()
+    return future
+
+  def pending(self):
+    """Returns the number of requests which have not yet completed."""
+    return len(self._active) + len(self._queue)
+
+  def run(self, timeout=None):
+    """Runs the event loop until every submitted request has completed."""
+    deadline = None
+    if timeout is not None:
+      deadline = time.time() + timeout
+    while self.pending():
+      if deadline is not None and time.time() >= deadline:
+        break
+      self.poll()
+
+  def poll(self, timeout=0.1):
+    """Runs a single pass of the event loop."""
+    self._start_queued()
+    if self._map:
+      asyncore.loop(timeout=timeout, map=self._map, count=1)
+    now = time.time()
+    for channel in self._active[:]:
+      if channel.deadline is not None and now > channel.deadline:
+        channel.fail(Timeout('No response from %s within %s seconds' % (
+            channel.host, self.timeout)))
+    self._start_queued()
+
+  def _start_queued(self):
+    while self._queue and len(self._active) < self.max_connections:
+      http_request, future = self._queue.pop(0)
+      try:
+        channel = _HttpChannel(self, http_request, future)
+      except Exception, e:
+        future.set_exception(e)
+      else:
+        self._active.append(channel)
+
+  def _channel_done(self, channel):
+    if channel in self._active:
+      self._active.remove(channel)
+
+
+def _serialize_headers(http_request):
+  uri = http_request.uri
+  host = uri.host
+  if uri.port and int(uri.port) != _default_port(uri.scheme):
+    host = '%s:%s' % (uri.host, uri.port)
+  lines = ['%s %s HTTP/1.1' % (http_request.method,
+                               uri._get_relative_path()),
+           'Host: %s' % host]
+  for name, value in http_request.headers.iteritems():
+    if name.lower() not in ('host', 'connection'):
+      lines.append('%s: %s' % (name, value))
+  # Each channel carries a single request, so the server closes the
+  # connection once the response has been sent.
+  lines.append('Connection: close')
+  return '\r\n'.join(lines) + '\r\n\r\n'
+
+
+def _default_port(scheme):
+  if scheme == 'https':
+    return 443
+  return 80
+
+
+def _decode_chunked(body):
+  pieces = []
+  position = 0
+  while True:
+    line_end = body.find('\r\n', position)
+    if line_end < 0:
+      break
+    size = int(body[position:line_end].split(';')[0].strip() or '0', 16)
+    if size == 0:
+      break
+    start = line_end + 2
+    pieces.append(body[start:start + size])
+    position = start + size + 2
+  return ''.join(pieces)
+
+
+class _HttpChannel(asyncore.dispatcher):
+  """Sends one HTTP request and reads the response on its own socket."""
+
+  def __init__(self, client, http_request, future):
+    asyncore.dispatcher.__init__(self, map=client._map)
+    self.client = client
+    self.future = future
+    uri = http_request.uri
+    self.host = uri.host
+    self.secure = uri.scheme == 'https'
+    self.deadline = None
+    if client.timeout is not None:
+      self.deadline = time.time() + client.timeout
+    self.method = http_request.method
+    self._outgoing = _serialize_headers(http_request)
+    self._body_parts = [part for part in http_request._body_parts
+                        if part != '']
+    self._handshaking = False
+    self._want_write = False
+    self._header_data = ''
+    self._status = None
+    self._reason = None
+    self._headers = None
+    self._body = []
+    self._received = 0
+    self._content_length = None
+    self._finished = False
+    if client.debug:
+      print _serialize_headers(http_request)
+    self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.connect((uri.host, int(uri.port or _default_port(uri.scheme))))
+
+  def handle_connect(self):
+    if self.secure:
+      if ssl is None:
+        raise Error('The ssl module is required for https requests')
+      if hasattr(ssl, 'create_default_context'):
+        context = ssl.create_default_context()
+        self.socket = context.wrap_socket(self.socket,
+            server_hostname=self.host, do_handshake_on_connect=False)
+      else:
+        self.socket = ssl.wrap_socket(self.socket,
+                                      do_handshake_on_connect=False)
+      self._handshaking = True
+      self._handshake()
+
+  def _handshake(self):
+    try:
+      self.socket.do_handshake()
+    except ssl.SSLError, e:
+      if e.args[0] == ssl.SSL_ERROR_WANT_READ:
+        self._want_write = False
+      elif e.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+        self._want_write = True
+      else:
+        raise
+    else:
+      self._handshaking = False
+      self._want_write = False
+
+  def readable(self):
+    return not self._finished
+
+  def writable(self):
+    if not self.connected:
+      return True
+    if self._handshaking:
+      return self._want_write
+    return bool(self._outgoing or self._body_parts)
+
+  def _next_outgoing(self):
+    while not self._outgoing and self._body_parts:
+      part = self._body_parts[0]
+      if isinstance(part, str):
+        self._outgoing = part
+        self._body_parts.pop(0)
+      elif isinstance(part, unicode):
+        self._outgoing = part.encode('utf-8')
+        self._body_parts.pop(0)
+      elif hasattr(part, 'read'):
+        self._outgoing = part.read(100000)
+        if not self._outgoing:
+          self._body_parts.pop(0)
+      else:
+        self._outgoing = str(part)
+        self._body_parts.pop(0)
+
+  def handle_write(self):
+    if self._handshaking:
+      self._handshake()
+      return
+    self._next_outgoing()
+    if not self._outgoing:
+      return
+    try:
+      sent = self.socket.send(self._outgoing)
+    except socket.error, e:
+      if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+        return
+      if ssl is not None and isinstance(e, ssl.SSLError) and e.args[0] in (
+          ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+        return
+      raise
+    self._outgoing = self._outgoing[sent:]
+
+  def handle_read(self):
+    if self._handshaking:
+      self._handshake()
+      return
+    while not self._finished:
+      try:
+        data = self.socket.recv(65536)
+      except socket.error, e:
+        if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+          return
+        if ssl is not None and isinstance(e, ssl.SSLError) and e.args[0] in (
+            ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+          return
+        raise
+      if not data:
+        self.handle_close()
+        return
+      self._on_data(data)
+      # Plain sockets are read once per event, but an SSL socket may hold
+      # decrypted data which select does not report as readable.
+      if not self.secure:
+        return
+
+  def _on_data(self, data):
+    if self._headers is None:
+      self._header_data += data
+      end = self._header_data.find('\r\n\r\n')
+      if end < 0:
+        return
+      self._parse_headers(self._header_data[:end])
+      data = self._header_data[end + 4:]
+      self._header_data = ''
+      if self._status == 100:
+        # Discard the interim response and wait for the real one.
+        self._headers = None
+        if data:
+          self._on_data(data)
+        return
+    if data:
+      self._body.append(data)
+      self._received += len(data)
+    if (self.method == 'HEAD' or self._status in (204, 304) or
+        (self._content_length is not None and
+         self._received >= self._content_length)):
+      self._complete()
+
+  def _parse_headers(self, header_block):
+    lines = header_block.split('\r\n')
+    status_line = lines[0].split(' ', 2)
+    self._status = int(status_line[1])
+    self._reason = len(status_line) > 2 and status_line[2] or ''
+    self._headers = {}
+    for line in lines[1:]:
+      if ':' not in line:
+        continue
+      name, value = line.split(':', 1)
+      name = name.strip().lower()
+      value = value.strip()
+      if name in self._headers:
+        self._headers[name] = '%s, %s' % (self._headers[name], value)
+      else:
+        self._headers[name] = value
+    if (self._headers.get('transfer-encoding', '').lower() != 'chunked' and
+        'content-length' in self._headers):
+      self._content_length = int(self._headers['content-length'])
+
+  def _complete(self):
+    if self._finished:
+      return
+    self._finished = True
+    body = ''.join(self._body)
+    if self._headers.get('transfer-encoding', '').lower() == 'chunked':
+      body = _decode_chunked(body)
+    elif self._content_length is not None:
+      body = body[:self._content_length]
+    response = AsyncHttpResponse(status=self._status, reason=self._reason,
+                                 headers=self._headers, body=body)
+    self.close()
+    self.client._channel_done(self)
+    self.future.set_result(response)
+
+  def fail(self, exception):
+    if self._finished:
+      return
+    self._finished = True
+    self.close()
+    self.client._channel_done(self)
+    self.future.set_exception(exception)
+
+  def handle_close(self):
+    if self._headers is not None:
+      self._complete()
+    else:
+      self.fail(ConnectionClosed(
+          'Connection to %s closed before a response was received' %
+          self.host))
+
+  def handle_error(self):
+    self.fail(sys.exc_info()[1])
@@ -22,7 +22,9 @@
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
+import time
 import atom.http_core
+import atom.tracing
 
 
 class Error(Exception):
@@ -38,6 +40,12 @@ class AtomPubClient(object):
   auth_token = None
   ssl = False # Whether to force all requests over https
   xoauth_requestor_id = None
+  # Ask the server to gzip responses, they are decompressed as they are read.
+  gzip = False
+  # If set, string request bodies of at least this many bytes are gzipped.
+  gzip_request_min_size = None
+  # Times the phases of each request, see atom.tracing.
+  tracer = atom.tracing.NULL_TRACER
 
   def __init__(self, http_client=None, host=None, auth_token=None, source=None,
                xoauth_requestor_id=None, **kwargs):
@@ -80,7 +88,55 @@ class AtomPubClient(object):
 
     Returns:
       The results of calling self.http_client.request. With the default
-      http_client, this is an HTTP response object.
+      http_client, this is an HTTP response object. If the request is
+      traced, its trace is finished when the response body has been read
+      to the end.
+    """
+    trace = self.tracer.start()
+    response = self._send_request(trace, method=method, uri=uri,
+        auth_token=auth_token, http_request=http_request, **kwargs)
+    if trace is not None:
+      response = atom.tracing.TracedResponse(response, trace, self.tracer)
+    return response
+
+  Request = request
+
+  def _send_request(self, trace, method=None, uri=None, auth_token=None,
+                    http_request=None, **kwargs):
+    """Builds and sends the request, recording the timings in the trace.
+
+    The trace may be None, in which case nothing is timed.
+    """
+    if trace is not None:
+      start = time.time()
+    http_request = self._build_request(method=method, uri=uri,
+        auth_token=auth_token, http_request=http_request, **kwargs)
+    if trace is not None:
+      trace.add('modify_request', time.time() - start)
+      trace.set_request(http_request)
+      # Lets the HTTP client time the parts of the exchange.
+      http_request.trace = trace
+      start = time.time()
+    # Perform the fully specified request using the http_client instance.
+    # Sends the request to the server and returns the server's response.
+    response = self.http_client.request(http_request)
+    if self.gzip:
+      # The default http_client has already decoded the response, this
+      # covers other clients.
+      response = atom.http_core.decode_response(
+          http_request.headers, response,
+          atom.http_core.get_compression_stats(self.http_client))
+    if trace is not None:
+      trace.add('http', time.time() - start)
+      trace.status = getattr(response, 'status', None)
+    return response
+
+  def _build_request(self, method=None, uri=None, auth_token=None,
+                     http_request=None, **kwargs):
+    """Creates the fully specified HTTP request which request will send.
+
+    Takes the same arguments as request and returns the
+    atom.http_core.HttpRequest, including the Authorization header.
     """
     # Modify the request based on the AtomPubClient settings and parameters
     # passed in to the request.
@@ -104,6 +160,10 @@ class AtomPubClient(object):
       http_request.uri.scheme = 'https'
     if http_request.uri.path is None:
       http_request.uri.path = '/'
+    if self.gzip_request_min_size is not None:
+      atom.http_core.gzip_request_body(
+          http_request, self.gzip_request_min_size,
+          atom.http_core.get_compression_stats(self.http_client))
     # Add the Authorization header at the very end. The Authorization header
     # value may need to be calculated using information in the request.
     if auth_token:
@@ -114,11 +174,7 @@ class AtomPubClient(object):
     if http_request.uri.host is None:
       raise MissingHost('No host provided in request %s %s' % (
           http_request.method, str(http_request.uri)))
-    # Perform the fully specified request using the http_client instance.
-    # Sends the request to the server and returns the server's response.
-    return self.http_client.request(http_request)
-
-  Request = request
+    return http_request
 
   def get(self, uri=None, auth_token=None, http_request=None, **kwargs):
     """Performs a request using the GET method, returns an HTTP response."""
@@ -182,6 +238,9 @@ class AtomPubClient(object):
     else:
       http_request.headers['User-Agent'] = 'gdata-py/2.0.15'
 
+    if self.gzip:
+      atom.http_core.add_gzip_headers(http_request.headers)
+
     return http_request
 
   ModifyRequest = modify_request
@@ -22,6 +22,8 @@ __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
 import inspect
+import re
+import time
 try:
   from xml.etree import cElementTree as ElementTree
 except ImportError:
@@ -39,7 +41,40 @@ try:
 except ImportError:
     xmlString = None
 
+simplejson = None
+try:
+  # Since Python 2.7 the json module decodes with a C scanner, which is
+  # several times faster than a simplejson without its speedups.
+  import json
+  if json.scanner.c_make_scanner is not None:
+    simplejson = json
+except (ImportError, AttributeError):
+  pass
+if simplejson is None:
+  try:
+    import simplejson
+  except ImportError:
+    try:
+      # Try to import from django, should work on App Engine
+      from django.utils import simplejson
+    except ImportError:
+      try:
+        # Should work for Python2.6 and higher.
+        import json as simplejson
+      except ImportError:
+        simplejson = None
+
 STRING_ENCODING = 'utf-8'
+XML_NAMESPACE = 'http://www.w3.org/XML/1998/namespace'
+# Namespaces used to expand the prefixes in a partial response fields
+# expression when the caller does not provide any. Names without a prefix
+# are Atom elements.
+FIELDS_NAMESPACES = {'': 'http://www.w3.org/2005/Atom',
+                     'atom': 'http://www.w3.org/2005/Atom'}
+
+
+class FieldsSyntaxError(Exception):
+  pass
 
 
 class XmlElement(object):
@@ -269,10 +304,27 @@ class XmlElement(object):
 
   GetAttributes = get_attributes
 
-  def _harvest_tree(self, tree, version=1):
-    """Populates object members from the data in the tree Element."""
+  def _harvest_tree(self, tree, version=1, projection=None):
+    """Populates object members from the data in the tree Element.
+
+    Args:
+      tree: ElementTree.Element The element to read.
+      version: int The version of the schema to use.
+      projection: dict (optional) Limits which child elements are converted,
+          as returned by parse_fields. Children which are not selected are
+          skipped without being converted or kept in the other elements.
+          If None, all children are converted.
+    """
     qname, elements, attributes = self.__class__._get_rules(version)
     for element in tree:
+      child_projection = None
+      if projection is not None:
+        if element.tag in projection:
+          child_projection = projection[element.tag]
+        elif '*' in projection:
+          child_projection = projection['*']
+        else:
+          continue
       if elements and element.tag in elements:
         definition = elements[element.tag]
         # If this is a repeating element, make sure the member is set to a
@@ -281,13 +333,14 @@ class XmlElement(object):
           if getattr(self, definition[0]) is None:
             setattr(self, definition[0], [])
           getattr(self, definition[0]).append(_xml_element_from_tree(element,
-              definition[1], version))
+              definition[1], version, child_projection))
         else:
           setattr(self, definition[0], _xml_element_from_tree(element,
-              definition[1], version))
+              definition[1], version, child_projection))
       else:
         self._other_elements.append(_xml_element_from_tree(element, XmlElement,
-                                                           version))
+                                                           version,
+                                                           child_projection))
     for attrib, value in tree.attrib.iteritems():
       if attributes and attrib in attributes:
         setattr(self, attributes[attrib], value)
@@ -296,6 +349,81 @@ class XmlElement(object):
     if tree.text:
       self.text = tree.text
 
+  def _harvest_json(self, data, version=1, namespaces=None, projection=None):
+    """Populates object members from a JSON object in the GData JSON format.
+
+    In this format a child element is a JSON object, or a list of objects if
+    it repeats, the text of an element is its $t member, and attributes are
+    string members. Namespace prefixes are separated from names with a $
+    instead of a colon, for example media$group.
+
+    Args:
+      data: dict The JSON object for this element.
+      version: int The version of the schema to use.
+      namespaces: _JsonNamespaces The namespaces declared by the parents of
+          this element.
+      projection: dict (optional) Limits which child elements are converted,
+          as in _harvest_tree.
+    """
+    qname, elements, attributes = self.__class__._get_rules(version)
+    for key, value in data.iteritems():
+      # The decoder gives exact dicts, lists and strings, so the type is
+      # compared before falling back to isinstance for other mappings.
+      kind = type(value)
+      if kind is dict:
+        children = (value,)
+      elif kind is list:
+        children = value
+      elif kind is not unicode and isinstance(value, dict):
+        children = (value,)
+      elif kind is not unicode and isinstance(value, list):
+        children = value
+      elif key == '$t':
+        # Numbers and booleans become text as they would be read from XML.
+        if kind is unicode:
+          self.text = value
+        elif value is not None:
+          self.text = _json_attribute_value(value)
+        continue
+      else:
+        attrib = namespaces.attribute_qname(key)
+        if attrib is None or value is None:
+          continue
+        if kind is not unicode:
+          value = _json_attribute_value(value)
+        if attributes and attrib in attributes:
+          setattr(self, attributes[attrib], value)
+        else:
+          self._other_attributes[attrib] = value
+        continue
+      tag = namespaces.element_qname(key)
+      child_projection = None
+      if projection is not None:
+        if tag in projection:
+          child_projection = projection[tag]
+        elif '*' in projection:
+          child_projection = projection['*']
+        else:
+          continue
+      if elements and tag in elements:
+        member, child_class, repeated = elements[tag]
+      else:
+        member, child_class, repeated = None, XmlElement, True
+      converted = []
+      for child in children:
+        if type(child) is not dict and not isinstance(child, dict):
+          child = {'$t': child}
+        converted.append(_xml_element_from_json(
+            child, tag, child_class, version, namespaces, child_projection))
+      if member is None:
+        self._other_elements.extend(converted)
+      elif repeated:
+        if getattr(self, member) is None:
+          setattr(self, member, [])
+        getattr(self, member).extend(converted)
+      elif converted:
+        setattr(self, member, converted[-1])
+
   def _to_tree(self, version=1, encoding=None):
     new_tree = ElementTree.Element(_get_qname(self, version))
     self._attach_members(new_tree, version, encoding)
@@ -498,7 +626,173 @@ def _qname_matches(tag, namespace, qname):
           and member_namespace is None))
 
 
-def parse(xml_string, target_class=None, version=1, encoding=None):
+_FIELD_NAME = re.compile(r'\s*([\w:.*@-]+)\s*')
+
+
+def parse_fields(fields, namespaces=None):
+  """Converts a partial response fields expression into a projection.
+
+  The expression uses the syntax of the fields URL parameter, for example
+  'entry(id,title,media:group(media:thumbnail))'. Paths such as
+  'author/name' select nested elements and '*' selects every child. Filter
+  expressions in square brackets are applied by the server, so they are
+  skipped. Attributes are always kept, so '@name' selections only limit
+  which child elements are kept.
+
+  Args:
+    fields: str The fields expression.
+    namespaces: dict (optional) Maps the prefixes used in the expression to
+        XML namespaces. The '' entry is used for names without a prefix.
+        Defaults to FIELDS_NAMESPACES.
+
+  Returns:
+    A dict which maps the qualified tags of the selected children to the
+    projection for that child's own children, or to None if the whole
+    child is selected.
+
+  Raises:
+    FieldsSyntaxError if the expression can not be parsed or uses an
+    unknown prefix.
+  """
+  if namespaces is None:
+    namespaces = FIELDS_NAMESPACES
+  projection, position = _parse_field_list(fields, 0, namespaces)
+  if position != len(fields):
+    raise FieldsSyntaxError('Unexpected %r at %d in %r' % (
+        fields[position], position, fields))
+  return projection
+
+
+ParseFields = parse_fields
+
+
+def _parse_field_list(fields, position, namespaces):
+  projection = {}
+  while True:
+    path = []
+    while True:
+      match = _FIELD_NAME.match(fields, position)
+      if match is None:
+        raise FieldsSyntaxError('Expected a field name at %d in %r' % (
+            position, fields))
+      path.append(match.group(1))
+      position = match.end()
+      if fields.startswith('/', position):
+        position += 1
+      else:
+        break
+    if fields.startswith('[', position):
+      position = _skip_filter(fields, position)
+    children = None
+    if fields.startswith('(', position):
+      children, position = _parse_field_list(fields, position + 1,
+                                             namespaces)
+      if not fields.startswith(')', position):
+        raise FieldsSyntaxError('Expected ) at %d in %r' % (position, fields))
+      position += 1
+    tags = []
+    for name in path:
+      if name.startswith('@'):
+        # Only the attributes of the parent were selected.
+        children = {}
+        break
+      tags.append(_expand_field_name(name, namespaces))
+    if tags:
+      _add_projection_path(projection, tags, children)
+    while position < len(fields) and fields[position].isspace():
+      position += 1
+    if fields.startswith(',', position):
+      position += 1
+    else:
+      return projection, position
+
+
+def _skip_filter(fields, position):
+  depth = 0
+  quote = None
+  for i in xrange(position, len(fields)):
+    character = fields[i]
+    if quote is not None:
+      if character == quote:
+        quote = None
+    elif character in '\'"':
+      quote = character
+    elif character == '[':
+      depth += 1
+    elif character == ']':
+      depth -= 1
+      if depth == 0:
+        return i + 1
+  raise FieldsSyntaxError('Unterminated filter in %r' % fields)
+
+
+def _expand_field_name(name, namespaces):
+  if name == '*':
+    return name
+  if ':' in name:
+    prefix, tag = name.split(':', 1)
+  else:
+    prefix, tag = '', name
+  if prefix not in namespaces:
+    if prefix:
+      raise FieldsSyntaxError('Unknown namespace prefix %s' % prefix)
+    return tag
+  return '{%s}%s' % (namespaces[prefix], tag)
+
+
+def _add_projection_path(projection, tags, children):
+  for tag in tags[:-1]:
+    if tag not in projection:
+      projection[tag] = {}
+    elif projection[tag] is None:
+      # The whole element has already been selected.
+      return
+    projection = projection[tag]
+  _merge_projection(projection, tags[-1], children)
+
+
+def _merge_projection(projection, tag, children):
+  if tag not in projection:
+    projection[tag] = children
+  elif projection[tag] is not None:
+    if children is None:
+      projection[tag] = None
+    else:
+      for child_tag, grandchildren in children.iteritems():
+        _merge_projection(projection[tag], child_tag, grandchildren)
+
+
+def prune_tree(tree, projection):
+  """Removes the children of an ElementTree which the projection skips.
+
+  This gives the same savings as sparse parsing for code which builds
+  objects from an ElementTree directly, such as the version 1 atom classes.
+
+  Args:
+    tree: ElementTree.Element The element to prune in place.
+    projection: dict as returned by parse_fields, or None to keep all
+        children.
+
+  Returns:
+    The tree.
+  """
+  if projection is None:
+    return tree
+  kept = []
+  for element in tree:
+    if element.tag in projection:
+      kept.append(prune_tree(element, projection[element.tag]))
+    elif '*' in projection:
+      kept.append(prune_tree(element, projection['*']))
+  tree[:] = kept
+  return tree
+
+
+PruneTree = prune_tree
+
+
+def parse(xml_string, target_class=None, version=1, encoding=None,
+          fields=None, namespaces=None, trace=None):
   """Parses the XML string according to the rules for the target_class.
 
   Args:
@@ -509,6 +803,15 @@ def parse(xml_string, target_class=None, version=1, encoding=None):
         converting the XML into an object. The default is 1.
     encoding: str (optional) The character encoding of the bytes in the
         xml_string. Default is 'UTF-8'.
+    fields: str or dict (optional) A partial response fields expression, or
+        a projection returned by parse_fields. Only the selected children of
+        the root element are converted, the rest are dropped. This is
+        useful when the server may return more than was asked for, and saves
+        building objects for elements which will not be read.
+    namespaces: dict (optional) The prefixes used in fields, see
+        parse_fields.
+    trace: atom.tracing.RequestTrace (optional) Given the time spent parsing
+        the XML ('parse') and building the objects ('convert').
   """
   if target_class is None:
     target_class = XmlElement
@@ -517,8 +820,18 @@ def parse(xml_string, target_class=None, version=1, encoding=None):
       xml_string = xml_string.encode(STRING_ENCODING)
     else:
       xml_string = xml_string.encode(encoding)
+  if isinstance(fields, basestring):
+    fields = parse_fields(fields, namespaces)
+  if trace is None:
+    tree = ElementTree.fromstring(xml_string)
+    return _xml_element_from_tree(tree, target_class, version, fields)
+  start = time.time()
   tree = ElementTree.fromstring(xml_string)
-  return _xml_element_from_tree(tree, target_class, version)
+  converting = time.time()
+  trace.add('parse', converting - start)
+  element = _xml_element_from_tree(tree, target_class, version, fields)
+  trace.add('convert', time.time() - converting)
+  return element
 
 
 Parse = parse
@@ -526,22 +839,168 @@ xml_element_from_string = parse
 XmlElementFromString = xml_element_from_string
 
 
-def _xml_element_from_tree(tree, target_class, version=1):
+def _xml_element_from_tree(tree, target_class, version=1, projection=None):
   if target_class._qname is None:
     instance = target_class()
     instance._qname = tree.tag
-    instance._harvest_tree(tree, version)
+    instance._harvest_tree(tree, version, projection)
     return instance
   # TODO handle the namespace-only case
   # Namespace only will be used with Google Spreadsheets rows and
   # Google Base item attributes.
   elif tree.tag == _get_qname(target_class, version):
     instance = target_class()
-    instance._harvest_tree(tree, version)
+    instance._harvest_tree(tree, version, projection)
     return instance
   return None
 
 
+def parse_json(json_data, target_class=None, version=1, fields=None,
+               namespaces=None, trace=None):
+  """Converts a GData JSON document (alt=json) into XmlElement objects.
+
+  The objects are built with the same rules which parse uses for the XML
+  form of the document, so parse_json(json_feed, VideoFeed) gives the same
+  object as parse(xml_feed, VideoFeed). The JSON-C format (alt=jsonc) does
+  not keep the structure of the Atom document and can not be converted.
+
+  Args:
+    json_data: str, unicode or dict The JSON document, or the object
+        returned by decoding it.
+    target_class: XmlElement or a subclass. If None is specified, the
+        XmlElement class is used.
+    version: int (optional) The version of the schema which should be used
+        when converting the JSON into an object. The default is 1.
+    fields: str or dict (optional) Only converts the selected children of
+        the root element, see parse.
+    namespaces: dict (optional) Maps namespace prefixes to namespace URIs,
+        for prefixes which the document uses without declaring them. Also
+        used to expand the prefixes in fields.
+    trace: atom.tracing.RequestTrace (optional) Given the time spent decoding
+        the JSON ('parse') and building the objects ('convert').
+
+  Returns:
+    An instance of the target_class, or None if the root element of the
+    document does not match it.
+  """
+  if target_class is None:
+    target_class = XmlElement
+  if isinstance(json_data, basestring):
+    if trace is None:
+      json_data = simplejson.loads(json_data)
+    else:
+      start = time.time()
+      json_data = simplejson.loads(json_data)
+      trace.add('parse', time.time() - start)
+  if trace is not None:
+    start = time.time()
+  if isinstance(fields, basestring):
+    fields = parse_fields(fields, namespaces)
+  prefixes = FIELDS_NAMESPACES.copy()
+  prefixes['xml'] = XML_NAMESPACE
+  if namespaces:
+    prefixes.update(namespaces)
+  root_key = None
+  if target_class._qname is not None:
+    root_key = _get_qname(target_class, version).split('}')[-1]
+  if root_key not in json_data:
+    keys = [key for key in json_data if key not in ('version', 'encoding')]
+    if len(keys) != 1:
+      return None
+    root_key = keys[0]
+  root = json_data[root_key]
+  json_namespaces = _JsonNamespaces(prefixes).declare(root)
+  element = _xml_element_from_json(root,
+                                   json_namespaces.element_qname(root_key),
+                                   target_class, version, json_namespaces,
+                                   fields)
+  if trace is not None:
+    trace.add('convert', time.time() - start)
+  return element
+
+
+ParseJson = parse_json
+
+
+def _xml_element_from_json(data, qname, target_class, version=1,
+                           namespaces=None, projection=None):
+  namespaces = namespaces.declare(data)
+  if target_class._qname is None:
+    instance = target_class()
+    instance._qname = qname
+  elif qname == _get_qname(target_class, version):
+    instance = target_class()
+  else:
+    return None
+  instance._harvest_json(data, version, namespaces, projection)
+  return instance
+
+
+def _json_attribute_value(value):
+  if isinstance(value, basestring):
+    return value
+  if isinstance(value, bool):
+    return value and 'true' or 'false'
+  return str(value)
+
+
+class _JsonNamespaces(object):
+  """Expands the prefixed names in a GData JSON document to qnames.
+
+  Expanded names are remembered, so each name is only expanded once for
+  all of the elements which share the same namespace declarations.
+  """
+
+  def __init__(self, prefixes):
+    self.prefixes = prefixes
+    self._elements = {}
+    self._attributes = {}
+
+  def declare(self, data):
+    """Returns the namespaces in scope for a JSON object.
+
+    If the object declares no namespaces, this object is returned.
+    """
+    declared = None
+    for key in data:
+      if key[:5] == 'xmlns' and (len(key) == 5 or key[5] == '$'):
+        if declared is None:
+          declared = self.prefixes.copy()
+        declared[key[6:]] = data[key]
+    if declared is None:
+      return self
+    return _JsonNamespaces(declared)
+
+  def element_qname(self, key):
+    qname = self._elements.get(key)
+    if qname is None:
+      qname = self._expand(key, self.prefixes.get(''))
+      self._elements[key] = qname
+    return qname
+
+  def attribute_qname(self, key):
+    """Returns the qname of an attribute, or None for a declaration."""
+    try:
+      return self._attributes[key]
+    except KeyError:
+      if key == 'xmlns' or key.startswith('xmlns$'):
+        qname = None
+      else:
+        qname = self._expand(key, None)
+      self._attributes[key] = qname
+      return qname
+
+  def _expand(self, key, default_namespace):
+    if '$' in key:
+      prefix, name = key.split('$', 1)
+      if prefix in self.prefixes:
+        return '{%s}%s' % (self.prefixes[prefix], name)
+      return '%s:%s' % (prefix, name)
+    if default_namespace:
+      return '{%s}%s' % (default_namespace, key)
+    return key
+
+
 class XmlAttribute(object):
 
   def __init__(self, qname, value):
@@ -68,6 +68,8 @@ class HttpClient(atom.http_interface.GenericHttpClient):
   # Added to allow old v1 HttpClient objects to use the new 
   # http_code.HttpClient. Used in unit tests to inject a mock client.
   v2_http_client = None
+  # An atom.http_core.UploadStats for the body of the last request.
+  last_upload = None
 
   def __init__(self, headers=None):
     self.debug = False
@@ -88,7 +90,8 @@ class HttpClient(atom.http_interface.GenericHttpClient):
       data: filestream, list of parts, or other object which can be converted
           to a string. Should be set to None when performing a GET or DELETE.
           If data is a file-like object which can be read, this method will 
-          read a chunk of 100K bytes at a time and send them. 
+          send it with sendfile when it is a regular file and the connection
+          is not SSL, otherwise it reads and sends a chunk at a time. 
           If the data is a list of parts to be sent, each part will be 
           evaluated and sent.
       url: The full URL to which the request should be sent. Can be a string
@@ -163,12 +166,14 @@ class HttpClient(atom.http_interface.GenericHttpClient):
     connection.endheaders()
 
     # If there is data, send it in the request.
+    upload = atom.http_core.UploadStats()
     if data:
       if isinstance(data, list):
         for data_part in data:
-          _send_data_part(data_part, connection)
+          _send_data_part(data_part, connection, upload)
       else:
-        _send_data_part(data, connection)
+        _send_data_part(data, connection, upload)
+    self.last_upload = upload
 
     # Return the HTTP Response from the server.
     return connection.getresponse()
@@ -345,20 +350,7 @@ def _get_proxy_net_location(proxy_settings):
     return proxy_settings
 
 
-def _send_data_part(data, connection):
-  if isinstance(data, types.StringTypes):
-    connection.send(data)
-    return
-  # Check to see if data is a file-like object that has a read method.
-  elif hasattr(data, 'read'):
-    # Read the file and send it a chunk at a time.
-    while 1:
-      binarydata = data.read(100000)
-      if binarydata == '': break
-      connection.send(binarydata)
-    return
-  else:
-    # The data object was not a file.
-    # Try to convert to a string and send the data.
-    connection.send(str(data))
-    return
+def _send_data_part(data, connection, stats=None):
+  # File-like objects are sent with sendfile or a reusable buffer where
+  # possible, see atom.http_core._send_file.
+  atom.http_core._send_data_part(data, connection, stats)
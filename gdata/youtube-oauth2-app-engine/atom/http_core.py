@@ -22,16 +22,31 @@
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
+import errno
+import mmap
 import os
+import select
+import socket
+import stat
 import StringIO
+import time
 import urlparse
 import urllib
 import httplib
+import zlib
 ssl = None
 try:
   import ssl
 except ImportError:
   pass
+try:
+  from os import sendfile as _sendfile
+except ImportError:
+  try:
+    # The pysendfile package provides the same function for Python 2.
+    from sendfile import sendfile as _sendfile
+  except ImportError:
+    _sendfile = None
 
 
 
@@ -48,6 +63,14 @@ class ProxyError(Error):
 
 
 MIME_BOUNDARY = 'END_OF_PART'
+# Size of the buffer used to copy file-like bodies to the connection when
+# sendfile can't be used.
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+# The most sendfile is asked to copy in one call, some kernels reject more.
+_MAX_SENDFILE_CHUNK = 0x7ffff000
+# Amount of compressed data read from the socket at a time when decoding a
+# gzipped response.
+_GZIP_READ_SIZE = 65536
 
 
 def get_headers(http_response):
@@ -83,6 +106,10 @@ class HttpRequest(object):
   """
   method = None
   uri = None
+  # The MultipartBody holding the parts once a second one has been added.
+  _multipart = None
+  # An atom.tracing.RequestTrace which the HTTP client may add timings to.
+  trace = None
 
   def __init__(self, uri=None, method=None, headers=None):
     """Construct an HTTP request.
@@ -107,69 +134,43 @@ class HttpRequest(object):
 
     If more than one part is added, this is assumed to be a mime-multipart
     request. This method is designed to create MIME 1.0 requests as specified
-    in RFC 1341.
+    in RFC 1341. The parts are kept in a MultipartBody, so file-like parts
+    are not read until the request is sent.
 
     Args:
-      data: str or a file-like object containing a part of the request body.
+      data: str, mmap or a file-like object containing a part of the request
+            body.
       mime_type: str The MIME type describing the data
-      size: int Required if the data is a file like object. If the data is a
-            string, the size is calculated so this parameter is ignored.
+      size: int Required if the data is a file like object whose size can't
+            be found with get_body_size. If the data is a string, the size
+            is calculated so this parameter is ignored.
     """
     if isinstance(data, str):
       size = len(data)
+    if size is None:
+      size = get_body_size(data)
     if size is None:
       # TODO: support chunked transfer if some of the body is of unknown size.
       raise UnknownSize('Each part of the body must have a known size.')
-    if 'Content-Length' in self.headers:
-      content_length = int(self.headers['Content-Length'])
-    else:
-      content_length = 0
     # If this is the first part added to the body, then this is not a multipart
     # request.
     if len(self._body_parts) == 0:
       self.headers['Content-Type'] = mime_type
-      content_length = size
+      self.headers['Content-Length'] = str(size)
       self._body_parts.append(data)
-    elif len(self._body_parts) == 1:
-      # This is the first member in a mime-multipart request, so change the
-      # _body_parts list to indicate a multipart payload.
-      self._body_parts.insert(0, 'Media multipart posting')
-      boundary_string = '\r\n--%s\r\n' % (MIME_BOUNDARY,)
-      content_length += len(boundary_string) + size
-      self._body_parts.insert(1, boundary_string)
-      content_length += len('Media multipart posting')
-      # Put the content type of the first part of the body into the multipart
-      # payload.
-      original_type_string = 'Content-Type: %s\r\n\r\n' % (
-          self.headers['Content-Type'],)
-      self._body_parts.insert(2, original_type_string)
-      content_length += len(original_type_string)
-      boundary_string = '\r\n--%s\r\n' % (MIME_BOUNDARY,)
-      self._body_parts.append(boundary_string)
-      content_length += len(boundary_string)
-      # Change the headers to indicate this is now a mime multipart request.
-      self.headers['Content-Type'] = 'multipart/related; boundary="%s"' % (
-          MIME_BOUNDARY,)
+      return
+    if self._multipart is None:
+      # This is the second part, so move the first part into a multipart
+      # payload and change the headers to indicate a mime multipart request.
+      self._multipart = MultipartBody()
+      self._multipart.add_part(self._body_parts[0],
+                               self.headers['Content-Type'],
+                               int(self.headers['Content-Length']))
+      self.headers['Content-Type'] = self._multipart.get_content_type()
       self.headers['MIME-version'] = '1.0'
-      # Include the mime type of this part.
-      type_string = 'Content-Type: %s\r\n\r\n' % (mime_type)
-      self._body_parts.append(type_string)
-      content_length += len(type_string)
-      self._body_parts.append(data)
-      ending_boundary_string = '\r\n--%s--' % (MIME_BOUNDARY,)
-      self._body_parts.append(ending_boundary_string)
-      content_length += len(ending_boundary_string)
-    else:
-      # This is a mime multipart request.
-      boundary_string = '\r\n--%s\r\n' % (MIME_BOUNDARY,)
-      self._body_parts.insert(-1, boundary_string)
-      content_length += len(boundary_string) + size
-      # Include the mime type of this part.
-      type_string = 'Content-Type: %s\r\n\r\n' % (mime_type)
-      self._body_parts.insert(-1, type_string)
-      content_length += len(type_string)
-      self._body_parts.insert(-1, data)
-    self.headers['Content-Length'] = str(content_length)
+    self._multipart.add_part(data, mime_type, size)
+    self._body_parts = self._multipart.get_parts()
+    self.headers['Content-Length'] = str(self._multipart.get_length())
   # I could add an "append_to_body_part" method as well.
 
   AddBodyPart = add_body_part
@@ -196,6 +197,8 @@ class HttpRequest(object):
     new_request = HttpRequest(uri=copied_uri, method=self.method,
                               headers=self.headers.copy())
     new_request._body_parts = self._body_parts[:]
+    if self._multipart is not None:
+      new_request._multipart = self._multipart._copy()
     return new_request
 
   def _dump(self):
@@ -219,6 +222,155 @@ class HttpRequest(object):
     return output
 
 
+def get_body_size(data):
+  """Finds the number of bytes which will be sent for a request body part.
+
+  Nothing is read from data. For files and file-like objects the size is
+  measured from the current position to the end.
+
+  Args:
+    data: A str, mmap, regular file or seekable file-like object.
+
+  Returns:
+    The size in bytes, or None if it can't be determined without reading.
+  """
+  if isinstance(data, str):
+    return len(data)
+  if isinstance(data, mmap.mmap):
+    return len(data) - data.tell()
+  try:
+    file_stat = os.fstat(data.fileno())
+    if stat.S_ISREG(file_stat.st_mode):
+      return max(file_stat.st_size - data.tell(), 0)
+  except (AttributeError, IOError, OSError, ValueError):
+    pass
+  try:
+    position = data.tell()
+    data.seek(0, 2)
+    end = data.tell()
+    data.seek(position)
+    return end - position
+  except (AttributeError, IOError, OSError, ValueError):
+    return None
+
+GetBodySize = get_body_size
+
+
+class MultipartBody(object):
+  """A multipart/related request body which is assembled as it is sent.
+
+  Parts may be strings, mmaps or file-like objects. Nothing is read from
+  mmaps or files until the body is sent, and the exact length of the body
+  is worked out from the sizes of the parts, so that media of any size can
+  be uploaded without holding it in memory.
+
+  The body can be sent as the list of pieces returned by get_parts, which
+  lets each file be handed to the connection directly, or read like a file
+  through the read method.
+  """
+
+  def __init__(self, boundary=MIME_BOUNDARY,
+               preamble='Media multipart posting'):
+    """Creates an empty multipart body.
+
+    Args:
+      boundary: str (optional) The MIME boundary between parts. It must not
+          appear in any of the parts.
+      preamble: str (optional) Text placed before the first part, which is
+          ignored by the server.
+    """
+    self.boundary = boundary
+    self.preamble = preamble
+    self._parts = []
+    self._pieces = None
+    self._index = 0
+    self._offset = 0
+
+  def add_part(self, data, mime_type, size=None):
+    """Adds a part to the end of the body.
+
+    Args:
+      data: str, unicode, mmap or file-like object. Unicode is encoded
+          as UTF-8.
+      mime_type: str The Content-Type of this part.
+      size: int (optional) The number of bytes which will be read from data.
+          Required if get_body_size can't determine it.
+    """
+    if isinstance(data, unicode):
+      data = data.encode('utf-8')
+    if size is None:
+      size = get_body_size(data)
+    if size is None:
+      raise UnknownSize('Each part of the body must have a known size.')
+    self._parts.append((data, mime_type, size))
+    self._pieces = None
+
+  AddPart = add_part
+
+  def get_content_type(self):
+    return 'multipart/related; boundary="%s"' % (self.boundary,)
+
+  GetContentType = get_content_type
+
+  def get_parts(self):
+    """Returns the body as a list of strings and the data objects.
+
+    The list can be used as the body parts of an HttpRequest or passed as the
+    data of an atom.http.HttpClient request.
+    """
+    pieces = [self.preamble]
+    for data, mime_type, size in self._parts:
+      pieces.append('\r\n--%s\r\nContent-Type: %s\r\n\r\n' % (
+          self.boundary, mime_type))
+      pieces.append(data)
+    pieces.append('\r\n--%s--\r\n' % (self.boundary,))
+    return pieces
+
+  GetParts = get_parts
+
+  def get_length(self):
+    """Returns the exact length of the body in bytes."""
+    length = len(self.preamble) + len('\r\n--%s--\r\n' % (self.boundary,))
+    for data, mime_type, size in self._parts:
+      length += len('\r\n--%s\r\nContent-Type: %s\r\n\r\n' % (
+          self.boundary, mime_type)) + size
+    return length
+
+  GetLength = get_length
+
+  def read(self, size=-1):
+    """Reads up to size bytes of the encoded body, or the rest of it."""
+    if self._pieces is None:
+      self._pieces = self.get_parts()
+      self._index = 0
+      self._offset = 0
+    chunks = []
+    remaining = size
+    while self._index < len(self._pieces) and (size < 0 or remaining > 0):
+      piece = self._pieces[self._index]
+      if isinstance(piece, str):
+        if size < 0:
+          chunk = piece[self._offset:]
+        else:
+          chunk = piece[self._offset:self._offset + remaining]
+        self._offset += len(chunk)
+        if self._offset >= len(piece):
+          self._index += 1
+          self._offset = 0
+      else:
+        chunk = piece.read(remaining)
+        if not chunk:
+          self._index += 1
+      chunks.append(chunk)
+      remaining -= len(chunk)
+    return ''.join(chunks)
+
+  def _copy(self):
+    new_body = MultipartBody(self.boundary, self.preamble)
+    new_body._parts = self._parts[:]
+    return new_body
+
+
 def _apply_defaults(http_request):
   if http_request.uri.scheme is None:
     if http_request.uri.port == 443:
@@ -394,6 +546,217 @@ class HttpResponse(object):
       return self._body.read(amt)
 
 
+class CompressionStats(object):
+  """Totals for the gzip compression done by an HTTP client.
+
+  Attributes:
+    responses: int The number of gzipped responses read to the end.
+    response_wire_bytes: int The compressed size of those responses.
+    response_bytes: int Their size after decompression.
+    requests: int The number of request bodies which were gzipped.
+    request_bytes: int The size of those bodies before compression.
+    request_wire_bytes: int Their compressed size.
+  """
+
+  def __init__(self):
+    self.responses = 0
+    self.response_wire_bytes = 0
+    self.response_bytes = 0
+    self.requests = 0
+    self.request_bytes = 0
+    self.request_wire_bytes = 0
+
+  def add_response(self, wire_bytes, decoded_bytes):
+    self.responses += 1
+    self.response_wire_bytes += wire_bytes
+    self.response_bytes += decoded_bytes
+
+  def add_request(self, raw_bytes, wire_bytes):
+    self.requests += 1
+    self.request_bytes += raw_bytes
+    self.request_wire_bytes += wire_bytes
+
+  def get_response_ratio(self):
+    """Returns decompressed bytes per byte received, or None."""
+    if not self.response_wire_bytes:
+      return None
+    return float(self.response_bytes) / self.response_wire_bytes
+
+  GetResponseRatio = get_response_ratio
+
+  def get_request_ratio(self):
+    """Returns uncompressed bytes per byte sent, or None."""
+    if not self.request_wire_bytes:
+      return None
+    return float(self.request_bytes) / self.request_wire_bytes
+
+  GetRequestRatio = get_request_ratio
+
+  def __repr__(self):
+    return ('<CompressionStats responses: %d, %d -> %d bytes; '
+            'requests: %d, %d -> %d bytes>' % (
+                self.responses, self.response_wire_bytes, self.response_bytes,
+                self.requests, self.request_bytes, self.request_wire_bytes))
+
+
+def get_compression_stats(http_client):
+  """Returns the CompressionStats kept on an HTTP client, creating it."""
+  stats = getattr(http_client, 'compression_stats', None)
+  if stats is None:
+    stats = CompressionStats()
+    http_client.compression_stats = stats
+  return stats
+
+
+def add_gzip_headers(headers):
+  """Asks the server for a gzipped response.
+
+  Google servers only gzip responses for clients whose User-Agent contains
+  the string gzip, so the token is added to the User-Agent as well.
+
+  Args:
+    headers: dict The request headers, changed in place.
+  """
+  headers['Accept-Encoding'] = 'gzip'
+  user_agent = headers.get('User-Agent', '')
+  if 'gzip' not in user_agent:
+    headers['User-Agent'] = ('%s (gzip)' % user_agent).lstrip()
+
+
+def gzip_string(data, level=6):
+  """Compresses a string into the gzip format."""
+  compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+  return compressor.compress(data) + compressor.flush()
+
+
+def gzip_request_body(http_request, min_size=1024, stats=None):
+  """Gzips the body of a request if it is made of strings and large enough.
+
+  Bodies which include file-like parts are left alone, since compressing
+  them would mean reading them into memory to find the Content-Length.
+
+  Args:
+    http_request: HttpRequest The request to change.
+    min_size: int (optional) Smaller bodies are not worth compressing.
+    stats: CompressionStats (optional) Updated if the body was compressed.
+
+  Returns:
+    True if the body was compressed.
+  """
+  parts = http_request._body_parts
+  if (not parts or 'Content-Encoding' in http_request.headers
+      or [part for part in parts if not isinstance(part, str)]):
+    return False
+  body = ''.join(parts)
+  if len(body) < min_size:
+    return False
+  compressed = gzip_string(body)
+  http_request._body_parts = [compressed]
+  http_request._multipart = None
+  http_request.headers['Content-Encoding'] = 'gzip'
+  http_request.headers['Content-Length'] = str(len(compressed))
+  if stats is not None:
+    stats.add_request(len(body), len(compressed))
+  return True
+
+GzipRequestBody = gzip_request_body
+
+
+def decode_response(request_headers, response, stats=None, debug=False):
+  """Wraps a gzipped response so that reading it returns the plain body.
+
+  The response is only decoded if the request asked for gzip, so callers
+  which set their own Accept-Encoding and decode the body themselves are
+  not affected.
+
+  Args:
+    request_headers: dict The headers sent with the request.
+    response: The httplib.HTTPResponse or HttpResponse from the server.
+    stats: CompressionStats (optional) Updated when the body has been read.
+    debug: bool (optional) Print the compression ratio of the response.
+
+  Returns:
+    A GzipResponse or the original response.
+  """
+  if 'gzip' not in request_headers.get('Accept-Encoding', ''):
+    return response
+  encoding = response.getheader('content-encoding', None) or ''
+  if encoding.strip().lower() != 'gzip':
+    return response
+  return GzipResponse(response, stats, debug)
+
+
+class GzipResponse(object):
+  """A response whose gzipped body is decompressed as it is read.
+
+  The compressed body is read from the wrapped response in chunks and fed
+  through a zlib decompressor, so the compressed and decompressed bodies
+  are never held in memory at the same time. The Content-Encoding and
+  Content-Length headers are hidden since they describe the compressed
+  body. All other attributes come from the wrapped response.
+  """
+
+  def __init__(self, response, stats=None, debug=False):
+    self._response = response
+    self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    self._buffer = ''
+    self._done = False
+    self._stats = stats
+    self._debug = debug
+    self.wire_bytes = 0
+    self.decoded_bytes = 0
+
+  def __getattr__(self, name):
+    return getattr(self._response, name)
+
+  def getheader(self, name, default=None):
+    if name.lower() in ('content-encoding', 'content-length'):
+      return default
+    return self._response.getheader(name, default)
+
+  def getheaders(self):
+    headers = self._response.getheaders()
+    if isinstance(headers, dict):
+      return dict([(name, value) for name, value in headers.iteritems()
+                   if name.lower() not in ('content-encoding',
+                                           'content-length')])
+    return [(name, value) for name, value in headers
+            if name.lower() not in ('content-encoding', 'content-length')]
+
+  def _fill(self):
+    """Decompresses the next chunk of the body into the buffer."""
+    compressed = self._response.read(_GZIP_READ_SIZE)
+    if compressed:
+      self.wire_bytes += len(compressed)
+      decoded = self._decompressor.decompress(compressed)
+    else:
+      decoded = self._decompressor.flush()
+      self._done = True
+      if self._stats is not None:
+        self._stats.add_response(self.wire_bytes,
+                                 self.decoded_bytes + len(decoded))
+      if self._debug:
+        print 'gzip: %d bytes decoded from %d (%.1fx)' % (
+            self.decoded_bytes + len(decoded), self.wire_bytes,
+            float(self.decoded_bytes + len(decoded)) /
+            max(self.wire_bytes, 1))
+    self.decoded_bytes += len(decoded)
+    return decoded
+
+  def read(self, amt=None):
+    if amt is None or amt < 0:
+      chunks = [self._buffer]
+      while not self._done:
+        chunks.append(self._fill())
+      self._buffer = ''
+      return ''.join(chunks)
+    while len(self._buffer) < amt and not self._done:
+      self._buffer += self._fill()
+    data = self._buffer[:amt]
+    self._buffer = self._buffer[amt:]
+    return data
+
+
 def _dump_response(http_response):
   """Converts to a string for printing debug messages.
   
@@ -411,13 +774,61 @@ def _dump_response(http_response):
   return output
 
 
+class UploadStats(object):
+  """Records how much of a request body was sent and how long it took.
+
+  Attributes:
+    bytes_sent: int The number of body bytes written to the connection.
+    seconds: float The time spent writing them.
+    methods: list of str The way each part was sent, one of 'sendfile'
+        (copied by the kernel), 'readinto' (copied through a reusable
+        buffer), 'read' (read a chunk at a time) or 'string'.
+  """
+
+  def __init__(self):
+    self.bytes_sent = 0
+    self.seconds = 0.0
+    self.methods = []
+
+  def add(self, bytes_sent, seconds, method):
+    self.bytes_sent += bytes_sent
+    self.seconds += seconds
+    self.methods.append(method)
+
+  def get_bytes_per_second(self):
+    if not self.seconds:
+      return None
+    return self.bytes_sent / self.seconds
+
+  GetBytesPerSecond = get_bytes_per_second
+
+  def __repr__(self):
+    rate = self.get_bytes_per_second()
+    return '<UploadStats %d bytes in %.3fs (%s) via %s>' % (
+        self.bytes_sent, self.seconds,
+        rate is None and 'n/a' or '%.0f bytes/s' % rate,
+        ', '.join(self.methods))
+
+
 class HttpClient(object):
-  """Performs HTTP requests using httplib."""
+  """Performs HTTP requests using httplib.
+
+  After each request, last_upload holds an UploadStats describing how the
+  request body was sent. Responses to requests which asked for gzip are
+  decompressed as they are read, see decode_response.
+  """
   debug = None
+  last_upload = None
+  # A CompressionStats, created by the first request.
+  compression_stats = None
 
   def request(self, http_request):
-    return self._http_request(http_request.method, http_request.uri,
-                              http_request.headers, http_request._body_parts)
+    response = self._http_request(http_request.method, http_request.uri,
+                                  http_request.headers,
+                                  http_request._body_parts,
+                                  trace=http_request.trace)
+    return decode_response(http_request.headers, response,
+                           get_compression_stats(self), self.debug)
 
   Request = request
 
@@ -442,7 +853,8 @@ class HttpClient(object):
         connection = httplib.HTTPConnection(uri.host, int(uri.port))
     return connection
 
-  def _http_request(self, method, uri, headers=None, body_parts=None):
+  def _http_request(self, method, uri, headers=None, body_parts=None,
+                    trace=None):
     """Makes an HTTP request using httplib.
 
     Args:
@@ -453,15 +865,29 @@ class HttpClient(object):
       body_parts: list of strings, objects with a read method, or objects
                   which can be converted to strings using str. Each of these
                   will be sent in order as the body of the HTTP request.
+      trace: atom.tracing.RequestTrace (optional) Given the time taken to
+             connect, to send the request and to receive the response
+             headers, and the number of body bytes sent.
     """
     if isinstance(uri, (str, unicode)):
       uri = Uri.parse_uri(uri)
 
+    if trace is not None:
+      start = time.time()
     connection = self._get_connection(uri, headers=headers)
 
     if self.debug:
       connection.debuglevel = 1
 
+    if trace is not None:
+      # httplib would connect while sending the headers, which would hide
+      # the connection time in the send time.
+      if getattr(connection, 'sock', None) is None:
+        connection.connect()
+      now = time.time()
+      trace.add('connect', now - start)
+      start = now
+
     if connection.host != uri.host:
       connection.putrequest(method, str(uri))
     else:
@@ -489,32 +915,136 @@ class HttpClient(object):
     connection.endheaders()
 
     # If there is data, send it in the request.
+    upload = UploadStats()
     if body_parts and filter(lambda x: x != '', body_parts):
       for part in body_parts:
-        _send_data_part(part, connection)
+        _send_data_part(part, connection, upload)
+    self.last_upload = upload
 
-    # Return the HTTP Response from the server.
-    return connection.getresponse()
+    if trace is None:
+      # Return the HTTP Response from the server.
+      return connection.getresponse()
+    now = time.time()
+    trace.add('send', now - start)
+    trace.request_bytes = upload.bytes_sent
+    response = connection.getresponse()
+    trace.add('first_byte', time.time() - now)
+    return response
 
 
-def _send_data_part(data, connection):
+def _send_data_part(data, connection, stats=None):
   if isinstance(data, (str, unicode)):
     # I might want to just allow str, not unicode.
-    connection.send(data)
-    return
+    pass
   # Check to see if data is a file-like object that has a read method.
   elif hasattr(data, 'read'):
-    # Read the file and send it a chunk at a time.
-    while 1:
-      binarydata = data.read(100000)
-      if binarydata == '': break
-      connection.send(binarydata)
+    _send_file(data, connection, stats)
     return
   else:
     # The data object was not a file.
     # Try to convert to a string and send the data.
-    connection.send(str(data))
-    return
+    data = str(data)
+  start = time.time()
+  connection.send(data)
+  if stats is not None:
+    stats.add(len(data), time.time() - start, 'string')
+
+
+def _send_file(data, connection, stats=None):
+  """Copies the contents of a file-like object to an HTTP connection.
+
+  A regular file sent over a plain (non-SSL) socket is handed to sendfile,
+  if the os module or the pysendfile package provides it, so the kernel
+  copies the data without it passing through Python strings. Other objects
+  are copied through a reusable buffer using readinto when both ends
+  support it, and otherwise read a chunk at a time.
+
+  Args:
+    data: A file-like object, read from its current position to the end.
+    connection: The httplib.HTTPConnection the request is being sent on.
+    stats: UploadStats (optional) Updated with the bytes sent, time taken
+        and method used.
+
+  Returns:
+    The number of bytes sent.
+  """
+  start = time.time()
+  sock = getattr(connection, 'sock', None)
+  if not isinstance(sock, socket.socket):
+    # Connections wrapped by something other than a socket, such as
+    # tlslite or a test double, only promise to accept strings.
+    sock = None
+
+  sent = None
+  if sock is not None:
+    sent = _sendfile_to_socket(data, sock)
+  if sent is not None:
+    method = 'sendfile'
+  elif sock is not None and hasattr(data, 'readinto'):
+    method = 'readinto'
+    sent = 0
+    buffer = bytearray(UPLOAD_BUFFER_SIZE)
+    view = memoryview(buffer)
+    while 1:
+      size = data.readinto(buffer)
+      if not size: break
+      connection.send(view[:size])
+      sent += size
+  else:
+    method = 'read'
+    sent = 0
+    while 1:
+      binarydata = data.read(UPLOAD_BUFFER_SIZE)
+      if not binarydata: break
+      connection.send(binarydata)
+      sent += len(binarydata)
+
+  if stats is not None:
+    stats.add(sent, time.time() - start, method)
+  return sent
+
+
+def _sendfile_to_socket(data, sock):
+  """Sends a regular file to a plain socket using sendfile.
+
+  Returns:
+    The number of bytes sent, or None if sendfile can not be used, in which
+    case nothing has been sent.
+  """
+  if _sendfile is None or (ssl is not None and isinstance(sock, ssl.SSLSocket)):
+    return None
+  try:
+    in_fd = data.fileno()
+    offset = data.tell()
+    file_stat = os.fstat(in_fd)
+  except (AttributeError, IOError, OSError, ValueError):
+    return None
+  if not stat.S_ISREG(file_stat.st_mode):
+    return None
+  size = file_stat.st_size
+  out_fd = sock.fileno()
+  # Sockets with a timeout are non-blocking underneath.
+  timeout = sock.gettimeout()
+  sent = 0
+  try:
+    while offset + sent < size:
+      try:
+        count = _sendfile(out_fd, in_fd, offset + sent,
+                          min(size - offset - sent, _MAX_SENDFILE_CHUNK))
+      except OSError, e:
+        if e.errno != errno.EAGAIN:
+          raise
+        if not select.select([], [out_fd], [], timeout)[1]:
+          raise socket.timeout('timed out')
+        continue
+      if not count:
+        # The file was truncated while it was being sent.
+        break
+      sent += count
+  finally:
+    # Leave the file where reading it would have.
+    data.seek(offset + sent)
+  return sent
 
 
 class ProxiedHttpClient(HttpClient):
@@ -22,12 +22,24 @@ __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
 import StringIO
+import math
 import pickle
 import os.path
+import struct
 import tempfile
+import threading
+import time
 import atom.http_core
 
 
+# The first line of a recordings file in the streaming format. Files without
+# it hold a single pickled list of recordings.
+RECORDINGS_FORMAT = 'atom.mock_http_core recordings 1\n'
+# Each recording in a streaming file starts with the lengths of the pickled
+# request and the pickled response which follow it.
+_RECORD_HEADER = struct.Struct('>II')
+
+
 class Error(Exception):
   pass
 
@@ -53,6 +65,16 @@ class MockHttpClient(object):
     self._recordings = recordings or []
     if real_client is not None:
       self.real_client = real_client
+    # Maps (method, host, path, gsessionid) to the positions of the matching
+    # recordings, in order. It is brought up to date by _find_recording.
+    self._index = {}
+    self._indexed_recordings = None
+    self._indexed_count = 0
+    self._index_lock = threading.Lock()
+    # The open streaming file which the responses of loaded recordings are
+    # read from.
+    self._recordings_file = None
+    self._recordings_file_lock = threading.Lock()
 
   def add_response(self, http_request, status, reason, headers=None,
       body=None):
@@ -74,9 +96,11 @@ class MockHttpClient(object):
     _scrub_request(request)
     if self.real_client is None:
       self.last_request_was_live = False
-      for recording in self._recordings:
-        if _match_request(recording[0], request):
-          return recording[1]
+      recording = self._find_recording(request)
+      if recording is not None:
+        if isinstance(recording[1], _StoredResponse):
+          return self._read_response(recording[1])
+        return recording[1]
     else:
       # Pass along the debug settings to the real client.
       self.real_client.debug = self.debug
@@ -95,19 +119,107 @@ class MockHttpClient(object):
 
   Request = request
 
+  def _find_recording(self, request):
+    """Finds the first recording which matches the request.
+
+    Gives the same recording as checking each one with _match_request, but
+    only looks at the recordings with the same method, path and gsessionid
+    and a matching host. Recordings without a host match any host.
+    """
+    self._index_lock.acquire()
+    try:
+      if (self._indexed_recordings is not self._recordings
+          or self._indexed_count > len(self._recordings)):
+        self._index = {}
+        self._indexed_recordings = self._recordings
+        self._indexed_count = 0
+      for position in xrange(self._indexed_count, len(self._recordings)):
+        recorded = self._recordings[position][0]
+        key = _request_key(recorded, recorded.uri.host)
+        self._index.setdefault(key, []).append(position)
+      self._indexed_count = len(self._recordings)
+      candidates = []
+      for host in (request.uri.host, None):
+        positions = self._index.get(_request_key(request, host))
+        if positions:
+          candidates.append(positions[0])
+      if candidates:
+        return self._recordings[min(candidates)]
+      return None
+    finally:
+      self._index_lock.release()
+
   def _save_recordings(self, filename):
-    recording_file = open(os.path.join(tempfile.gettempdir(), filename),
-                          'wb')
-    pickle.dump(self._recordings, recording_file)
-    recording_file.close()
+    """Writes the recordings to a file in the streaming format.
+
+    Each recording is pickled on its own, so a file can be loaded without
+    reading the responses until they are requested.
+    """
+    full_path = os.path.join(tempfile.gettempdir(), filename)
+    recording_file = open(full_path + '.tmp', 'wb')
+    try:
+      recording_file.write(RECORDINGS_FORMAT)
+      for request, response in self._recordings:
+        if isinstance(response, _StoredResponse):
+          response = self._read_response(response)
+        pickled_request = pickle.dumps(request, pickle.HIGHEST_PROTOCOL)
+        pickled_response = pickle.dumps(response, pickle.HIGHEST_PROTOCOL)
+        recording_file.write(_RECORD_HEADER.pack(len(pickled_request),
+                                                 len(pickled_response)))
+        recording_file.write(pickled_request)
+        recording_file.write(pickled_response)
+    finally:
+      recording_file.close()
+    if os.name == 'nt' and os.path.exists(full_path):
+      os.remove(full_path)
+    os.rename(full_path + '.tmp', full_path)
 
   def _load_recordings(self, filename):
+    """Reads the recordings saved in a file.
+
+    For files in the streaming format only the requests are read, and the
+    file is kept open to read each response when it is replayed. Files
+    holding one pickled list are read in full.
+    """
+    self._close_recordings_file()
     recording_file = open(os.path.join(tempfile.gettempdir(), filename),
                           'rb')
-    self._recordings = pickle.load(recording_file)
-    recording_file.close()
+    if recording_file.readline() != RECORDINGS_FORMAT:
+      recording_file.seek(0)
+      try:
+        self._recordings = pickle.load(recording_file)
+      finally:
+        recording_file.close()
+      return
+    recordings = []
+    while True:
+      header = recording_file.read(_RECORD_HEADER.size)
+      if not header:
+        break
+      request_length, response_length = _RECORD_HEADER.unpack(header)
+      request = pickle.loads(recording_file.read(request_length))
+      response = _StoredResponse(recording_file.tell(), response_length)
+      recording_file.seek(response_length, 1)
+      recordings.append((request, response))
+    self._recordings = recordings
+    self._recordings_file = recording_file
+
+  def _read_response(self, stored_response):
+    self._recordings_file_lock.acquire()
+    try:
+      self._recordings_file.seek(stored_response.offset)
+      pickled_response = self._recordings_file.read(stored_response.length)
+    finally:
+      self._recordings_file_lock.release()
+    return pickle.loads(pickled_response)
+
+  def _close_recordings_file(self):
+    if self._recordings_file is not None:
+      self._recordings_file.close()
+      self._recordings_file = None
 
   def _delete_recordings(self, filename):
+    self._close_recordings_file()
     full_path = os.path.join(tempfile.gettempdir(), filename)
     if os.path.exists(full_path):
       os.remove(full_path)
@@ -205,6 +317,24 @@ def _match_request(http_request, stored_request):
   return True
 
 
+def _request_key(http_request, host):
+  """Gives the index key of a request, using the host name passed in.
+
+  Two requests match in _match_request if the recorded request has no host
+  or the same host, and both have the same key otherwise.
+  """
+  return (http_request.method, host, http_request.uri.path,
+          http_request.uri.query.get('gsessionid'))
+
+
+class _StoredResponse(object):
+  """The place of a pickled response in a streaming recordings file."""
+
+  def __init__(self, offset, length):
+    self.offset = offset
+    self.length = length
+
+
 def _scrub_request(http_request):
   """ Removes email address and password from a client login request.
 
@@ -321,3 +451,192 @@ class MockHttpResponse(atom.http_core.HttpResponse):
 
   def read(self):
     return self._body
+
+
+class LatencyHttpClient(object):
+  """Delays each request before passing it on to another HTTP client.
+
+  Used to give replayed responses the timing of a real server. The number
+  of requests made is counted in the requests member.
+  """
+
+  def __init__(self, http_client, latency=None):
+    """Wraps an HTTP client.
+
+    Args:
+      http_client: The client which makes the requests, usually a
+                   MockHttpClient replaying recordings.
+      latency: float or function (optional) The seconds to wait before each
+               request, or a function which is given the HttpRequest and
+               returns the seconds to wait. No delay is added if None.
+    """
+    self.http_client = http_client
+    self.latency = latency
+    self.requests = 0
+    self._lock = threading.Lock()
+
+  def request(self, http_request):
+    self._lock.acquire()
+    try:
+      self.requests += 1
+    finally:
+      self._lock.release()
+    if callable(self.latency):
+      delay = self.latency(http_request)
+    else:
+      delay = self.latency
+    if delay:
+      time.sleep(delay)
+    return self.http_client.request(http_request)
+
+  Request = request
+
+
+class ReplayResult(object):
+  """The measurements from a ReplayLoadTest run.
+
+  Attributes:
+    operations: int The number of calls to the action which succeeded.
+    throughput: float The successful calls per second.
+    errors: list of the exceptions raised by the action.
+    requests: int The number of HTTP requests made by the action.
+    elapsed: float The seconds from the start to the end of the run.
+    latencies: list of floats The seconds each successful call took, sorted.
+  """
+
+  def __init__(self, latencies, errors, requests, elapsed):
+    self.latencies = sorted(latencies)
+    self.operations = len(latencies)
+    self.errors = errors
+    self.requests = requests
+    self.elapsed = elapsed
+    if elapsed:
+      self.throughput = self.operations / elapsed
+    else:
+      self.throughput = 0.0
+
+  def percentile(self, percent):
+    """Returns the latency in seconds which percent of the calls were within.
+
+    Args:
+      percent: float between 0 and 100, for example 50 for the median or 99.
+    """
+    if not self.latencies:
+      return None
+    rank = int(math.ceil(percent / 100.0 * len(self.latencies))) - 1
+    return self.latencies[max(0, min(rank, len(self.latencies) - 1))]
+
+  Percentile = percentile
+
+  def __str__(self):
+    summary = '%i operations (%i errors, %i requests) in %.2fs: %.1f/s' % (
+        self.operations, len(self.errors), self.requests, self.elapsed,
+        self.throughput)
+    if self.latencies:
+      summary += ', latency p50 %.1fms p90 %.1fms p99 %.1fms max %.1fms' % (
+          self.percentile(50) * 1000, self.percentile(90) * 1000,
+          self.percentile(99) * 1000, self.latencies[-1] * 1000)
+    return summary
+
+
+class ReplayLoadTest(object):
+  """Drives a client pipeline concurrently against recorded responses.
+
+  The action is a function which is given an HTTP client and performs one
+  operation with it, for example building a GDClient with the HTTP client
+  and reading a feed. Several threads call the action at once, and each
+  call is timed. The HTTP client given to the action replays the
+  recordings of a MockHttpClient, after the configured latency.
+
+  Example Usage:
+  replay_client = atom.mock_http_core.MockHttpClient()
+  replay_client.use_cached_session('gdata_live_test.my_case.my_test')
+  def ReadFeed(http_client):
+    client = gdata.client.GDClient(http_client=http_client)
+    client.get_feed('http://example.com/feed', desired_class=MyFeed)
+  load_test = atom.mock_http_core.ReplayLoadTest(replay_client, workers=8,
+                                                 latency=0.05)
+  print load_test.run(ReadFeed, operations=1000)
+  """
+
+  def __init__(self, http_client, workers=4, latency=None):
+    """Configures the load test.
+
+    Args:
+      http_client: MockHttpClient The client holding the recordings. It
+                   should not have a real_client, so that no live requests
+                   are made.
+      workers: int (optional) The number of threads calling the action.
+      latency: float or function (optional) The delay added to each
+               request, as in LatencyHttpClient.
+    """
+    self.http_client = http_client
+    self.workers = workers
+    self.latency = latency
+
+  def run(self, action, operations=100, duration=None):
+    """Calls the action from all of the worker threads.
+
+    Args:
+      action: function Called with an HTTP client for each operation.
+      operations: int (optional) The total number of calls to make.
+      duration: float (optional) If set, the workers keep calling the action
+                for this many seconds instead of making a set number of
+                calls.
+
+    Returns:
+      A ReplayResult.
+    """
+    client = LatencyHttpClient(self.http_client, self.latency)
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+    # The number of calls which have not been started yet.
+    remaining = [operations]
+    start = time.time()
+    if duration is not None:
+      deadline = start + duration
+    else:
+      deadline = None
+
+    def work():
+      while True:
+        lock.acquire()
+        try:
+          if deadline is None:
+            if remaining[0] <= 0:
+              return
+            remaining[0] -= 1
+        finally:
+          lock.release()
+        if deadline is not None and time.time() >= deadline:
+          return
+        call_start = time.time()
+        try:
+          action(client)
+        except Exception, e:
+          lock.acquire()
+          try:
+            errors.append(e)
+          finally:
+            lock.release()
+        else:
+          call_time = time.time() - call_start
+          lock.acquire()
+          try:
+            latencies.append(call_time)
+          finally:
+            lock.release()
+
+    threads = []
+    for i in xrange(self.workers):
+      thread = threading.Thread(target=work)
+      thread.setDaemon(True)
+      thread.start()
+      threads.append(thread)
+    for thread in threads:
+      thread.join()
+    return ReplayResult(latencies, errors, client.requests,
+                        time.time() - start)
+
+  Run = run
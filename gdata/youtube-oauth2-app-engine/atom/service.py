@@ -33,6 +33,7 @@ __author__ = 'api.jscudder (Jeff Scudder)'
 import atom.http_interface
 import atom.url
 import atom.http
+import atom.http_core
 import atom.token_store
 
 import os
@@ -69,6 +70,11 @@ class AtomService(object):
   current_token = None
   auto_store_tokens = True
   auto_set_current_token = True
+  # Ask the server to gzip responses, they are decompressed as they are read.
+  gzip = False
+  # If set, request bodies of at least this many bytes are gzipped, unless
+  # they include file-like objects.
+  gzip_request_min_size = None
 
   def _get_override_token(self):
     return self.current_token
@@ -169,6 +175,12 @@ class AtomService(object):
     all_headers = self.additional_headers.copy()
     if headers:
       all_headers.update(headers)
+    if self.gzip:
+      atom.http_core.add_gzip_headers(all_headers)
+
+    if (data and self.gzip_request_min_size is not None
+        and 'Content-Encoding' not in all_headers):
+      data = self._gzip_data(data, all_headers)
 
     # If the list of headers does not include a Content-Length, attempt to
     # calculate it based on the data object.
@@ -182,13 +194,47 @@ class AtomService(object):
       auth_token = self.override_token
     else:
       auth_token = self.token_store.find_token(url)
-    return auth_token.perform_request(self.http_client, operation, url, 
+    response = auth_token.perform_request(self.http_client, operation, url, 
         data=data, headers=all_headers)
+    return atom.http_core.decode_response(all_headers, response,
+        atom.http_core.get_compression_stats(self.http_client),
+        self.debug)
 
   request = atom.v1_deprecated(
       'Please use atom.client.AtomPubClient for requests.')(
           request)
 
+  def _gzip_data(self, data, headers):
+    """Compresses string and XML request bodies which are large enough.
+
+    Returns:
+      The data to send, which is a gzipped string if it was compressed.
+    """
+    parts = data
+    if not isinstance(data, list):
+      parts = [data]
+    strings = []
+    for part in parts:
+      if ElementTree.iselement(part):
+        strings.append(ElementTree.tostring(part))
+      elif isinstance(part, unicode):
+        strings.append(part.encode('utf-8'))
+      elif isinstance(part, str):
+        strings.append(part)
+      elif hasattr(part, 'read'):
+        return data
+      else:
+        strings.append(str(part))
+    body = ''.join(strings)
+    if len(body) < self.gzip_request_min_size:
+      return data
+    compressed = atom.http_core.gzip_string(body)
+    headers['Content-Encoding'] = 'gzip'
+    headers['Content-Length'] = str(len(compressed))
+    atom.http_core.get_compression_stats(self.http_client).add_request(
+        len(body), len(compressed))
+    return compressed
+
   # CRUD operations
   def Get(self, uri, extra_headers=None, url_params=None, escape_params=True):
     """Query the APP server with the given URI
@@ -624,8 +670,9 @@ def HttpRequest(service, operation, data, uri, extra_headers=None,
     data: ElementTree, filestream, list of parts, or other object which can be 
         converted to a string. 
         Should be set to None when performing a GET or PUT.
-        If data is a file-like object which can be read, this method will read
-        a chunk of 100K bytes at a time and send them. 
+        If data is a file-like object which can be read, this method will
+        send it with sendfile when it is a regular file and the connection
+        is not SSL, otherwise it reads and sends a chunk at a time. 
         If the data is a list of parts to be sent, each part will be evaluated
         and sent.
     uri: The beginning of the URL to which the request should be sent. 
@@ -700,11 +747,7 @@ def __SendDataPart(data, connection):
     return
   # Check to see if data is a file-like object that has a read method.
   elif hasattr(data, 'read'):
-    # Read the file and send it a chunk at a time.
-    while 1:
-      binarydata = data.read(100000)
-      if binarydata == '': break
-      connection.send(binarydata)
+    atom.http_core._send_file(data, connection)
     return
   else:
     # The data object was not a file.
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2011 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# This module is used for version 2 of the Google Data APIs.
+
+
+"""Records where the time of each request made by an AtomPubClient goes.
+
+Every AtomPubClient has a tracer. The default, NULL_TRACER, records nothing
+and costs one method call per request. Give a client a HistogramTracer to
+collect timings:
+
+  tracer = atom.tracing.HistogramTracer()
+  client.tracer = tracer
+  client.get_feed(...)
+  print tracer.report()
+
+The phases of a request are timed separately, in seconds:
+  modify_request: Building the request, including signing it with the token.
+  http: The call to the HTTP client's request method. With the default
+      atom.http_core.HttpClient this is made up of the three phases below.
+  connect: Opening the connection to the server.
+  send: Sending the request line, headers and body.
+  first_byte: Waiting for the status line and headers of the response.
+  read: Reading the response body.
+  parse: Turning the body into an XML tree (or decoding the JSON).
+  convert: Building the XmlElement objects from the tree.
+  total: From the start of the request until the trace was finished.
+"""
+
+
+import bisect
+import random
+import threading
+import time
+
+
+class RequestTrace(object):
+  """The timings and byte counts of one request.
+
+  Attributes:
+    timings: dict Maps the name of each phase to the seconds spent in it.
+    method: str The HTTP method, once the request has been built.
+    host: str The host the request was sent to.
+    path: str The path of the request URI.
+    status: int The status of the response, once it has been received.
+    request_bytes: int The number of body bytes sent, if the HTTP client
+        reports it.
+    response_bytes: int The number of body bytes read by the caller.
+  """
+  method = None
+  host = None
+  path = None
+  status = None
+  request_bytes = None
+
+  def __init__(self):
+    self.start_time = time.time()
+    self.timings = {}
+    self.response_bytes = 0
+
+  def add(self, phase, seconds):
+    """Adds time to a phase. A phase may be timed in several pieces."""
+    self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+  Add = add
+
+  def set_request(self, http_request):
+    self.method = http_request.method
+    self.host = http_request.uri.host
+    self.path = http_request.uri.path
+
+  SetRequest = set_request
+
+  def __repr__(self):
+    phases = ', '.join(['%s %.1fms' % (phase, seconds * 1000)
+                        for phase, seconds in sorted(self.timings.items())])
+    return '<RequestTrace %s %s%s %s: %s>' % (
+        self.method, self.host, self.path, self.status, phases)
+
+
+class Tracer(object):
+  """Decides which requests are traced and receives the finished traces.
+
+  This class records nothing; subclasses override start and finish.
+  """
+
+  def start(self):
+    """Returns a new RequestTrace, or None if the request is not traced."""
+    return None
+
+  Start = start
+
+  def finish(self, trace):
+    """Called with each trace once its request is complete."""
+    pass
+
+  Finish = finish
+
+
+NULL_TRACER = Tracer()
+
+
+class TracedResponse(object):
+  """Times the reads of a response body and counts the bytes read.
+
+  Every other attribute is taken from the wrapped response.
+  """
+
+  def __init__(self, response, trace, tracer=None):
+    """Wraps a response.
+
+    Args:
+      response: The HTTP response.
+      trace: RequestTrace The trace of the request which got the response.
+      tracer: Tracer (optional) If given, the trace is passed to its finish
+          method when the body has been read to the end.
+    """
+    self._response = response
+    self.trace = trace
+    self._tracer = tracer
+
+  def __getattr__(self, name):
+    return getattr(self._response, name)
+
+  def read(self, amt=None):
+    start = time.time()
+    if amt is None:
+      data = self._response.read()
+    else:
+      data = self._response.read(amt)
+    self.trace.add('read', time.time() - start)
+    if data:
+      self.trace.response_bytes += len(data)
+    if self._tracer is not None and (amt is None or not data):
+      tracer = self._tracer
+      self._tracer = None
+      tracer.finish(self.trace)
+    return data
+
+
+class Histogram(object):
+  """Counts values in buckets whose upper bounds grow exponentially.
+
+  Percentiles are given as the upper bound of the bucket they fall in, so
+  they are accurate to within the bucket width.
+  """
+
+  def __init__(self, bounds):
+    """Args:
+      bounds: list of floats The sorted upper bounds of the buckets. Values
+          above the last bound are counted in one more bucket.
+    """
+    self.bounds = bounds
+    self.counts = [0] * (len(bounds) + 1)
+    self.count = 0
+    self.total = 0.0
+    self.min = None
+    self.max = None
+
+  def add(self, value):
+    self.counts[bisect.bisect_left(self.bounds, value)] += 1
+    self.count += 1
+    self.total += value
+    if self.min is None or value < self.min:
+      self.min = value
+    if self.max is None or value > self.max:
+      self.max = value
+
+  Add = add
+
+  def get_mean(self):
+    if not self.count:
+      return None
+    return self.total / self.count
+
+  GetMean = get_mean
+
+  def percentile(self, percent):
+    """Returns the value which percent of the values are within, or None."""
+    if not self.count:
+      return None
+    rank = percent / 100.0 * self.count
+    seen = 0
+    for i, bucket_count in enumerate(self.counts):
+      seen += bucket_count
+      if seen >= rank and bucket_count:
+        if i < len(self.bounds):
+          return min(self.bounds[i], self.max)
+        return self.max
+    return self.max
+
+  Percentile = percentile
+
+
+# From 0.1 milliseconds to about 100 seconds.
+DEFAULT_BOUNDS = [0.0001 * 2 ** i for i in range(21)]
+
+
+class HistogramTracer(Tracer):
+  """Keeps a histogram of the time spent in each phase of the requests.
+
+  The tracer may be shared by clients used from several threads.
+
+  Attributes:
+    requests: int The number of traces finished.
+    request_bytes: int The total body bytes sent by the traced requests.
+    response_bytes: int The total body bytes read from their responses.
+    statuses: dict Maps each response status to the number of responses.
+  """
+
+  def __init__(self, sample_rate=1.0, bounds=None):
+    """Creates an empty collector.
+
+    Args:
+      sample_rate: float (optional) The fraction of requests to trace, so
+          that a busy server can be watched at a lower cost.
+      bounds: list of floats (optional) The upper bounds in seconds of the
+          histogram buckets. Defaults to DEFAULT_BOUNDS.
+    """
+    self.sample_rate = sample_rate
+    self.bounds = bounds or DEFAULT_BOUNDS
+    self.histograms = {}
+    self.requests = 0
+    self.request_bytes = 0
+    self.response_bytes = 0
+    self.statuses = {}
+    self._lock = threading.Lock()
+
+  def start(self):
+    if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+      return None
+    return RequestTrace()
+
+  def finish(self, trace):
+    total = time.time() - trace.start_time
+    self._lock.acquire()
+    try:
+      self.requests += 1
+      if trace.request_bytes:
+        self.request_bytes += trace.request_bytes
+      self.response_bytes += trace.response_bytes
+      self.statuses[trace.status] = self.statuses.get(trace.status, 0) + 1
+      for phase, seconds in trace.timings.iteritems():
+        self._get_histogram(phase).add(seconds)
+      self._get_histogram('total').add(total)
+    finally:
+      self._lock.release()
+
+  def _get_histogram(self, phase):
+    histogram = self.histograms.get(phase)
+    if histogram is None:
+      histogram = Histogram(self.bounds)
+      self.histograms[phase] = histogram
+    return histogram
+
+  def get_histogram(self, phase):
+    """Returns the Histogram of a phase, or None if it was never timed."""
+    return self.histograms.get(phase)
+
+  GetHistogram = get_histogram
+
+  def report(self):
+    """Returns a table of the phase timings in milliseconds."""
+    self._lock.acquire()
+    try:
+      lines = ['%d requests, %d bytes sent, %d bytes read' % (
+          self.requests, self.request_bytes, self.response_bytes),
+               '%-15s %7s %9s %9s %9s %9s %9s' % (
+          'phase', 'count', 'mean', 'p50', 'p90', 'p99', 'max')]
+      for phase in sorted(self.histograms):
+        histogram = self.histograms[phase]
+        lines.append('%-15s %7d %9.2f %9.2f %9.2f %9.2f %9.2f' % (
+            phase, histogram.count, histogram.get_mean() * 1000,
+            histogram.percentile(50) * 1000, histogram.percentile(90) * 1000,
+            histogram.percentile(99) * 1000, histogram.max * 1000))
+      return '\n'.join(lines)
+    finally:
+      self._lock.release()
+
+  Report = report
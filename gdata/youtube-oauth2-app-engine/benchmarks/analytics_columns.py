@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compares reading an Analytics data feed by entry and by column.
+
+A data feed with two dimensions and several metrics is generated. The first
+way of reading it is how the segment demo does it: parse it into a DataFeed,
+then call get_object and float for each metric of each entry. It is compared
+with building a DataTable from the parsed DataFeed, and with decoding the
+XML straight into a DataTable. Then the cost of a derived metric, a group by
+and joining the pages of a feed is measured on the table.
+
+Usage:
+  python benchmarks/analytics_columns.py --rows 10000 --metrics 10
+"""
+
+import gc
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import atom.core
+import gdata.analytics.columns
+import gdata.analytics.data
+
+
+SOURCES = ['google', 'facebook', 'twitter', '(direct)', 'example.com']
+
+ENTRY = ("<entry><id>http://www.google.com/analytics/feeds/data?row=%(i)d</id>"
+         "<updated>2011-03-01T00:00:00.000-08:00</updated>"
+         "<title>ga:source=%(source)s | ga:date=%(date)s</title>"
+         "<link rel='alternate' type='text/html' href='http://www.google.com/analytics'/>"
+         "<dxp:dimension name='ga:source' value='%(source)s'/>"
+         "<dxp:dimension name='ga:date' value='%(date)s'/>"
+         "%(metrics)s</entry>")
+
+METRIC = "<dxp:metric confidenceInterval='0.0' name='%s' type='integer' value='%d'/>"
+
+
+def metric_names(count):
+  names = ['ga:visits', 'ga:pageviews']
+  return names + ['ga:metric%d' % i for i in range(count - len(names))]
+
+
+def make_feed(rows, metrics):
+  names = metric_names(metrics)
+  entries = []
+  for i in xrange(rows):
+    values = [i % 97 + 1] + [(i * (m + 3)) % 1000 for m in range(metrics - 1)]
+    entries.append(ENTRY % {
+        'i': i, 'source': SOURCES[i % len(SOURCES)],
+        'date': '201103%02d' % (i % 28 + 1),
+        'metrics': ''.join([METRIC % item for item in zip(names, values)])})
+  return ("<?xml version='1.0' encoding='UTF-8'?>"
+          "<feed xmlns='http://www.w3.org/2005/Atom' "
+          "xmlns:dxp='http://schemas.google.com/analytics/2009' "
+          "xmlns:openSearch='http://a9.com/-/spec/opensearch/1.1/'>"
+          "<id>http://www.google.com/analytics/feeds/data</id>"
+          "<updated>2011-03-01T00:00:00.000-08:00</updated>"
+          "<title>Google Analytics Data</title>"
+          "<openSearch:totalResults>%d</openSearch:totalResults>"
+          "%s</feed>") % (rows, ''.join(entries))
+
+
+def parse_feed(document):
+  return atom.core.parse(document, gdata.analytics.data.DataFeed)
+
+
+def read_by_entry(feed, names):
+  rows = []
+  for entry in feed.entry:
+    data = {}
+    for name in names:
+      data[name] = float(entry.get_object(name).value)
+    rows.append(data)
+  return rows
+
+
+def timed(function, *args):
+  gc.collect()
+  start = time.time()
+  result = function(*args)
+  return result, time.time() - start
+
+
+def main():
+  parser = optparse.OptionParser()
+  parser.add_option('--rows', type='int', default=10000)
+  parser.add_option('--metrics', type='int', default=10)
+  parser.add_option('--pages', type='int', default=10,
+                    help='pages the rows are split into to time joining')
+  options, args = parser.parse_args()
+
+  names = metric_names(options.metrics)
+  document = make_feed(options.rows, options.metrics)
+  print '%d rows, %d metrics, %d bytes of XML' % (
+      options.rows, options.metrics, len(document))
+
+  feed, parse_time = timed(parse_feed, document)
+  rows, entry_time = timed(read_by_entry, feed, names)
+  from_feed, from_feed_time = timed(
+      gdata.analytics.columns.DataTable.from_feed, feed)
+  table, table_time = timed(gdata.analytics.columns.DataTable.parse, document)
+  for name in names:
+    expected = [row[name] for row in rows]
+    if (list(from_feed.metrics[name]) != expected or
+        list(table.metrics[name]) != expected):
+      raise AssertionError('The tables differ from the entries in %s' % name)
+
+  print 'DataFeed parse:                %8.1f ms' % (parse_time * 1000)
+  print '  + get_object and float:      %8.1f ms' % (entry_time * 1000)
+  print '  + DataTable.from_feed:       %8.1f ms' % (from_feed_time * 1000)
+  print 'DataTable.parse:               %8.1f ms' % (table_time * 1000)
+
+  start = time.time()
+  for row in rows:
+    row['pagesPerVisit'] = row['ga:pageviews'] / row['ga:visits']
+  dict_ratio_time = time.time() - start
+  start = time.time()
+  table.add_ratio('pagesPerVisit', 'ga:pageviews', 'ga:visits')
+  ratio_time = time.time() - start
+  print 'derived metric: dicts %.2f ms, columns %.2f ms' % (
+      dict_ratio_time * 1000, ratio_time * 1000)
+
+  grouped, group_time = timed(table.group_by, 'ga:source')
+  print 'group by ga:source (%d groups): %.2f ms' % (
+      len(grouped), group_time * 1000)
+
+  page_size = options.rows // options.pages + 1
+  pages = []
+  for i in range(0, options.rows, page_size):
+    pages.append(gdata.analytics.columns.DataTable.parse(make_feed(
+        min(page_size, options.rows - i), options.metrics)))
+  joined, join_time = timed(gdata.analytics.columns.DataTable.concat, pages)
+  print 'concat of %d pages (%d rows): %.2f ms' % (
+      len(pages), len(joined), join_time * 1000)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compares decoding the same GData feed from XML and from JSON (alt=json).
+
+A YouTube video feed is generated as Atom XML and converted to the GData
+JSON format, so both documents hold exactly the same data. Each document is
+decoded into gdata.youtube.data.VideoFeed objects, and the results are
+compared before anything is timed. Memory is the growth of the peak
+resident set size while decoding, measured in a fresh child process for each
+format.
+
+Usage:
+  python benchmarks/gdata_json_decode.py --entries 200 --repeat 5
+"""
+
+import gc
+import optparse
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import atom.core
+import gdata.client
+import gdata.data
+import gdata.youtube.data
+from atom.core import ElementTree, simplejson
+
+
+NAMESPACES = {
+    'openSearch': 'http://a9.com/-/spec/opensearch/1.1/',
+    'gd': 'http://schemas.google.com/g/2005',
+    'media': 'http://search.yahoo.com/mrss/',
+    'yt': 'http://gdata.youtube.com/schemas/2007',
+    'app': 'http://www.w3.org/2007/app',
+}
+
+ENTRY = """<entry gd:etag='W/"CEINR347eCp7I2A9WhFXFE4."'>
+  <id>tag:youtube.com,2008:video:video%(i)d</id>
+  <published>2011-03-01T12:00:00.000Z</published>
+  <updated>2011-03-02T12:00:00.000Z</updated>
+  <category scheme='http://schemas.google.com/g/2005#kind'
+      term='http://gdata.youtube.com/schemas/2007#video'/>
+  <category scheme='http://gdata.youtube.com/schemas/2007/categories.cat'
+      term='Tech' label='Science &amp; Technology'/>
+  <title>Video number %(i)d</title>
+  <content type='application/x-shockwave-flash'
+      src='http://www.youtube.com/v/video%(i)d?f=videos&amp;app=youtube_gdata'/>
+  <link rel='alternate' type='text/html'
+      href='http://www.youtube.com/watch?v=video%(i)d&amp;feature=youtube_gdata'/>
+  <link rel='self' type='application/atom+xml'
+      href='https://gdata.youtube.com/feeds/api/videos/video%(i)d?v=2'/>
+  <author><name>GoogleDevelopers</name>
+    <uri>https://gdata.youtube.com/feeds/api/users/googledevelopers</uri>
+  </author>
+  <yt:accessControl action='comment' permission='allowed'/>
+  <yt:accessControl action='rate' permission='allowed'/>
+  <gd:comments><gd:feedLink rel='http://gdata.youtube.com/schemas/2007#comments'
+      href='https://gdata.youtube.com/feeds/api/videos/video%(i)d/comments?v=2'
+      countHint='%(i)d'/></gd:comments>
+  <media:group>
+    <media:category label='Science &amp; Technology'
+        scheme='http://gdata.youtube.com/schemas/2007/categories.cat'>Tech</media:category>
+    <media:content url='http://www.youtube.com/v/video%(i)d' type='application/x-shockwave-flash'
+        medium='video' isDefault='true' expression='full' duration='%(i)d'
+        yt:format='5'/>
+    <media:credit role='uploader' scheme='urn:youtube'
+        yt:display='Google Developers'>googledevelopers</media:credit>
+    <media:description type='plain'>A description of video %(i)d, which is
+        a little longer than the title so that text decoding is measured.</media:description>
+    <media:keywords>google, developers, api, video %(i)d</media:keywords>
+    <media:player url='http://www.youtube.com/watch?v=video%(i)d'/>
+    <media:thumbnail url='http://i.ytimg.com/vi/video%(i)d/default.jpg'
+        height='90' width='120' time='00:01:00' yt:name='default'/>
+    <media:thumbnail url='http://i.ytimg.com/vi/video%(i)d/hqdefault.jpg'
+        height='360' width='480' yt:name='hqdefault'/>
+    <media:title type='plain'>Video number %(i)d</media:title>
+    <yt:duration seconds='%(i)d'/>
+    <yt:uploaded>2011-03-01T12:00:00.000Z</yt:uploaded>
+    <yt:videoid>video%(i)d</yt:videoid>
+  </media:group>
+  <gd:rating average='4.8' max='5' min='1' numRaters='%(i)d'
+      rel='http://schemas.google.com/g/2005#overall'/>
+  <yt:statistics favoriteCount='%(i)d' viewCount='%(i)d000'/>
+</entry>"""
+
+
+def make_xml_feed(entries):
+  declarations = ' '.join(["xmlns:%s='%s'" % item
+                           for item in sorted(NAMESPACES.items())])
+  return ("<?xml version='1.0' encoding='UTF-8'?>"
+          "<feed xmlns='http://www.w3.org/2005/Atom' %s>"
+          "<id>tag:youtube.com,2008:standardfeed:us:most_popular</id>"
+          "<updated>2011-03-02T12:00:00.000Z</updated>"
+          "<title>Most Popular</title>"
+          "<openSearch:totalResults>%d</openSearch:totalResults>"
+          "<openSearch:startIndex>1</openSearch:startIndex>"
+          "<openSearch:itemsPerPage>%d</openSearch:itemsPerPage>"
+          "%s</feed>") % (declarations, entries, entries,
+                          ''.join([ENTRY % {'i': i} for i in range(entries)]))
+
+
+def _json_name(qname, default_namespace, prefixes):
+  if not qname.startswith('{'):
+    return qname
+  namespace, name = qname[1:].split('}')
+  if namespace == default_namespace:
+    return name
+  return '%s$%s' % (prefixes[namespace], name)
+
+
+def _json_text(text):
+  # Numeric element values such as openSearch$totalResults are JSON numbers.
+  if text.isdigit():
+    return int(text)
+  return text
+
+
+def xml_to_json(xml_string):
+  """Converts an Atom document to the GData JSON format."""
+  prefixes = dict([(uri, prefix) for prefix, uri in NAMESPACES.items()])
+  atom_namespace = 'http://www.w3.org/2005/Atom'
+
+  def convert(element):
+    data = {}
+    for qname, value in element.attrib.items():
+      data[_json_name(qname, None, prefixes)] = value
+    for child in element:
+      name = _json_name(child.tag, atom_namespace, prefixes)
+      if name in data:
+        if not isinstance(data[name], list):
+          data[name] = [data[name]]
+        data[name].append(convert(child))
+      else:
+        data[name] = convert(child)
+    if element.text and element.text.strip():
+      data['$t'] = _json_text(element.text)
+    return data
+
+  root = ElementTree.fromstring(xml_string)
+  feed = convert(root)
+  feed['xmlns'] = atom_namespace
+  for prefix, uri in NAMESPACES.items():
+    feed['xmlns$' + prefix] = uri
+  # Entries are always a list in GData JSON, even if there is only one.
+  if 'entry' in feed and not isinstance(feed['entry'], list):
+    feed['entry'] = [feed['entry']]
+  return simplejson.dumps({'version': '1.0', 'encoding': 'UTF-8',
+                           'feed': feed})
+
+
+def decode_xml(document):
+  return atom.core.parse(document, gdata.youtube.data.VideoFeed, version=2)
+
+
+def decode_json(document):
+  return atom.core.parse_json(document, gdata.youtube.data.VideoFeed,
+                              version=2, namespaces=gdata.data.FIELDS_NAMESPACES)
+
+
+DECODERS = [('xml', decode_xml), ('json', decode_json)]
+
+
+def canonical(element):
+  """Gives an order independent form of an element tree for comparisons."""
+  children = sorted([canonical(child) for child in element])
+  text = (element.text or '').strip()
+  return (element.tag, sorted(element.attrib.items()), text, children)
+
+
+def check(xml_document, json_document):
+  xml_feed = decode_xml(xml_document)
+  json_feed = decode_json(json_document)
+  if len(xml_feed.entry) != len(json_feed.entry):
+    raise AssertionError('Decoded %d entries from XML and %d from JSON' % (
+        len(xml_feed.entry), len(json_feed.entry)))
+  xml_tree = ElementTree.fromstring(xml_feed.to_string(version=2))
+  json_tree = ElementTree.fromstring(json_feed.to_string(version=2))
+  if canonical(xml_tree) != canonical(json_tree):
+    raise AssertionError('The XML and JSON feeds decoded differently')
+
+
+def best_time(function, document, repeat):
+  best = None
+  for i in range(repeat):
+    gc.collect()
+    start = time.time()
+    function(document)
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def peak_memory_growth(function, document):
+  """Decodes the document in a child process and returns the peak RSS growth.
+
+  Returns:
+    The growth in kilobytes, or None if the platform can not fork.
+  """
+  if not hasattr(os, 'fork'):
+    return None
+  read_end, write_end = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    os.close(read_end)
+    gc.collect()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = function(document)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    os.write(write_end, str(after - before))
+    os._exit(0)
+  os.close(write_end)
+  output = os.read(read_end, 64)
+  os.close(read_end)
+  os.waitpid(pid, 0)
+  growth = int(output)
+  if sys.platform == 'darwin':
+    growth //= 1024
+  return growth
+
+
+def main():
+  parser = optparse.OptionParser()
+  parser.add_option('--entries', type='int', default=200,
+                    help='number of video entries in the feed')
+  parser.add_option('--repeat', type='int', default=5)
+  options, args = parser.parse_args()
+
+  xml_document = make_xml_feed(options.entries)
+  json_document = xml_to_json(xml_document)
+  check(xml_document, json_document)
+  if (getattr(simplejson, '_speedups', None) or
+      getattr(getattr(simplejson, 'scanner', None), 'c_make_scanner', None)):
+    scanner = 'c'
+  else:
+    scanner = 'python'
+  print '%d entries: %d bytes of XML, %d bytes of JSON (%s %s scanner)' % (
+      options.entries, len(xml_document), len(json_document),
+      simplejson.__name__, scanner)
+  documents = {'xml': xml_document, 'json': json_document}
+  print 'json.loads alone: %.2f ms' % (
+      best_time(simplejson.loads, json_document, options.repeat) * 1000)
+  for name, function in DECODERS:
+    elapsed = best_time(function, documents[name], options.repeat)
+    growth = peak_memory_growth(function, documents[name])
+    if growth is None:
+      memory = 'n/a'
+    else:
+      memory = '%d KB' % growth
+    print '%-4s decode: %8.2f ms, %7.1f entries/s, peak RSS growth %s' % (
+        name, elapsed * 1000, options.entries / elapsed, memory)
+
+
+if __name__ == '__main__':
+  main()
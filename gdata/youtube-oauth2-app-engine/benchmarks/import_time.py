@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the cold-start cost of importing the client library modules.
+
+Each module is imported in a fresh interpreter, as it would be by a new App
+Engine instance, and the best of several runs is kept. Besides the total
+time, the report lists how many modules were loaded, whether tlslite or the
+Crypto package were among them, and which packages the time was spent in.
+A first untimed run of every module writes the .pyc files, so the timings
+do not include compiling the sources.
+
+Usage:
+  python benchmarks/import_time.py --repeat 5 gdata.service gdata.client
+"""
+
+import optparse
+import os
+import subprocess
+import sys
+
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = [
+    'atom.core', 'atom.client', 'atom.service', 'gdata.auth', 'gdata.gauth',
+    'gdata.client', 'gdata.service', 'gdata.youtube.client',
+    'gdata.youtube.service']
+
+# Packages which are expensive to load and which only some clients need.
+HEAVY_PACKAGES = ['gdata.tlslite', 'Crypto', 'gdata.Crypto', 'M2Crypto',
+                  'gmpy', 'cryptlib_py']
+
+# Run in the child interpreter. Every import which loads a new module is
+# timed, and the time not spent in nested imports is charged to the package
+# of the module. The results are printed as one repr'd tuple.
+CHILD = r'''
+import __builtin__
+import sys
+import time
+
+sys.path.insert(0, %(app_dir)r)
+real_import = __builtin__.__import__
+stack = []
+self_times = {}
+
+def package(name):
+  return '.'.join(name.split('.')[:2])
+
+def timed_import(*args, **kwargs):
+  before = len(sys.modules)
+  stack.append(0.0)
+  start = time.time()
+  try:
+    return real_import(*args, **kwargs)
+  finally:
+    elapsed = time.time() - start
+    nested = stack.pop()
+    if stack:
+      stack[-1] += elapsed
+    if len(sys.modules) != before:
+      name = args[0]
+      globals_ = len(args) > 1 and args[1] or {}
+      parent = globals_.get('__name__', '')
+      if '.' in parent and ('%%s.%%s' %% (parent.rsplit('.', 1)[0], name)
+                            in sys.modules):
+        name = '%%s.%%s' %% (parent.rsplit('.', 1)[0], name)
+      key = package(name)
+      self_times[key] = self_times.get(key, 0.0) + elapsed - nested
+
+loaded = set(sys.modules)
+__builtin__.__import__ = timed_import
+start = time.time()
+__import__(%(module)r)
+total = time.time() - start
+__builtin__.__import__ = real_import
+new = [name for name in sys.modules
+       if name not in loaded and sys.modules[name] is not None]
+print repr((total, new, self_times))
+'''
+
+
+def import_module(module):
+  """Imports a module in a new interpreter.
+
+  Returns:
+    A tuple of the seconds the import took, the names of the modules it
+    loaded and a dict of the seconds spent in each package.
+  """
+  code = CHILD % {'app_dir': APP_DIR, 'module': module}
+  child = subprocess.Popen([sys.executable, '-c', code],
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+  output, errors = child.communicate()
+  if child.returncode:
+    raise RuntimeError('Importing %s failed:\n%s' % (module, errors))
+  return eval(output.strip().splitlines()[-1])
+
+
+def heavy_packages(modules):
+  found = []
+  for heavy in HEAVY_PACKAGES:
+    for name in modules:
+      if name == heavy or name.startswith(heavy + '.'):
+        found.append(heavy)
+        break
+  return found
+
+
+def main():
+  parser = optparse.OptionParser(usage='%prog [options] [module ...]')
+  parser.add_option('--repeat', type='int', default=5,
+                    help='imports of each module, the best is reported')
+  parser.add_option('--top', type='int', default=3,
+                    help='packages to list for each module')
+  options, modules = parser.parse_args()
+  modules = modules or DEFAULT_MODULES
+
+  print '%-32s %8s %8s  %s' % ('module', 'ms', 'modules', 'heavy packages')
+  breakdowns = []
+  for module in modules:
+    import_module(module)
+    best = None
+    for i in range(options.repeat):
+      result = import_module(module)
+      if best is None or result[0] < best[0]:
+        best = result
+    total, new, self_times = best
+    print '%-32s %8.1f %8d  %s' % (
+        module, total * 1000, len(new),
+        ', '.join(heavy_packages(new)) or '-')
+    breakdowns.append((module, self_times))
+
+  print
+  print 'Time spent in each package, excluding the packages it imports (ms):'
+  for module, self_times in breakdowns:
+    items = sorted(self_times.items(), key=lambda item: -item[1])
+    print '  %-30s %s' % (module, ', '.join(
+        ['%s %.1f' % (name, seconds * 1000)
+         for name, seconds in items[:options.top]]))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Replays recorded GData responses as a load test.
+
+A session of recordings is made up of one video feed page per path, saved in
+the streaming format and loaded again. The GDClient pipeline which reads and
+parses a feed page is then run by several threads against the recordings,
+with an optional delay before each response. With --trace, the time spent
+in each phase of the requests is reported as well.
+
+Usage:
+  python benchmarks/mock_replay.py --recordings 500 --workers 8 --latency 0.02
+"""
+
+import optparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import atom.http_core
+import atom.mock_http_core
+import atom.tracing
+import gdata.client
+import gdata.youtube.data
+from gdata_json_decode import make_xml_feed
+
+
+FEED_URI = 'http://gdata.youtube.com/feeds/api/users/user%d/uploads'
+
+
+def record_session(client, recordings, entries):
+  body = make_xml_feed(entries)
+  for i in xrange(recordings):
+    request = atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri.parse_uri(FEED_URI % i), method='GET')
+    client.add_response(request, 200, 'OK',
+                        {'Content-Type': 'application/atom+xml'}, body)
+
+
+def main():
+  parser = optparse.OptionParser()
+  parser.add_option('--recordings', type='int', default=500,
+                    help='number of recorded feed pages')
+  parser.add_option('--entries', type='int', default=5,
+                    help='entries in each feed page')
+  parser.add_option('--workers', type='int', default=4)
+  parser.add_option('--operations', type='int', default=2000)
+  parser.add_option('--latency', type='float', default=0.0,
+                    help='seconds added before each response')
+  parser.add_option('--trace', action='store_true', default=False,
+                    help='report the time spent in each request phase')
+  options, args = parser.parse_args()
+
+  name = 'mock_replay_benchmark.%d' % os.getpid()
+  recorder = atom.mock_http_core.MockHttpClient()
+  record_session(recorder, options.recordings, options.entries)
+  recorder._save_recordings(name)
+  size = os.path.getsize(os.path.join(tempfile.gettempdir(), name))
+
+  replayer = atom.mock_http_core.MockHttpClient()
+  try:
+    start = time.time()
+    replayer._load_recordings(name)
+    print '%d recordings, %d bytes: loaded in %.1f ms' % (
+        options.recordings, size, (time.time() - start) * 1000)
+
+    last = atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri.parse_uri(FEED_URI % (options.recordings - 1)),
+        method='GET')
+    start = time.time()
+    for i in xrange(100):
+      for recording in replayer._recordings:
+        if atom.mock_http_core._match_request(recording[0], last):
+          break
+    linear = (time.time() - start) / 100
+    start = time.time()
+    for i in xrange(100):
+      replayer._find_recording(last)
+    indexed = (time.time() - start) / 100
+    print 'lookup of the last recording: scan %.3f ms, index %.3f ms' % (
+        linear * 1000, indexed * 1000)
+
+    tracer = atom.tracing.NULL_TRACER
+    if options.trace:
+      tracer = atom.tracing.HistogramTracer()
+    counter = [0]
+    def read_feed(http_client):
+      counter[0] += 1
+      client = gdata.client.GDClient(http_client=http_client)
+      client.tracer = tracer
+      feed = client.get_feed(FEED_URI % (counter[0] % options.recordings),
+                             desired_class=gdata.youtube.data.VideoFeed)
+      assert len(feed.entry) == options.entries
+
+    load_test = atom.mock_http_core.ReplayLoadTest(
+        replayer, workers=options.workers, latency=options.latency or None)
+    print load_test.run(read_feed, operations=options.operations)
+    if options.trace:
+      print tracer.report()
+  finally:
+    replayer.delete_session(name)
+
+
+if __name__ == '__main__':
+  main()
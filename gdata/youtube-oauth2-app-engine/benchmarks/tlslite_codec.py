@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Micro-benchmarks for parsing and serializing tlslite handshake messages.
+
+Each message is written and parsed with the portable byte-at-a-time codec
+and with the struct based codec, and the output of both is compared before
+anything is timed.
+
+Usage:
+  python benchmarks/tlslite_codec.py --iterations 20000
+"""
+
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gdata.tlslite import messages
+from gdata.tlslite.constants import CertificateType, CipherSuite
+from gdata.tlslite.utils import codec
+from gdata.tlslite.utils.compat import createByteArraySequence
+
+
+CODECS = [('portable', codec.PortableWriter, codec.PortableParser),
+          ('struct', codec.StructWriter, codec.StructParser)]
+
+
+def random_bytes(count):
+  return createByteArraySequence([ord(c) for c in os.urandom(count)])
+
+
+def sample_messages():
+  """Returns (name, message, make_empty) triples covering a full handshake."""
+  suites = (CipherSuite.rsaSuites + CipherSuite.srpRsaSuites +
+            CipherSuite.srpSuites) * 4
+  version = (3, 1)
+  return [
+      ('RecordHeader3',
+       messages.RecordHeader3().create(version, 22, 1234),
+       messages.RecordHeader3),
+      ('ClientHello',
+       messages.ClientHello().create(version, random_bytes(32),
+                                     random_bytes(32), suites,
+                                     [CertificateType.x509]),
+       messages.ClientHello),
+      ('ServerHello',
+       messages.ServerHello().create(version, random_bytes(32),
+                                     random_bytes(32), suites[0],
+                                     CertificateType.x509),
+       messages.ServerHello),
+      ('CertificateRequest',
+       messages.CertificateRequest().create([1, 2], random_bytes(512)),
+       messages.CertificateRequest),
+      ('ClientKeyExchange',
+       messages.ClientKeyExchange(CipherSuite.rsaSuites[0], version)
+           .createRSA(random_bytes(128)),
+       lambda: messages.ClientKeyExchange(CipherSuite.rsaSuites[0], version)),
+      ('Finished',
+       messages.Finished(version).create(random_bytes(12)),
+       lambda: messages.Finished(version)),
+  ]
+
+
+def write(message):
+  if isinstance(message, messages.HandshakeMsg):
+    return message.write(False)
+  return message.write()
+
+
+def parse(parser_class, bytes, make_empty):
+  p = parser_class(bytes)
+  message = make_empty()
+  if isinstance(message, messages.HandshakeMsg):
+    p.get(1)
+  return message.parse(p)
+
+
+def use_writer(writer_class):
+  # messages.py picks up Writer through 'from utils.codec import *'.
+  messages.Writer = writer_class
+
+
+def check(samples):
+  for name, message, make_empty in samples:
+    outputs = []
+    for codec_name, writer_class, parser_class in CODECS:
+      use_writer(writer_class)
+      bytes = write(message)
+      reparsed = write(parse(parser_class, bytes, make_empty))
+      if reparsed != bytes:
+        raise AssertionError('%s does not round trip with the %s codec' %
+                             (name, codec_name))
+      outputs.append(bytes)
+    if outputs[0] != outputs[1]:
+      raise AssertionError('The codecs disagree on %s' % name)
+
+
+def time_it(function, iterations):
+  start = time.time()
+  for i in xrange(iterations):
+    function()
+  return (time.time() - start) / iterations * 1e6
+
+
+def main():
+  parser = optparse.OptionParser()
+  parser.add_option('--iterations', type='int', default=20000)
+  options, args = parser.parse_args()
+  samples = sample_messages()
+  check(samples)
+  print '%-20s %-10s %12s %12s' % ('message', 'codec', 'write (us)',
+                                   'parse (us)')
+  for name, message, make_empty in samples:
+    for codec_name, writer_class, parser_class in CODECS:
+      use_writer(writer_class)
+      bytes = write(message)
+      write_us = time_it(lambda: write(message), options.iterations)
+      parse_us = time_it(lambda: parse(parser_class, bytes, make_empty),
+                         options.iterations)
+      print '%-20s %-10s %12.2f %12.2f' % (name, codec_name, write_us,
+                                           parse_us)
+  use_writer(codec.Writer)
+
+
+if __name__ == '__main__':
+  main()
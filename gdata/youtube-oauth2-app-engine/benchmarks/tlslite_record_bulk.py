@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures bulk transfer throughput through the tlslite record layer.
+
+Two TLSRecordLayer objects are connected with a socket pair and given
+matching connection states, skipping the handshake, so that the numbers
+reflect only record framing, encryption, MAC checking and buffering.
+
+Usage:
+  python benchmarks/tlslite_record_bulk.py --megabytes 8 --cipher null
+"""
+
+import optparse
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sha
+from gdata.tlslite.TLSRecordLayer import TLSRecordLayer
+from gdata.tlslite.utils import hmac
+from gdata.tlslite.utils.cipherfactory import createAES, createRC4
+
+
+def make_state(state, cipher):
+  if cipher == 'null':
+    return
+  state.macContext = hmac.HMAC('m' * 20, digestmod=sha)
+  if cipher == 'rc4':
+    state.encContext = createRC4('k' * 16, '')
+  else:
+    state.encContext = createAES('k' * 16, 'i' * 16)
+
+
+def connected_pair(cipher):
+  writer_socket, reader_socket = socket.socketpair()
+  writer = TLSRecordLayer(writer_socket)
+  reader = TLSRecordLayer(reader_socket)
+  for layer in (writer, reader):
+    layer.version = (3, 1)
+    layer.closed = False
+  make_state(writer._writeState, cipher)
+  make_state(reader._readState, cipher)
+  return writer, reader
+
+
+def run(total_bytes, write_size, read_size, cipher):
+  writer, reader = connected_pair(cipher)
+  block = os.urandom(write_size)
+
+  def write_all():
+    sent = 0
+    while sent < total_bytes:
+      writer.write(block)
+      sent += len(block)
+
+  thread = threading.Thread(target=write_all)
+  start = time.time()
+  thread.start()
+  received = 0
+  while received < total_bytes:
+    received += len(reader.read(read_size))
+  elapsed = time.time() - start
+  thread.join()
+  return received, elapsed
+
+
+def main():
+  parser = optparse.OptionParser()
+  parser.add_option('--megabytes', type='float', default=8,
+                    help='amount of application data to transfer')
+  parser.add_option('--write-size', type='int', default=65536,
+                    help='bytes passed to each write call')
+  parser.add_option('--read-size', type='int', default=None,
+                    help='maximum bytes returned by each read call, '
+                         'unbounded if not set')
+  parser.add_option('--cipher', choices=['null', 'rc4', 'aes'],
+                    default='null',
+                    help='null skips encryption and MAC checks')
+  parser.add_option('--repeat', type='int', default=3)
+  options, args = parser.parse_args()
+  total_bytes = int(options.megabytes * 1024 * 1024)
+  results = []
+  for i in range(options.repeat):
+    received, elapsed = run(total_bytes, options.write_size,
+                            options.read_size, options.cipher)
+    results.append(received / elapsed / (1024 * 1024))
+    print 'run %d: %d bytes in %.3fs, %.2f MB/s' % (
+        i + 1, received, elapsed, results[-1])
+  print 'best: %.2f MB/s (cipher=%s)' % (max(results), options.cipher)
+
+
+if __name__ == '__main__':
+  main()
@@ -21,6 +21,7 @@ __author__ = 'api.nickm@google.com (Nick Mihailovski)'
 
 import atom.data
 import gdata.client
+import gdata.analytics.columns
 import gdata.analytics.data
 import gdata.gauth
 
@@ -78,6 +79,27 @@ class AnalyticsClient(gdata.client.GDClient):
 
   GetDataFeed = get_data_feed
 
+  def get_data_table(self, feed_uri, auth_token=None, **kwargs):
+    """Makes a request to the Analytics API Data Feed for a DataTable.
+
+    The response is decoded straight into columns, which is much faster for
+    large feeds than building a DataFeed.
+
+    Args:
+      feed_uri: str or DataFeedQuery The Analytics Data Feed
+          uri to define what data to retrieve from the API.
+
+    Returns:
+      A gdata.analytics.columns.DataTable.
+    """
+
+    return self.get_feed(feed_uri,
+                         converter=gdata.analytics.columns.DataTable.parse,
+                         auth_token=auth_token,
+                         **kwargs)
+
+  GetDataTable = get_data_table
+
   def get_management_feed(self, feed_uri, auth_token=None, **kwargs):
     """Makes a request to the Google Analytics Management API.
 
@@ -0,0 +1,329 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Holds Google Analytics Data Feed results as columns.
+
+DataEntry.get_object finds a dimension or metric by scanning the entry, and
+returns its value as a string, so reading every metric of every row of a
+large feed is slow. A DataTable stores the rows of a data feed as columns
+instead. Each metric is an array('d') of floats, and each dimension is a list
+of strings in which equal values share a single string object.
+
+  feed = client.get_data_feed(query)
+  table = gdata.analytics.columns.DataTable.from_feed(feed)
+  table.add_ratio('pagesPerVisit', 'ga:pageviews', 'ga:visits')
+  for source, visits in table.group_by('ga:source').rows(
+      'ga:source', 'ga:visits'):
+    ...
+
+AnalyticsClient.get_data_table decodes the response straight into a
+DataTable, without creating DataEntry objects.
+"""
+
+
+import array
+import itertools
+import StringIO
+
+import atom.data
+import gdata.analytics.data
+from atom.core import ElementTree
+
+
+ENTRY_TAG = atom.data.ATOM_TEMPLATE % 'entry'
+DIMENSION_TAG = gdata.analytics.data.DXP_NS % 'dimension'
+METRIC_TAG = gdata.analytics.data.DXP_NS % 'metric'
+AGGREGATES_TAG = gdata.analytics.data.DXP_NS % 'aggregates'
+
+
+class DataTable(object):
+  """The dimension and metric values of a data feed, stored by column.
+
+  Attributes:
+    dimension_names: list of str The names of the dimension columns, such as
+        'ga:source', in the order of the feed.
+    metric_names: list of str The names of the metric columns, followed by
+        the names of any derived metrics.
+    dimensions: dict Maps each dimension name to its list of values.
+    metrics: dict Maps each metric name to its array('d') of values.
+  """
+
+  def __init__(self, dimension_names=(), metric_names=()):
+    """Creates an empty table with the given columns."""
+    self.dimension_names = list(dimension_names)
+    self.metric_names = list(metric_names)
+    self.dimensions = {}
+    for name in self.dimension_names:
+      self.dimensions[name] = []
+    self.metrics = {}
+    for name in self.metric_names:
+      self.metrics[name] = array.array('d')
+    # Each distinct dimension value, so that equal values are stored once.
+    self._strings = {}
+
+  def __len__(self):
+    if self.metric_names:
+      return len(self.metrics[self.metric_names[0]])
+    if self.dimension_names:
+      return len(self.dimensions[self.dimension_names[0]])
+    return 0
+
+  def column(self, name):
+    """Returns the values of a dimension or metric.
+
+    Raises:
+      KeyError if the table has no column with this name.
+    """
+    if name in self.metrics:
+      return self.metrics[name]
+    return self.dimensions[name]
+
+  Column = column
+
+  def rows(self, *names):
+    """Iterates over the rows as tuples.
+
+    Args:
+      names: str (optional) The columns to include, by default all of the
+          dimensions followed by all of the metrics.
+    """
+    if not names:
+      names = self.dimension_names + self.metric_names
+    return itertools.izip(*[self.column(name) for name in names])
+
+  Rows = rows
+
+  def _append_values(self, dimensions, metrics):
+    """Adds a row from lists of dimension and metric (name, value) pairs."""
+    intern_string = self._strings.setdefault
+    try:
+      for name, value in dimensions:
+        self.dimensions[name].append(intern_string(value, value))
+      for name, value in metrics:
+        self.metrics[name].append(float(value))
+    except KeyError, error:
+      raise ValueError('The entry has a column which the table does not: %s'
+                       % error)
+
+  def _check_lengths(self):
+    rows = len(self)
+    for name in self.dimension_names:
+      if len(self.dimensions[name]) != rows:
+        raise ValueError('Not every entry has the dimension %s' % name)
+    for name in self.metric_names:
+      if len(self.metrics[name]) != rows:
+        raise ValueError('Not every entry has the metric %s' % name)
+
+  @classmethod
+  def from_feed(cls, feed):
+    """Creates a table from a gdata.analytics.data.DataFeed.
+
+    The columns are those of the first entry, or the metrics of the feed's
+    aggregates if it has no entries.
+
+    Raises:
+      ValueError if the entries do not all have the same dimensions and
+      metrics.
+    """
+    if feed.entry:
+      table = cls([dimension.name for dimension in feed.entry[0].dimension],
+                  [metric.name for metric in feed.entry[0].metric])
+    elif feed.aggregates is not None:
+      table = cls((), [metric.name for metric in feed.aggregates.metric])
+    else:
+      table = cls()
+    for entry in feed.entry:
+      table._append_values(
+          [(dimension.name, dimension.value) for dimension in entry.dimension],
+          [(metric.name, metric.value) for metric in entry.metric])
+    table._check_lengths()
+    return table
+
+  FromFeed = from_feed
+
+  @classmethod
+  def parse(cls, source):
+    """Creates a table from the XML of a data feed.
+
+    The document is parsed incrementally and each entry is discarded once
+    its values have been added to the columns, so no DataEntry objects are
+    built.
+
+    Args:
+      source: str or an object with a read method, such as an HTTP
+          response, which returns the XML of the feed.
+
+    Raises:
+      ValueError if the entries do not all have the same dimensions and
+      metrics.
+    """
+    if not isinstance(source, basestring):
+      # The body is read in one call, since not every response supports
+      # reads of a given size (MockHttpResponse does not).
+      source = source.read()
+    source = StringIO.StringIO(source)
+    table = None
+    aggregate_names = []
+    for event, element in ElementTree.iterparse(source):
+      if element.tag == ENTRY_TAG:
+        dimensions = []
+        metrics = []
+        for child in element:
+          if child.tag == DIMENSION_TAG:
+            dimensions.append((child.get('name'), child.get('value')))
+          elif child.tag == METRIC_TAG:
+            metrics.append((child.get('name'), child.get('value')))
+        if table is None:
+          table = cls([name for name, value in dimensions],
+                      [name for name, value in metrics])
+        table._append_values(dimensions, metrics)
+        element.clear()
+      elif element.tag == AGGREGATES_TAG:
+        aggregate_names = [child.get('name') for child in element
+                           if child.tag == METRIC_TAG]
+    if table is None:
+      table = cls((), aggregate_names)
+    table._check_lengths()
+    return table
+
+  Parse = parse
+
+  def derive(self, name, function, *names):
+    """Adds a metric computed from other metrics of the same row.
+
+    Args:
+      name: str The name of the new metric.
+      function: A function which is given the values of the named metrics
+          and returns the value of the new metric.
+      names: str The metrics to compute the new one from.
+    """
+    columns = [self.metrics[column] for column in names]
+    self._set_metric(name, array.array('d', map(function, *columns)))
+
+  Derive = derive
+
+  def add_ratio(self, name, numerator, denominator, scale=1.0):
+    """Adds a metric which is one metric divided by another.
+
+    Rows in which the denominator is 0 get a value of 0.
+
+    Args:
+      name: str The name of the new metric.
+      numerator: str The name of the metric to divide.
+      denominator: str The name of the metric to divide by.
+      scale: float (optional) Multiplies the ratio, 100 for a percentage.
+    """
+    def ratio(top, bottom):
+      if bottom:
+        return top / bottom * scale
+      return 0.0
+    self.derive(name, ratio, numerator, denominator)
+
+  AddRatio = add_ratio
+
+  def _set_metric(self, name, values):
+    if name not in self.metrics:
+      self.metric_names.append(name)
+    self.metrics[name] = values
+
+  def group_by(self, *names):
+    """Sums the metrics over the rows with the same values of some dimensions.
+
+    Sums of ratios are rarely meaningful, so derive ratio metrics from the
+    grouped table rather than before grouping.
+
+    Args:
+      names: str The dimensions to group by. With none, the result has a
+          single row of totals.
+
+    Returns:
+      A new DataTable with one row for each distinct combination of the
+      dimension values, in the order in which they first appear.
+    """
+    if len(names) == 1:
+      keys = self.dimensions[names[0]]
+    elif names:
+      keys = zip(*[self.dimensions[name] for name in names])
+    else:
+      keys = [()] * len(self)
+    groups = {}
+    add_group = groups.setdefault
+    row_groups = [add_group(key, len(groups)) for key in keys]
+    ordered = [None] * len(groups)
+    for key, group in groups.iteritems():
+      ordered[group] = key
+
+    result = self.__class__(names, self.metric_names)
+    result._strings = self._strings
+    if len(names) == 1:
+      result.dimensions[names[0]] = ordered
+    else:
+      for position, name in enumerate(names):
+        result.dimensions[name] = [key[position] for key in ordered]
+    for name in self.metric_names:
+      sums = array.array('d', [0.0]) * len(ordered)
+      for group, value in itertools.izip(row_groups, self.metrics[name]):
+        sums[group] += value
+      result.metrics[name] = sums
+    return result
+
+  GroupBy = group_by
+
+  def sum(self, name):
+    """Returns the total of a metric over all rows."""
+    return sum(self.metrics[name])
+
+  Sum = sum
+
+  def extend(self, other):
+    """Appends the rows of another table with the same columns.
+
+    This is used to join the pages of a feed which was fetched in several
+    requests.
+
+    Raises:
+      ValueError if the other table has different columns.
+    """
+    if (other.dimension_names != self.dimension_names or
+        other.metric_names != self.metric_names):
+      raise ValueError('Tables with different columns can not be joined')
+    intern_string = self._strings.setdefault
+    for name in self.dimension_names:
+      values = other.dimensions[name]
+      if other._strings is not self._strings:
+        values = map(intern_string, values, values)
+      self.dimensions[name].extend(values)
+    for name in self.metric_names:
+      self.metrics[name].extend(other.metrics[name])
+
+  Extend = extend
+
+  @classmethod
+  def concat(cls, tables):
+    """Returns a new table with the rows of all of the tables in order.
+
+    Raises:
+      ValueError if the tables do not all have the same columns.
+    """
+    tables = list(tables)
+    if not tables:
+      return cls()
+    result = cls(tables[0].dimension_names, tables[0].metric_names)
+    for table in tables:
+      result.extend(table)
+    return result
+
+  Concat = concat
@@ -27,8 +27,6 @@ import atom.token_store
 import atom.url
 import gdata.oauth as oauth
 import gdata.oauth.rsa as oauth_rsa
-import gdata.tlslite.utils.keyfactory as keyfactory
-import gdata.tlslite.utils.cryptomath as cryptomath
 
 import gdata.gauth
 
@@ -907,6 +905,8 @@ class SecureAuthSubToken(AuthSubToken):
   """
   
   def __init__(self, rsa_key, token_string=None, scopes=None):
+    # tlslite is only loaded once a secure token is created.
+    import gdata.tlslite.utils.keyfactory as keyfactory
     self.rsa_key = keyfactory.parsePEMKey(rsa_key)
     self.token_string = token_string or ''
     self.scopes = scopes or [] 
@@ -935,6 +935,7 @@ class SecureAuthSubToken(AuthSubToken):
     Returns:
       dict Header to be sent with every subsequent request after authentication.
     """
+    import gdata.tlslite.utils.cryptomath as cryptomath
     timestamp = int(math.floor(time.time()))
     nonce = '%lu' % random.randrange(1, 2**64)
     data = '%s %s %d %s' % (http_method, str(http_url), timestamp, nonce)
@@ -32,9 +32,11 @@ __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
 import re
+import time
 import atom.client
 import atom.core
 import atom.http_core
+import atom.tracing
 import gdata.gauth
 import gdata.data
 
@@ -183,6 +185,10 @@ class GDClient(atom.client.AtomPubClient):
   auth_scopes = None
   # Name of alternate auth service to use in certain cases
   alt_auth_service = None
+  # If True, the response to a request with a fields parameter is parsed
+  # sparsely: only the elements selected by the fields expression are
+  # converted into objects.
+  sparse_decoding = True
 
   def request(self, method=None, uri=None, auth_token=None,
               http_request=None, converter=None, desired_class=None,
@@ -239,7 +245,70 @@ class GDClient(atom.client.AtomPubClient):
       converter was specified but a desired_class was provided, the response
       body will be converted to the class using
       atom.core.parse.
+
+    If the client's tracer traces the request, the trace is finished once
+    the response has been converted, so it includes the parse and convert
+    phases.
     """
+    uri = self._apply_gsessionid(uri, http_request)
+
+    # The AtomPubClient should call this class' modify_request before
+    # performing the HTTP request.
+    #http_request = self.modify_request(http_request)
+
+    trace = self.tracer.start()
+    response = self._send_request(trace, method=method, uri=uri,
+        auth_token=auth_token, http_request=http_request, **kwargs)
+    if trace is None:
+      return self._process_response(response, method=method, uri=uri,
+          auth_token=auth_token, http_request=http_request,
+          converter=converter, desired_class=desired_class,
+          redirects_remaining=redirects_remaining, **kwargs)
+    response = atom.tracing.TracedResponse(response, trace)
+    try:
+      return self._process_response(response, method=method, uri=uri,
+          auth_token=auth_token, http_request=http_request,
+          converter=converter, desired_class=desired_class,
+          redirects_remaining=redirects_remaining, **kwargs)
+    finally:
+      self.tracer.finish(trace)
+
+  Request = request
+
+  def submit(self, method=None, uri=None, auth_token=None,
+             http_request=None, converter=None, desired_class=None,
+             redirects_remaining=4, **kwargs):
+    """Starts a request without waiting for the server's response.
+
+    Takes the same arguments as request, but requires an http_client with a
+    submit method such as atom.async_http_core.AsyncHttpClient. Many
+    requests can be submitted before any of the results are collected, and
+    they will all be in flight at the same time.
+
+    Returns:
+      A future whose result method returns what request would have
+      returned, or raises the same exception.
+    """
+    uri = self._apply_gsessionid(uri, http_request)
+    built_request = self._build_request(method=method, uri=uri,
+        auth_token=auth_token, http_request=http_request, **kwargs)
+    http_future = self.http_client.submit(built_request)
+
+    def process(response):
+      if self.gzip:
+        response = atom.http_core.decode_response(
+            built_request.headers, response,
+            atom.http_core.get_compression_stats(self.http_client))
+      return self._process_response(response, method=method, uri=uri,
+          auth_token=auth_token, http_request=http_request,
+          converter=converter, desired_class=desired_class,
+          redirects_remaining=redirects_remaining, **kwargs)
+
+    return http_future.then(process)
+
+  Submit = submit
+
+  def _apply_gsessionid(self, uri, http_request):
     if isinstance(uri, (str, unicode)):
       uri = atom.http_core.Uri.parse_uri(uri)
 
@@ -258,28 +327,46 @@ class GDClient(atom.client.AtomPubClient):
     # URI then add it to the URI.
     elif self.__gsessionid is not None:
       uri.query['gsessionid'] = self.__gsessionid
+    return uri
 
-    # The AtomPubClient should call this class' modify_request before
-    # performing the HTTP request.
-    #http_request = self.modify_request(http_request)
-
-    response = atom.client.AtomPubClient.request(self, method=method,
-        uri=uri, auth_token=auth_token, http_request=http_request, **kwargs)
+  def _process_response(self, response, method=None, uri=None,
+                        auth_token=None, http_request=None, converter=None,
+                        desired_class=None, redirects_remaining=4, **kwargs):
     # On success, convert the response body using the desired converter
     # function if present.
     if response is None:
       return None
+    trace = getattr(response, 'trace', None)
     if response.status == 200 or response.status == 201:
       if converter is not None:
-        return converter(response)
+        if trace is None:
+          return converter(response)
+        read_time = trace.timings.get('read', 0.0)
+        start = time.time()
+        result = converter(response)
+        # Leave out the time the converter spent reading, which is in 'read'.
+        read_time = trace.timings.get('read', 0.0) - read_time
+        trace.add('convert', time.time() - start - read_time)
+        return result
       elif desired_class is not None:
+        projection = None
+        if self.sparse_decoding:
+          fields = _find_fields(uri, http_request, kwargs)
+          if fields:
+            projection = gdata.data.get_fields_projection(fields)
+        if _is_json_response(response, uri, http_request, kwargs):
+          parse = _parse_json
+        else:
+          parse = atom.core.parse
         if self.api_version is not None:
-          return atom.core.parse(response.read(), desired_class,
-                                 version=get_xml_version(self.api_version))
+          return parse(response.read(), desired_class,
+                       version=get_xml_version(self.api_version),
+                       fields=projection, trace=trace)
         else:
           # No API version was specified, so allow parse to
           # use the default version.
-          return atom.core.parse(response.read(), desired_class)
+          return parse(response.read(), desired_class, fields=projection,
+                       trace=trace)
       else:
         return response
     # TODO: move the redirect logic into the Google Calendar client once it
@@ -318,8 +405,6 @@ class GDClient(atom.client.AtomPubClient):
       raise error_from_response('Server responded with', response,
                                 RequestError)
 
-  Request = request
-
   def request_client_login_token(
       self, email, password, source, service=None,
       account_type='HOSTED_OR_GOOGLE',
@@ -766,12 +851,53 @@ def _add_query_param(param_string, value, http_request):
     http_request.uri.query[param_string] = value
 
 
+def _find_fields(uri, http_request, kwargs):
+  """Finds the fields parameter which was sent with a request.
+
+  The fields may come from a Query passed to the request method or from
+  the query string of the request URI.
+  """
+  for value in kwargs.itervalues():
+    fields = getattr(value, 'fields', None)
+    if fields:
+      return fields
+  for request_uri in (uri, http_request is not None and http_request.uri):
+    if request_uri and request_uri.query and request_uri.query.get('fields'):
+      return request_uri.query['fields']
+  return None
+
+
+def _is_json_response(response, uri, http_request, kwargs):
+  """Decides if a response body is a GData JSON (alt=json) document.
+
+  The content type of the response is used when the server sent one,
+  otherwise the alt parameter which was sent with the request.
+  """
+  content_type = response.getheader('Content-Type') or ''
+  if content_type:
+    return content_type.split(';')[0].strip().endswith('/json')
+  for value in kwargs.itervalues():
+    if getattr(value, 'alt', None):
+      return value.alt == 'json'
+  for request_uri in (uri, http_request is not None and http_request.uri):
+    if request_uri and request_uri.query and request_uri.query.get('alt'):
+      return request_uri.query['alt'] == 'json'
+  return False
+
+
+def _parse_json(json_string, target_class, version=1, fields=None,
+                trace=None):
+  return atom.core.parse_json(json_string, target_class, version, fields,
+                              gdata.data.FIELDS_NAMESPACES, trace)
+
+
 class Query(object):
 
   def __init__(self, text_query=None, categories=None, author=None, alt=None,
                updated_min=None, updated_max=None, pretty_print=False,
                published_min=None, published_max=None, start_index=None,
-               max_results=None, strict=False, **custom_parameters):
+               max_results=None, strict=False, fields=None,
+               **custom_parameters):
     """Constructs a Google Data Query to filter feed contents serverside.
 
     Args:
@@ -787,7 +913,12 @@ class Query(object):
           the feed in. If you don't specify an alt parameter, the service
           returns an Atom feed. This is equivalent to alt='atom'.
           alt='rss' returns an RSS 2.0 result feed.
-          alt='json' returns a JSON representation of the feed.
+          alt='json' returns a JSON representation of the feed, which
+          GDClient decodes into the same classes as the Atom feed. Decoding
+          it is slower than decoding the Atom feed: about 1.6 times with
+          the C accelerated json module (55ms against 35ms for 200 videos
+          in benchmarks/gdata_json_decode.py), and about 3.5 times with a
+          pure Python simplejson.
           alt='json-in-script' Requests a response that wraps JSON in a script
           tag.
           alt='atom-in-script' Requests an Atom response that wraps an XML
@@ -817,6 +948,11 @@ class Query(object):
       strict: boolean (optional) If True, the server will return an error if
           the server does not recognize any of the parameters in the request
           URL. Defaults to False.
+      fields: str (optional) Requests a partial response which contains only
+          the selected elements, for example
+          'entry(id,title,media:group(media:thumbnail))'. GDClient also uses
+          the fields to parse the response sparsely, see
+          GDClient.sparse_decoding.
       custom_parameters: other query parameters that are not explicitly defined.
     """
     self.text_query = text_query
@@ -831,6 +967,7 @@ class Query(object):
     self.start_index = start_index
     self.max_results = max_results
     self.strict = strict
+    self.fields = fields
     self.custom_parameters = custom_parameters
 
   def add_custom_parameter(self, key, value):
@@ -856,6 +993,7 @@ class Query(object):
       http_request.uri.query['max-results'] = str(self.max_results)
     if self.strict:
       http_request.uri.query['strict'] = 'true'
+    _add_query_param('fields', self.fields, http_request)
     http_request.uri.query.update(self.custom_parameters)
 
   ModifyRequest = modify_request
@@ -872,6 +1010,15 @@ class GDQuery(atom.http_core.Uri):
   text_query = property(_get_text_query, _set_text_query,
       doc='The q parameter for searching for an exact text match on content')
 
+  def _get_fields(self):
+    return self.query.get('fields')
+
+  def _set_fields(self, value):
+    self.query['fields'] = value
+
+  fields = property(_get_fields, _set_fields,
+      doc='The fields parameter which requests a partial response')
+
 
 class ResumableUploader(object):
   """Resumable upload helper for the Google Data protocol."""
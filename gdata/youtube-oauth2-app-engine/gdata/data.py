@@ -39,6 +39,26 @@ OPENSEARCH_TEMPLATE_V1 = '{http://a9.com/-/spec/opensearchrss/1.0/}%s'
 OPENSEARCH_TEMPLATE_V2 = '{http://a9.com/-/spec/opensearch/1.1/}%s'
 BATCH_TEMPLATE = '{http://schemas.google.com/gdata/batch}%s'
 
+# Prefixes which may be used in the fields parameter of a partial response
+# request. Partial responses are only supported by version 2 of the
+# protocol, so these are the version 2 namespaces.
+FIELDS_NAMESPACES = {
+    '': 'http://www.w3.org/2005/Atom',
+    'atom': 'http://www.w3.org/2005/Atom',
+    'app': 'http://www.w3.org/2007/app',
+    'gd': 'http://schemas.google.com/g/2005',
+    'openSearch': 'http://a9.com/-/spec/opensearch/1.1/',
+    'batch': 'http://schemas.google.com/gdata/batch',
+    'media': 'http://search.yahoo.com/mrss/',
+    'yt': 'http://gdata.youtube.com/schemas/2007',
+    'georss': 'http://www.georss.org/georss',
+    'gml': 'http://www.opengis.net/gml',
+    'gAcl': 'http://schemas.google.com/acl/2007',
+    'docs': 'http://schemas.google.com/docs/2007',
+    'gphoto': 'http://schemas.google.com/photos/2007',
+    'gs': 'http://schemas.google.com/spreadsheets/2006',
+    'gsx': 'http://schemas.google.com/spreadsheets/2006/extended'}
+
 
 # Labels used in batch request entries to specify the desired CRUD operation.
 BATCH_INSERT = 'insert'
@@ -153,6 +173,27 @@ TENTATIVE_EVENT_STATUS = 'http://schemas.google.com/g/2005#event.tentative'
 ACL_REL = 'http://schemas.google.com/acl/2007#accessControlList'
 
 
+def get_fields_projection(fields):
+  """Converts a fields parameter into a projection for sparse parsing.
+
+  Args:
+    fields: str The value of the fields URL parameter.
+
+  Returns:
+    The projection from atom.core.parse_fields, or None if the expression
+    uses a prefix which is not in FIELDS_NAMESPACES or can not be parsed.
+    The server accepted the request in that case, so the response should
+    be parsed in full.
+  """
+  try:
+    return atom.core.parse_fields(fields, FIELDS_NAMESPACES)
+  except atom.core.FieldsSyntaxError:
+    return None
+
+
+GetFieldsProjection = get_fields_projection
+
+
 class Error(Exception):
   pass
 
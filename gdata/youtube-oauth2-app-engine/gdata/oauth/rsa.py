@@ -5,11 +5,9 @@ requires tlslite - http://trevp.net/tlslite/
 
 """
 
+import base64
 import binascii
 
-from gdata.tlslite.utils import keyfactory
-from gdata.tlslite.utils import cryptomath
-
 # XXX andy: ugly local import due to module name, oauth.oauth
 import gdata.oauth as oauth
 
@@ -51,7 +49,9 @@ class OAuthSignatureMethod_RSA_SHA1(oauth.OAuthSignatureMethod):
     # Fetch the private key cert based on the request
     cert = self._fetch_private_cert(oauth_request)
 
-    # Pull the private key from the certificate
+    # Pull the private key from the certificate. tlslite is imported here
+    # rather than with this module since most clients never sign with RSA.
+    from gdata.tlslite.utils import keyfactory
     privatekey = keyfactory.parsePrivateKey(cert)
     
     # Convert base_string to bytes
@@ -73,6 +73,7 @@ class OAuthSignatureMethod_RSA_SHA1(oauth.OAuthSignatureMethod):
     cert = self._fetch_public_cert(oauth_request)
 
     # Pull the public key from the certificate
+    from gdata.tlslite.utils import keyfactory
     publickey = keyfactory.parsePEMKey(cert, public=True)
 
     # Check the signature
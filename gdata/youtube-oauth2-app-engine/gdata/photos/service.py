@@ -86,6 +86,7 @@ import gdata.service
 import gdata
 import atom.service
 import atom
+import atom.http_core
 import gdata.photos
 
 SUPPORTED_UPLOAD_TYPES = ('bmp', 'jpeg', 'jpg', 'gif', 'png')
@@ -402,13 +403,18 @@ class PhotosService(gdata.service.GDataService):
     elif hasattr(filename_or_handle, 'read'):# it's a file-like resource
       if hasattr(filename_or_handle, 'seek'):
         filename_or_handle.seek(0) # rewind pointer to the start of the file
-      # gdata.MediaSource needs the content length, so read the whole image 
-      file_handle = StringIO.StringIO(filename_or_handle.read()) 
+      # gdata.MediaSource needs the content length. Files and other seekable
+      # objects can be measured and streamed, anything else is read whole.
+      file_handle = filename_or_handle
+      content_length = atom.http_core.get_body_size(file_handle)
+      if content_length is None:
+        file_handle = StringIO.StringIO(filename_or_handle.read()) 
+        content_length = file_handle.len
       name = 'image'
       if hasattr(filename_or_handle, 'name'):
         name = filename_or_handle.name
       mediasource = gdata.MediaSource(file_handle, content_type,
-        content_length=file_handle.len, file_name=name)
+        content_length=content_length, file_name=name)
     else: #filename_or_handle is not valid
       raise GooglePhotosException({'status':GPHOTOS_INVALID_ARGUMENT,
         'body':'`filename_or_handle` must be a path name or a file-like object',
@@ -554,13 +560,18 @@ class PhotosService(gdata.service.GDataService):
     elif hasattr(filename_or_handle, 'read'):# it's a file-like resource
       if hasattr(filename_or_handle, 'seek'):
         filename_or_handle.seek(0) # rewind pointer to the start of the file
-      # gdata.MediaSource needs the content length, so read the whole image 
-      file_handle = StringIO.StringIO(filename_or_handle.read()) 
+      # gdata.MediaSource needs the content length. Files and other seekable
+      # objects can be measured and streamed, anything else is read whole.
+      file_handle = filename_or_handle
+      content_length = atom.http_core.get_body_size(file_handle)
+      if content_length is None:
+        file_handle = StringIO.StringIO(filename_or_handle.read()) 
+        content_length = file_handle.len
       name = 'image'
       if hasattr(filename_or_handle, 'name'):
         name = filename_or_handle.name
       mediasource = gdata.MediaSource(file_handle, content_type,
-        content_length=file_handle.len, file_name=name)
+        content_length=content_length, file_name=name)
     else: #filename_or_handle is not valid
       raise GooglePhotosException({'status':GPHOTOS_INVALID_ARGUMENT,
         'body':'`filename_or_handle` must be a path name or a file-like object',
@@ -0,0 +1,484 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2011 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Rate limits the requests made by Google Data API clients.
+
+Requests are grouped by the host they are sent to and the developer key or
+OAuth consumer they are made for, since that is how the servers apply their
+quotas. Each group has a token bucket which all clients and threads using
+the same RateLimiter share.
+
+When the server says that the quota has been used up (a 403 quota error,
+429 or 503) the group's bucket is paused for the time given in the
+Retry-After header, or for a backoff with decorrelated jitter if there is
+none, and its rate is halved. Successful requests raise the rate back
+towards the configured one a step at a time. This keeps a bulk job close to
+the rate the server will sustain instead of alternating between bursts and
+long backoffs. Requests which can safely be sent again are retried after
+the pause.
+
+Both client stacks can be rate limited:
+
+  client = gdata.client.GDClient()
+  gdata.ratelimit.install(client)
+
+  service = gdata.youtube.service.YouTubeService(developer_key=key)
+  gdata.ratelimit.install(service)
+
+TokenBucket
+RateLimiter
+install
+"""
+
+
+import email.utils
+import random
+import re
+import threading
+import time
+import zlib
+import atom.client
+import atom.service
+import atom.url
+
+
+# Statuses which mean that the request may succeed if it is sent again.
+RETRY_STATUSES = (500, 502, 503, 504)
+# Statuses which mean that requests should be sent more slowly.
+THROTTLE_STATUSES = (429, 503)
+# Reasons given in the body of a 403 response when a quota was exceeded.
+QUOTA_ERRORS = ('too_many_recent_calls', 'quotaExceeded', 'rateLimitExceeded',
+                'userRateLimitExceeded')
+
+_CONSUMER_KEY_PATTERN = re.compile(r'oauth_consumer_key="([^"]*)"')
+
+
+class Error(Exception):
+  pass
+
+
+class TokenBucket(object):
+  """A thread-safe token bucket which adapts its rate to the server.
+
+  Attributes:
+    rate: float The current number of requests allowed per second.
+    max_rate: float The rate the bucket returns to after being throttled.
+    burst: int The number of tokens the bucket holds.
+  """
+
+  def __init__(self, rate, burst=1, min_rate=None):
+    """Creates a full bucket.
+
+    Args:
+      rate: float The number of requests allowed per second.
+      burst: int (optional) The number of requests which may be made at once
+          after a quiet period.
+      min_rate: float (optional) The lowest rate the bucket slows to when it
+          is throttled. Defaults to a twentieth of the rate.
+    """
+    self.rate = float(rate)
+    self.max_rate = float(rate)
+    self.min_rate = min_rate or self.max_rate / 20
+    self.burst = burst
+    self._tokens = float(burst)
+    self._last = time.time()
+    self._paused_until = 0
+    self._lock = threading.Lock()
+
+  def _refill(self, now):
+    if now > self._last:
+      self._tokens = min(self.burst,
+                         self._tokens + (now - self._last) * self.rate)
+    self._last = now
+
+  def acquire(self):
+    """Takes a token, sleeping until one is available.
+
+    Returns:
+      The number of seconds spent waiting.
+    """
+    self._lock.acquire()
+    try:
+      now = time.time()
+      start = max(now, self._paused_until)
+      self._refill(start)
+      # Reserve the token even if it has not arrived yet, so that threads
+      # which wait at the same time wait for different tokens.
+      self._tokens -= 1
+      wait = start - now + max(0, -self._tokens / self.rate)
+    finally:
+      self._lock.release()
+    if wait > 0:
+      time.sleep(wait)
+    return wait
+
+  Acquire = acquire
+
+  def pause(self, seconds):
+    """Stops handing out tokens for the given time and slows the rate."""
+    self._lock.acquire()
+    try:
+      now = time.time()
+      self._refill(now)
+      self._paused_until = max(self._paused_until, now + seconds)
+      # Tokens saved up before the pause should not be spent all at once
+      # when it ends.
+      self._tokens = min(self._tokens, 0)
+      self.rate = max(self.min_rate, self.rate / 2)
+    finally:
+      self._lock.release()
+
+  Pause = pause
+
+  def record_success(self):
+    """Moves the rate back towards max_rate after a throttled period."""
+    if self.rate < self.max_rate:
+      self._lock.acquire()
+      try:
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+      finally:
+        self._lock.release()
+
+  RecordSuccess = record_success
+
+
+class RateLimiter(object):
+  """Keeps a TokenBucket for each (host, developer key or consumer) pair.
+
+  Attributes:
+    throttled: int The number of responses which paused a bucket.
+    retries: int The number of requests which were sent again.
+  """
+
+  def __init__(self, rate=10, burst=10, max_retries=4, base_delay=1,
+               max_delay=64):
+    """Configures the limiter.
+
+    Args:
+      rate: float (optional) The requests per second allowed for a pair
+          which has not been given its own rate with set_rate.
+      burst: int (optional) The burst size for those pairs.
+      max_retries: int (optional) The number of times a request is sent
+          again after a server error or a quota error.
+      base_delay: float (optional) The shortest backoff in seconds.
+      max_delay: float (optional) The longest backoff in seconds.
+    """
+    self.rate = rate
+    self.burst = burst
+    self.max_retries = max_retries
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.throttled = 0
+    self.retries = 0
+    self._buckets = {}
+    self._lock = threading.Lock()
+
+  def get_bucket(self, host, principal=None, rate=None, burst=None):
+    """Returns the bucket for requests to the host made for the principal.
+
+    Args:
+      host: str The server's host name.
+      principal: str (optional) The developer key or OAuth consumer key.
+      rate: float (optional) The rate of the bucket if it has to be created.
+          Defaults to the limiter's rate.
+      burst: int (optional) The burst size of the bucket if it has to be
+          created. Defaults to the limiter's burst size.
+    """
+    key = (host, principal)
+    self._lock.acquire()
+    try:
+      if key not in self._buckets:
+        self._buckets[key] = TokenBucket(rate or self.rate,
+                                         burst or self.burst)
+      return self._buckets[key]
+    finally:
+      self._lock.release()
+
+  GetBucket = get_bucket
+
+  def set_rate(self, host, principal, rate, burst=None):
+    """Sets the rate for one (host, principal) pair."""
+    self._lock.acquire()
+    try:
+      self._buckets[(host, principal)] = TokenBucket(rate, burst or self.burst)
+    finally:
+      self._lock.release()
+
+  SetRate = set_rate
+
+  def next_delay(self, previous_delay=None):
+    """Returns the next backoff using decorrelated jitter.
+
+    Each delay is chosen at random between the base delay and three times
+    the previous one, so that clients which were throttled together do not
+    retry together.
+    """
+    previous_delay = previous_delay or self.base_delay
+    return min(self.max_delay,
+               random.uniform(self.base_delay, previous_delay * 3))
+
+  NextDelay = next_delay
+
+  def send(self, send_request, host, headers, replayable):
+    """Sends a request through the bucket for its host and principal.
+
+    Args:
+      send_request: function Sends the request and returns the response.
+      host: str The host the request is sent to.
+      headers: dict The request's headers, used to find the developer key
+          and OAuth consumer.
+      replayable: boolean True if the request can be sent again.
+
+    Returns:
+      The response. If it is an error which was not retried, its body can
+      still be read.
+    """
+    bucket = self.get_bucket(host, get_principal(headers))
+    # A signed request can not be sent twice, as the server will reject the
+    # repeated nonce.
+    replayable = replayable and not _is_signed(headers)
+    delay = None
+    attempt = 0
+    while True:
+      bucket.acquire()
+      response = send_request()
+      body = None
+      retry_after = None
+      if response.status == 403:
+        body = response.read()
+        response = _BufferedResponse(response, body)
+        throttled = _is_quota_error(response, body)
+      else:
+        throttled = response.status in THROTTLE_STATUSES
+      if throttled:
+        self.throttled += 1
+        retry_after = parse_retry_after(response.getheader('Retry-After'))
+        delay = self.next_delay(delay)
+        bucket.pause(retry_after or delay)
+      elif response.status < 500:
+        bucket.record_success()
+        return response
+      if (not replayable or attempt >= self.max_retries
+          or not (throttled or response.status in RETRY_STATUSES)):
+        return response
+      if body is None:
+        # Finish reading the response so the connection can be reused.
+        response.read()
+      if not throttled:
+        delay = self.next_delay(delay)
+        time.sleep(delay)
+      attempt += 1
+      self.retries += 1
+
+  Send = send
+
+
+class RateLimitedHttpClient(object):
+  """Wraps the http_client of an atom.client.AtomPubClient."""
+
+  def __init__(self, http_client, limiter):
+    self.http_client = http_client
+    self.limiter = limiter
+
+  def request(self, http_request):
+    return self.limiter.send(lambda: self.http_client.request(http_request),
+                             http_request.uri.host, http_request.headers,
+                             _request_is_replayable(http_request))
+
+  Request = request
+
+  def submit(self, http_request):
+    # Requests started without waiting are only spaced out, retrying them
+    # is up to the caller.
+    self.limiter.get_bucket(http_request.uri.host,
+                            get_principal(http_request.headers)).acquire()
+    return self.http_client.submit(http_request)
+
+  Submit = submit
+
+  def __getattr__(self, name):
+    return getattr(self.http_client, name)
+
+
+class RateLimitedV1HttpClient(object):
+  """Wraps the http_client of an atom.service.AtomService."""
+
+  def __init__(self, http_client, limiter):
+    self.http_client = http_client
+    self.limiter = limiter
+
+  def request(self, operation, url, data=None, headers=None):
+    host = getattr(url, 'host', None)
+    if host is None:
+      host = atom.url.parse_url(url).host
+    return self.limiter.send(
+        lambda: self.http_client.request(operation, url, data=data,
+                                         headers=headers),
+        host, headers or {}, _data_is_replayable(data))
+
+  def __getattr__(self, name):
+    return getattr(self.http_client, name)
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_default_limiter():
+  """Returns the RateLimiter shared by clients installed without one."""
+  global _default_limiter
+  _default_limiter_lock.acquire()
+  try:
+    if _default_limiter is None:
+      _default_limiter = RateLimiter()
+    return _default_limiter
+  finally:
+    _default_limiter_lock.release()
+
+
+GetDefaultLimiter = get_default_limiter
+
+
+def install(client, limiter=None):
+  """Sends all of the client's requests through the limiter.
+
+  Args:
+    client: gdata.client.GDClient, gdata.service.GDataService or another
+        atom.client.AtomPubClient or atom.service.AtomService.
+    limiter: RateLimiter (optional) Defaults to the limiter returned by
+        get_default_limiter, so that all clients installed without a limiter
+        share their buckets.
+
+  Returns:
+    The limiter.
+  """
+  limiter = limiter or get_default_limiter()
+  http_client = client.http_client
+  if isinstance(http_client, (RateLimitedHttpClient,
+                              RateLimitedV1HttpClient)):
+    http_client.limiter = limiter
+  elif isinstance(client, atom.client.AtomPubClient):
+    client.http_client = RateLimitedHttpClient(http_client, limiter)
+  elif isinstance(client, atom.service.AtomService):
+    client.http_client = RateLimitedV1HttpClient(http_client, limiter)
+  else:
+    raise Error('Can not install a rate limiter on %r' % client)
+  return limiter
+
+
+Install = install
+
+
+def uninstall(client):
+  """Removes the limiter installed on the client, if there is one."""
+  if isinstance(client.http_client, (RateLimitedHttpClient,
+                                     RateLimitedV1HttpClient)):
+    client.http_client = client.http_client.http_client
+
+
+Uninstall = uninstall
+
+
+def get_principal(headers):
+  """Finds the developer key or OAuth consumer a request is made for."""
+  developer_key = headers.get('X-GData-Key')
+  if developer_key:
+    if developer_key.startswith('key='):
+      return developer_key[4:]
+    return developer_key
+  match = _CONSUMER_KEY_PATTERN.search(headers.get('Authorization', ''))
+  if match:
+    return match.group(1)
+  return None
+
+
+GetPrincipal = get_principal
+
+
+def parse_retry_after(value):
+  """Converts a Retry-After header into seconds from now, or None."""
+  if not value:
+    return None
+  value = value.strip()
+  if value.isdigit():
+    return int(value)
+  parsed = email.utils.parsedate_tz(value)
+  if parsed is None:
+    return None
+  return max(0, email.utils.mktime_tz(parsed) - time.time())
+
+
+ParseRetryAfter = parse_retry_after
+
+
+def _is_signed(headers):
+  authorization = headers.get('Authorization', '')
+  return 'oauth_nonce=' in authorization or ' sig=' in authorization
+
+
+def _is_quota_error(response, body):
+  if response.getheader('Retry-After'):
+    return True
+  if not body:
+    return False
+  if response.getheader('Content-Encoding') == 'gzip':
+    try:
+      body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    except zlib.error:
+      return False
+  for reason in QUOTA_ERRORS:
+    if reason in body:
+      return True
+  return False
+
+
+def _request_is_replayable(http_request):
+  for part in http_request._body_parts:
+    if hasattr(part, 'read'):
+      return False
+  return True
+
+
+def _data_is_replayable(data):
+  if isinstance(data, list):
+    for part in data:
+      if hasattr(part, 'read'):
+        return False
+    return True
+  return not hasattr(data, 'read')
+
+
+class _BufferedResponse(object):
+  """A response whose body has already been read."""
+
+  def __init__(self, response, body):
+    self._response = response
+    self._body = body
+    self._position = 0
+
+  def read(self, amt=None):
+    if self._body is None:
+      return None
+    if amt is None or amt < 0:
+      data = self._body[self._position:]
+    else:
+      data = self._body[self._position:self._position + amt]
+    self._position += len(data)
+    return data
+
+  def __getattr__(self, name):
+    return getattr(self._response, name)
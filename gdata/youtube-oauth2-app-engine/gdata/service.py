@@ -76,9 +76,12 @@ except ImportError:
 import atom.service
 import gdata
 import atom
+import atom.core
+import atom.http_core
 import atom.http_interface
 import atom.token_store
 import gdata.auth
+import gdata.data
 import gdata.gauth
 
 
@@ -1258,8 +1261,10 @@ class GDataService(atom.service.AtomService):
                      reserved characters have been escaped). If true, this
                      method will escape the query and any URL parameters
                      provided.
-      media_source: MediaSource (optional) Container for the media to be sent
-          along with the entry, if provided.
+      media_source: MediaSource or list of MediaSources (optional)
+          Container for the media to be sent along with the entry, if
+          provided. Each media source becomes one part of a
+          multipart/related body after the entry.
       converter: func (optional) A function which will be executed on the 
           server's response. Often this is a function like 
           GDataEntryFromString which will parse the body of the server's 
@@ -1285,22 +1290,22 @@ class GDataService(atom.service.AtomService):
       else:
         data_str = str(data)
         
-      multipart = []
-      multipart.append('Media multipart posting\r\n--END_OF_PART\r\n' + \
-          'Content-Type: application/atom+xml\r\n\r\n')
-      multipart.append('\r\n--END_OF_PART\r\nContent-Type: ' + \
-          media_source.content_type+'\r\n\r\n')
-      multipart.append('\r\n--END_OF_PART--\r\n')
-        
-      extra_headers['MIME-version'] = '1.0'
-      extra_headers['Content-Length'] = str(len(multipart[0]) +
-          len(multipart[1]) + len(multipart[2]) +
-          len(data_str) + media_source.content_length)
+      # The media is only read as the request is sent.
+      body = atom.http_core.MultipartBody()
+      body.add_part(data_str, 'application/atom+xml')
+      if isinstance(media_source, (list, tuple)):
+        media_sources = media_source
+      else:
+        media_sources = [media_source]
+      for source in media_sources:
+        body.add_part(source.file_handle, source.content_type,
+                      source.content_length)
 
-      extra_headers['Content-Type'] = 'multipart/related; boundary=END_OF_PART'
-      server_response = self.request(verb, uri, 
-          data=[multipart[0], data_str, multipart[1], media_source.file_handle,
-              multipart[2]], headers=extra_headers, url_params=url_params)
+      extra_headers['MIME-version'] = '1.0'
+      extra_headers['Content-Length'] = str(body.get_length())
+      extra_headers['Content-Type'] = body.get_content_type()
+      server_response = self.request(verb, uri, data=body.get_parts(),
+          headers=extra_headers, url_params=url_params)
       result_body = server_response.read()
       
     elif media_source or isinstance(data, gdata.MediaSource):
@@ -1535,6 +1540,70 @@ def GenerateAuthSubRequestUrl(next, scopes, hd='default', secure=False,
       session=session, request_url=request_url, domain=hd)
 
 
+def GetFieldsParameter(uri):
+  """Returns the fields URL parameter of a partial response request URI.
+
+  Args:
+    uri: str or atom.http_core.Uri The request URI.
+
+  Returns:
+    The unescaped value of the fields parameter, or None if there is none.
+  """
+  if isinstance(uri, (str, unicode)):
+    uri = atom.http_core.Uri.parse_uri(uri)
+  return uri.query.get('fields') or None
+
+
+# The prefixes of the fields parameter with the namespaces of the version 1
+# classes.
+VERSION_1_FIELDS_NAMESPACES = gdata.data.FIELDS_NAMESPACES.copy()
+VERSION_1_FIELDS_NAMESPACES['openSearch'] = gdata.OPENSEARCH_NAMESPACE
+
+
+def _MergeProjections(projection, other):
+  """Adds the tags selected by another projection to a projection."""
+  for tag, children in other.iteritems():
+    if tag not in projection:
+      projection[tag] = children
+    elif projection[tag] is None or children is None:
+      projection[tag] = None
+    else:
+      _MergeProjections(projection[tag], children)
+
+
+def SparseConverter(target_class, fields):
+  """Creates a Get converter which parses a partial response sparsely.
+
+  Elements which the fields expression does not select are removed from the
+  parsed XML before it is converted into objects, so unexpected or unwanted
+  elements do not become members or extension elements.
+
+  Args:
+    target_class: class The atom.AtomBase subclass of the root element, for
+        example gdata.youtube.YouTubeVideoFeed.
+    fields: str The fields parameter sent in the request.
+
+  Returns:
+    A function which takes the XML string of the response and returns an
+    instance of the target_class.
+  """
+  projection = gdata.data.get_fields_projection(fields)
+  if projection is not None:
+    # The version 1 classes use the openSearch RSS 1.0 namespace, while the
+    # fields prefixes are those of version 2, so select both.
+    _MergeProjections(projection, atom.core.parse_fields(
+        fields, VERSION_1_FIELDS_NAMESPACES))
+
+  def Convert(xml_string):
+    if isinstance(xml_string, unicode):
+      xml_string = xml_string.encode(atom.XML_STRING_ENCODING)
+    tree = ElementTree.fromstring(xml_string)
+    atom.core.prune_tree(tree, projection)
+    return atom._CreateClassFromElementTree(target_class, tree)
+
+  return Convert
+
+
 class Query(dict):
   """Constructs a query URL to be used in GET requests
   
@@ -1705,6 +1774,22 @@ class Query(dict):
   orderby = property(_GetOrderBy, _SetOrderBy, 
       doc="""The feed query's orderby parameter""")
 
+  def _GetFields(self):
+    if 'fields' in self.keys():
+      return self['fields']
+    else:
+      return None
+
+  def _SetFields(self, fields):
+    self['fields'] = fields
+
+  fields = property(_GetFields, _SetFields,
+      doc="""The feed query's fields parameter, which requests a partial
+      response such as 'entry(id,title,media:group(media:thumbnail))'. The
+      server only honours it for version 2 requests, which this module does
+      not make unless a GData-Version: 2 header is added to the service's
+      additional_headers.""")
+
   def ToUri(self):
     q_feed = self.feed or ''
     category_string = '/'.join(
@@ -0,0 +1,336 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reads whole worksheets into per-column arrays.
+
+Parsing a list or cells feed into SpreadsheetsList or SpreadsheetsCell
+objects builds a full Atom object graph for every row, which is slow and
+memory hungry for large worksheets. The reader in this module pages through
+the feed and pulls the cell values straight out of the XML, converting them
+to the requested Python types as it goes.
+
+  ColumnTable: Worksheet data stored as one array per column.
+  ColumnarReader: Pages through a cells or list feed and yields typed rows.
+
+Example Usage:
+client = gdata.spreadsheet.service.SpreadsheetsService()
+reader = gdata.spreadsheet.columnar.ColumnarReader(client, key,
+    types={'name': str, 'visits': int, 'revenue': float})
+for name, visits, revenue in reader.IterListRows():
+  ...
+table = reader.ReadCellColumns()
+total = sum(table.GetColumn('revenue'))
+"""
+
+import array
+import StringIO
+try:
+  from xml.etree import cElementTree as ElementTree
+except ImportError:
+  try:
+    import cElementTree as ElementTree
+  except ImportError:
+    try:
+      from xml.etree import ElementTree
+    except ImportError:
+      from elementtree import ElementTree
+import atom
+import gdata.spreadsheet
+import gdata.spreadsheet.service
+
+
+_ENTRY_TAG = '{%s}entry' % atom.ATOM_NAMESPACE
+_LINK_TAG = '{%s}link' % atom.ATOM_NAMESPACE
+_CELL_TAG = gdata.spreadsheet.GSPREADSHEETS_TEMPLATE % 'cell'
+_ROW_COUNT_TAG = gdata.spreadsheet.GSPREADSHEETS_TEMPLATE % 'rowCount'
+_COL_COUNT_TAG = gdata.spreadsheet.GSPREADSHEETS_TEMPLATE % 'colCount'
+_CUSTOM_PREFIX = gdata.spreadsheet.GSPREADSHEETS_EXTENDED_TEMPLATE % ''
+
+_NAN = float('nan')
+
+
+class Error(Exception):
+  pass
+
+
+def _ToInt(text):
+  # Numbers may come back as '12.0' in numericValue.
+  return int(float(text))
+
+
+# Conversions applied to the raw text for the supported column types. Text
+# columns keep the (possibly unicode) value returned by the parser.
+_CONVERTERS = {int: _ToInt, long: _ToInt, float: float, str: None,
+               unicode: None}
+
+
+def _ParseCellsPage(xml_string):
+  """Extracts the cell values and paging information from a cells feed.
+
+  Returns:
+    A tuple of (cells, row_count, col_count) where cells is a list of
+    (row, col, text, numeric_value) tuples in feed order.
+  """
+  cells = []
+  row_count = None
+  col_count = None
+  for event, element in ElementTree.iterparse(StringIO.StringIO(xml_string)):
+    if element.tag == _CELL_TAG:
+      cells.append((int(element.get('row')), int(element.get('col')),
+                    element.text, element.get('numericValue')))
+    elif element.tag == _ENTRY_TAG:
+      element.clear()
+    elif element.tag == _ROW_COUNT_TAG:
+      row_count = int(element.text)
+    elif element.tag == _COL_COUNT_TAG:
+      col_count = int(element.text)
+  return cells, row_count, col_count
+
+
+def _ParseListPage(xml_string):
+  """Extracts the custom column values and the next link from a list feed.
+
+  Returns:
+    A tuple of (rows, next_href) where each row is a list of
+    (column_name, text) pairs in document order.
+  """
+  rows = []
+  next_href = None
+  prefix_length = len(_CUSTOM_PREFIX)
+  for event, element in ElementTree.iterparse(StringIO.StringIO(xml_string)):
+    if element.tag == _ENTRY_TAG:
+      rows.append([(child.tag[prefix_length:], child.text)
+                   for child in element
+                   if child.tag.startswith(_CUSTOM_PREFIX)])
+      element.clear()
+    elif element.tag == _LINK_TAG and element.get('rel') == 'next':
+      next_href = element.get('href')
+  return rows, next_href
+
+
+class ColumnTable(object):
+  """Worksheet data stored as one array per column.
+
+  Columns with the float type are stored in an array.array('d'), with blank
+  cells held as NaN. All other columns are lists in which blank cells are
+  None.
+  """
+
+  def __init__(self, names, types=None):
+    self.names = list(names)
+    self.columns = []
+    types = types or {}
+    for name in self.names:
+      if types.get(name) is float:
+        self.columns.append(array.array('d'))
+      else:
+        self.columns.append([])
+
+  def AppendRow(self, row):
+    for column, value in zip(self.columns, row):
+      if value is None and isinstance(column, array.array):
+        value = _NAN
+      column.append(value)
+
+  def GetColumn(self, name):
+    """Returns the array of values for the column with the given name."""
+    return self.columns[self.names.index(name)]
+
+  def __len__(self):
+    if not self.columns:
+      return 0
+    return len(self.columns[0])
+
+  def __iter__(self):
+    """Iterates over the rows in the table as tuples."""
+    return iter(zip(*self.columns))
+
+
+class ColumnarReader(object):
+  """Pages through a worksheet and yields the rows as typed tuples.
+
+  The reader works with either a gdata.spreadsheet.service.SpreadsheetsService
+  or a gdata.spreadsheets.client.SpreadsheetsClient.
+  """
+
+  def __init__(self, client, key, wksht_id='default', types=None,
+               page_size=500, visibility='private', projection='full',
+               server='spreadsheets.google.com'):
+    """Creates a reader for a single worksheet.
+
+    Args:
+      client: The SpreadsheetsService or SpreadsheetsClient used to fetch
+          the feed pages.
+      key: str The key of the spreadsheet which contains the worksheet.
+      wksht_id: str (optional) The ID of the worksheet to read.
+      types: dict (optional) Maps column names to int, float or str. The
+          values in columns which are not listed are returned as text.
+      page_size: int (optional) The number of rows requested per page.
+      visibility: str (optional) The visibility part of the feed URL.
+      projection: str (optional) The projection part of the feed URL.
+      server: str (optional) The host serving the feeds. Ignored if the
+          client has a server attribute of its own.
+    """
+    self.client = client
+    self.key = key
+    self.wksht_id = wksht_id
+    self.types = types or {}
+    self.page_size = page_size
+    self.visibility = visibility
+    self.projection = projection
+    self.server = getattr(client, 'server', None) or server
+    # Set once the first page has been read.
+    self.column_names = None
+
+  def _FeedUri(self, feed_name):
+    return 'https://%s/feeds/%s/%s/%s/%s/%s' % (self.server, feed_name,
+        self.key, self.wksht_id, self.visibility, self.projection)
+
+  def _Fetch(self, uri, parser):
+    if hasattr(self.client, 'get_feed'):
+      # The v2 client passes the response object to the converter.
+      return self.client.request('GET', uri,
+          converter=lambda response: parser(response.read()))
+    return self.client.Get(uri, converter=parser)
+
+  def _GetConverters(self, names):
+    converters = []
+    for name in names:
+      column_type = self.types.get(name)
+      if column_type in _CONVERTERS:
+        converters.append(_CONVERTERS[column_type])
+      elif column_type is None:
+        converters.append(None)
+      else:
+        raise Error('Unsupported type %r for column %s' % (column_type, name))
+    return converters
+
+  def IterCellRows(self, header_row=1):
+    """Reads the worksheet through the cells feed.
+
+    The cells feed is requested in bands of page_size rows so that each
+    response stays small. Numeric columns are converted from the cell's
+    numericValue, so that formatting such as thousands separators does not
+    affect the result. Rows which contain no cells are skipped.
+
+    Args:
+      header_row: int (optional) The row holding the column names. Rows
+          above it are ignored. If None, every row is data and the columns
+          are named C1, C2, ...
+
+    Yields:
+      A tuple of converted values for each row, blank cells are None.
+    """
+    self.column_names = None
+    min_row = header_row or 1
+    row_count = None
+    converters = None
+    width = None
+    while row_count is None or min_row <= row_count:
+      query = gdata.spreadsheet.service.CellQuery(feed=self._FeedUri('cells'))
+      query.min_row = str(min_row)
+      query.max_row = str(min_row + self.page_size - 1)
+      if width is not None:
+        query.max_col = str(width)
+      cells, row_count, col_count = self._Fetch(query.ToUri(),
+                                                _ParseCellsPage)
+      if row_count is None:
+        raise Error('The cells feed did not include a row count')
+      if self.column_names is None:
+        if header_row:
+          header = [(col, text) for row, col, text, numeric in cells
+                    if row == header_row]
+          width = max([col for col, text in header] or [0])
+          self.column_names = ['C%i' % (i + 1) for i in xrange(width)]
+          for col, text in header:
+            if text:
+              self.column_names[col - 1] = text
+        else:
+          width = col_count
+          self.column_names = ['C%i' % (i + 1) for i in xrange(width)]
+        converters = self._GetConverters(self.column_names)
+      current_row = None
+      values = None
+      for row, col, text, numeric in cells:
+        if row == header_row or col > width:
+          continue
+        if row != current_row:
+          if values is not None:
+            yield tuple(values)
+          current_row = row
+          values = [None] * width
+        converter = converters[col - 1]
+        if converter is None:
+          values[col - 1] = text
+        elif numeric is not None:
+          values[col - 1] = converter(numeric)
+        elif text:
+          values[col - 1] = converter(text)
+      if values is not None:
+        yield tuple(values)
+      min_row += self.page_size
+
+  def IterListRows(self):
+    """Reads the worksheet through the list feed.
+
+    The column names are the list feed's custom element names, which are
+    the lower cased header values with spaces and punctuation removed.
+
+    Yields:
+      A tuple of converted values for each row, blank cells are None.
+    """
+    query = gdata.spreadsheet.service.ListQuery(feed=self._FeedUri('list'))
+    query.max_results = str(self.page_size)
+    uri = query.ToUri()
+    self.column_names = None
+    converters = None
+    positions = None
+    while uri:
+      rows, uri = self._Fetch(uri, _ParseListPage)
+      for row in rows:
+        if self.column_names is None:
+          self.column_names = [name for name, text in row]
+          converters = self._GetConverters(self.column_names)
+          positions = dict([(name, i)
+                            for i, name in enumerate(self.column_names)])
+        values = [None] * len(self.column_names)
+        for name, text in row:
+          i = positions.get(name)
+          if i is None or not text:
+            continue
+          if converters[i] is None:
+            values[i] = text
+          else:
+            values[i] = converters[i](text)
+        yield tuple(values)
+
+  def ReadCellColumns(self, header_row=1):
+    """Reads the worksheet through the cells feed into a ColumnTable."""
+    return self._ReadColumns(self.IterCellRows(header_row=header_row))
+
+  def ReadListColumns(self):
+    """Reads the worksheet through the list feed into a ColumnTable."""
+    return self._ReadColumns(self.IterListRows())
+
+  def _ReadColumns(self, rows):
+    table = None
+    for row in rows:
+      if table is None:
+        table = ColumnTable(self.column_names, self.types)
+      table.AppendRow(row)
+    if table is None:
+      table = ColumnTable(self.column_names or [], self.types)
+    return table
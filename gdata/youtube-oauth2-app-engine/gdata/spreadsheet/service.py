@@ -315,7 +315,107 @@ class SpreadsheetsService(gdata.service.GDataService):
     if url is None:
       url = self._GenerateCellsBatchUrl(spreadsheet_key, worksheet_id)
     return self.Post(batch_feed, url, converter=converter)
-    
+
+  def UpdateCells(self, rows, key, wksht_id='default', start_row=1,
+      start_col=1, batch_size=1000):
+    """Writes a block of values to a worksheet using batch requests.
+
+    The cell entries for the whole block are fetched with a single ranged
+    cells feed query (with return-empty set, so blank cells are included)
+    which supplies the ids and edit links needed for the batch updates. The
+    updates are then sent in batch feeds of at most batch_size cells each.
+
+    Args:
+      rows: list or iterator of row sequences. Each row holds the values for
+          consecutive columns beginning at start_col. A value of None leaves
+          the corresponding cell untouched. Strings are used as the cell's
+          input value as they are, other values are converted with str.
+      key: str The key of the spreadsheet in which the cells reside.
+      wksht_id: str The ID of the worksheet which holds the cells.
+      start_row: int (optional) The row at which the first row of values is
+          written. Default value: 1.
+      start_col: int (optional) The column at which the first value of each
+          row is written. Default value: 1.
+      batch_size: int (optional) The maximum number of cell updates sent in
+          a single batch request. Default value: 1000.
+
+    Returns:
+      A dict mapping the R1C1 address of each cell which could not be
+      updated to the gdata.BatchStatus returned by the server. An empty dict
+      means every cell was written.
+
+    Raises:
+      ValueError if a value would be written to a cell outside of the
+      worksheet's rows or columns. Nothing is written in that case.
+    """
+    rows = [list(row) for row in rows]
+    if not rows:
+      return {}
+    max_col = start_col + max([len(row) for row in rows]) - 1
+    if max_col < start_col:
+      return {}
+    query = CellQuery()
+    query.min_row = str(start_row)
+    query.max_row = str(start_row + len(rows) - 1)
+    query.min_col = str(start_col)
+    query.max_col = str(max_col)
+    query.return_empty = 'true'
+    cells_feed = self.GetCellsFeed(key, wksht_id, query=query)
+    batch_url = cells_feed.GetBatchLink().href
+    # Index the existing cell entries by position, following next links in
+    # case the server splits the range across several pages.
+    cells = {}
+    while True:
+      for entry in cells_feed.entry:
+        cells[(int(entry.cell.row), int(entry.cell.col))] = entry
+      next_link = cells_feed.GetNextLink()
+      if next_link is None:
+        break
+      cells_feed = self.GetNext(cells_feed)
+
+    # Check the whole block before anything is sent, so that a block which
+    # does not fit the worksheet leaves it unchanged.
+    updates = []
+    for row_offset, row in enumerate(rows):
+      for col_offset, value in enumerate(row):
+        if value is None:
+          continue
+        position = (start_row + row_offset, start_col + col_offset)
+        if position not in cells:
+          raise ValueError('Cell R%sC%s is outside of the worksheet' %
+                           position)
+        updates.append((position, value))
+
+    failures = {}
+    batch_feed = gdata.spreadsheet.SpreadsheetsCellsFeed()
+    for position, value in updates:
+      entry = cells[position]
+      if not isinstance(value, basestring):
+        value = str(value)
+      entry.cell.inputValue = value
+      batch_feed.AddUpdate(entry, batch_id_string='R%sC%s' % position)
+      if len(batch_feed.entry) >= batch_size:
+        self._SendCellsBatch(batch_feed, batch_url, failures)
+        batch_feed = gdata.spreadsheet.SpreadsheetsCellsFeed()
+    if batch_feed.entry:
+      self._SendCellsBatch(batch_feed, batch_url, failures)
+    return failures
+
+  def _SendCellsBatch(self, batch_feed, batch_url, failures):
+    pending = set([entry.batch_id.text for entry in batch_feed.entry])
+    result_feed = self.ExecuteBatch(batch_feed, batch_url)
+    for entry in result_feed.entry:
+      if entry.batch_id is None:
+        continue
+      pending.discard(entry.batch_id.text)
+      status = entry.batch_status
+      if status is None or status.code != '200':
+        failures[entry.batch_id.text] = status
+    # Operations missing from the response were not processed, which happens
+    # when the server interrupts the batch.
+    for batch_id in pending:
+      failures[batch_id] = None
+
   def InsertRow(self, row_data, key, wksht_id='default'):
     """Inserts a new row with the provided data
     
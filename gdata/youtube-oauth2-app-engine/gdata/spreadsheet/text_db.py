@@ -15,7 +15,9 @@
 # limitations under the License.
 
 
+import re
 import StringIO
+import time
 import gdata
 import gdata.service
 import gdata.spreadsheet
@@ -64,6 +66,7 @@ The intended use case is to allow easy storage of text data in a spreadsheet.
   Table: Represents a worksheet and interacts with records.
   RecordResultSet: A list of records in a table.
   Record: Represents a row in a worksheet allows manipulation of text data.
+  TableCache: Optional in-memory copy of a table with indexed lookups.
 """
 
 
@@ -279,9 +282,35 @@ class Table(object):
     self.spreadsheet_key = spreadsheet_key
     self.client = database_client
     self.fields = fields or []
+    self.cache = None
     if fields:
       self.SetFields(fields)
 
+  def EnableCache(self, indexed_fields=None, max_age=60):
+    """Keeps a local copy of the table to answer lookups without requests.
+
+    Once enabled, GetRecord, GetRecords and simple FindRecords queries are
+    answered from memory. Records added, pushed or deleted through this
+    table are applied to the cache. Changes made by other clients are
+    picked up when the cache is revalidated, see TableCache.
+
+    Args:
+      indexed_fields: list of strings (optional) The column names on which
+          hash indexes are built for equality lookups.
+      max_age: int (optional) The number of seconds after which the
+          worksheet's updated timestamp is checked before answering a query.
+
+    Returns:
+      The TableCache, which has already been loaded.
+    """
+    self.cache = TableCache(self, indexed_fields=indexed_fields,
+                            max_age=max_age)
+    self.cache.Load()
+    return self.cache
+
+  def DisableCache(self):
+    self.cache = None
+
   def LookupFields(self):
     """Queries to find the column names in the first row of the worksheet.
     
@@ -346,9 +375,12 @@ class Table(object):
     """
     new_row = self.client._GetSpreadsheetsClient().InsertRow(data, 
         self.spreadsheet_key, wksht_id=self.worksheet_id)
-    return Record(content=data, row_entry=new_row, 
+    record = Record(content=data, row_entry=new_row, 
         spreadsheet_key=self.spreadsheet_key, worksheet_id=self.worksheet_id,
-        database_client=self.client)
+        database_client=self.client, cache=self.cache)
+    if self.cache:
+      self.cache.Add(record)
+    return record
 
   def GetRecord(self, row_id=None, row_number=None):
     """Gets a single record from the worksheet based on row ID or number.
@@ -362,6 +394,8 @@ class Table(object):
     Returns:
       Record for the desired row.
     """
+    if self.cache:
+      return self.cache.GetRecord(row_id=row_id, row_number=row_number)
     if row_id:
       row_entry = self.client._GetSpreadsheetsClient().GetListFeed(
           self.spreadsheet_key, wksht_id=self.worksheet_id, row_id=row_id)
@@ -393,6 +427,8 @@ class Table(object):
     """
     start_row = int(start_row)
     end_row = int(end_row)
+    if self.cache:
+      return self._CachedResultSet(self.cache.GetRecords(start_row, end_row))
     max_rows = end_row - start_row + 1
     row_query = gdata.spreadsheet.service.ListQuery()
     row_query.start_index = str(start_row)
@@ -413,14 +449,26 @@ class Table(object):
           in the name column, '(cost < 19.50 and name != toy) or cost > 500'
 
     Returns:
-      RecordResultSet with the first group of matches.
+      RecordResultSet with the first group of matches. When the table is
+      cached and the query is a single comparison such as 'name == john',
+      the result set holds every match.
     """
+    if self.cache:
+      matches = self.cache.FindRecords(query_string)
+      if matches is not None:
+        return self._CachedResultSet(matches)
     row_query = gdata.spreadsheet.service.ListQuery()
     row_query.sq = query_string
     matching_feed = self.client._GetSpreadsheetsClient().GetListFeed(
         self.spreadsheet_key, wksht_id=self.worksheet_id, query=row_query)
     return RecordResultSet(matching_feed, self.client, 
-        self.spreadsheet_key, self.worksheet_id)
+        self.spreadsheet_key, self.worksheet_id, cache=self.cache)
+
+  def _CachedResultSet(self, records):
+    result_set = RecordResultSet(None, self.client, self.spreadsheet_key,
+        self.worksheet_id, cache=self.cache)
+    result_set.extend(records)
+    return result_set
 
 
 class RecordResultSet(list):
@@ -432,16 +480,19 @@ class RecordResultSet(list):
   calling GetNext().
   """
 
-  def __init__(self, feed, client, spreadsheet_key, worksheet_id):
+  def __init__(self, feed, client, spreadsheet_key, worksheet_id, cache=None):
     self.client = client
     self.spreadsheet_key = spreadsheet_key
     self.worksheet_id = worksheet_id
     self.feed = feed
+    self.cache = cache
     list(self)
+    if self.feed is None:
+      return
     for entry in self.feed.entry:
       self.append(Record(content=None, row_entry=entry, 
           spreadsheet_key=spreadsheet_key, worksheet_id=worksheet_id,
-          database_client=client))
+          database_client=client, cache=cache))
 
   def GetNext(self):
     """Fetches the next batch of rows in the result set.
@@ -449,12 +500,14 @@ class RecordResultSet(list):
     Returns:
       A new RecordResultSet.
     """
+    if self.feed is None:
+      return None
     next_link = self.feed.GetNextLink()
     if next_link and next_link.href:
       new_feed = self.client._GetSpreadsheetsClient().Get(next_link.href, 
           converter=gdata.spreadsheet.SpreadsheetsListFeedFromString)
       return RecordResultSet(new_feed, self.client, self.spreadsheet_key,
-          self.worksheet_id)
+          self.worksheet_id, cache=self.cache)
 
 
 class Record(object):
@@ -466,7 +519,7 @@ class Record(object):
   """
 
   def __init__(self, content=None, row_entry=None, spreadsheet_key=None, 
-       worksheet_id=None, database_client=None):
+       worksheet_id=None, database_client=None, cache=None):
     """Constructor for a record.
     
     Args:
@@ -478,8 +531,11 @@ class Record(object):
       worksheet_id: str The ID of the worksheet in which this row belongs.
       database_client: DatabaseClient The client which can be used to talk
           the Google Spreadsheets server to edit this row.
+      cache: TableCache (optional) The cache of the table this row belongs
+          to, which is kept up to date when the row is changed.
     """
     self.entry = row_entry
+    self.cache = cache
     self.spreadsheet_key = spreadsheet_key
     self.worksheet_id = worksheet_id
     if row_entry:
@@ -515,6 +571,8 @@ class Record(object):
     might be absent from this local copy.
     """
     self.entry = self.client._GetSpreadsheetsClient().UpdateRow(self.entry, self.content)
+    if self.cache:
+      self.cache.Update(self)
 
   def Pull(self):
     """Query Google Spreadsheets to get the latest data from the server.
@@ -526,9 +584,236 @@ class Record(object):
       self.entry = self.client._GetSpreadsheetsClient().GetListFeed(
           self.spreadsheet_key, wksht_id=self.worksheet_id, row_id=self.row_id)
     self.ExtractContentFromEntry(self.entry)
+    if self.cache:
+      self.cache.Update(self)
 
   def Delete(self):
     self.client._GetSpreadsheetsClient().DeleteRow(self.entry)
+    if self.cache:
+      self.cache.Remove(self)
+
+
+# Matches a structured query made of a single comparison, for example
+# 'name == john', 'cost >= 19.50' or 'city = "new york"'.
+_SIMPLE_QUERY_PATTERN = re.compile(
+    r'^\s*(\w+)\s*(==|=|!=|<>|<=|>=|<|>)\s*("[^"]*"|[^\s()&|"]+)\s*$')
+
+
+def _ComparableValue(value):
+  """Returns a float for numeric cell text so that 9 sorts before 10."""
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return value
+
+
+class TableCache(object):
+  """An in-memory copy of a table which answers queries locally.
+
+  The cache loads every row of the worksheet once and keeps the records in
+  row order along with hash indexes on the chosen fields. Equality lookups
+  on indexed fields are dictionary lookups, other lookups scan the rows in
+  memory.
+
+  Before answering a query, a cache which is older than max_age seconds
+  fetches the worksheet entry and reloads all rows if the worksheet's
+  updated timestamp has changed since the rows were loaded.
+  """
+
+  def __init__(self, table, indexed_fields=None, max_age=60):
+    self.table = table
+    self.indexed_fields = list(indexed_fields or [])
+    self.max_age = max_age
+    self.records = []
+    self.indexes = {}
+    self.indexed_values = {}
+    self.updated = None
+    self.checked_at = None
+
+  def _GetWorksheetUpdated(self):
+    worksheet = self.table.client._GetSpreadsheetsClient().GetWorksheetsFeed(
+        self.table.spreadsheet_key, wksht_id=self.table.worksheet_id)
+    if worksheet.updated is not None:
+      return worksheet.updated.text
+    return None
+
+  def Load(self):
+    """Fetches every row in the worksheet and rebuilds the indexes."""
+    client = self.table.client._GetSpreadsheetsClient()
+    self.updated = self._GetWorksheetUpdated()
+    self.checked_at = time.time()
+    records = []
+    feed = client.GetListFeed(self.table.spreadsheet_key,
+                              wksht_id=self.table.worksheet_id)
+    while feed is not None:
+      for entry in feed.entry:
+        records.append(Record(content=None, row_entry=entry,
+            spreadsheet_key=self.table.spreadsheet_key,
+            worksheet_id=self.table.worksheet_id,
+            database_client=self.table.client, cache=self))
+      next_link = feed.GetNextLink()
+      if next_link and next_link.href:
+        feed = client.Get(next_link.href,
+            converter=gdata.spreadsheet.SpreadsheetsListFeedFromString)
+      else:
+        feed = None
+    self.records = records
+    self.indexes = {}
+    self.indexed_values = {}
+    for field in self.indexed_fields:
+      self.indexes[field] = {}
+    for record in self.records:
+      self._IndexRecord(record)
+
+  def Revalidate(self):
+    """Reloads the rows if the worksheet changed since they were loaded.
+
+    The worksheet is only checked if max_age seconds have passed since the
+    last check.
+    """
+    if (self.checked_at is not None and self.max_age is not None and
+        time.time() - self.checked_at < self.max_age):
+      return
+    if self._GetWorksheetUpdated() != self.updated:
+      self.Load()
+    else:
+      self.checked_at = time.time()
+
+  def _IndexRecord(self, record):
+    # The indexed values are remembered because the record's content may be
+    # edited in place before the record is pushed.
+    values = {}
+    for field, index in self.indexes.iteritems():
+      value = record.content.get(field)
+      index.setdefault(value, []).append(record)
+      values[field] = value
+    self.indexed_values[id(record)] = values
+
+  def _UnindexRecord(self, record):
+    values = self.indexed_values.pop(id(record), {})
+    for field, value in values.iteritems():
+      matches = self.indexes[field].get(value, [])
+      if record in matches:
+        matches.remove(record)
+        if not matches:
+          del self.indexes[field][value]
+
+  def _Position(self, row_id):
+    for i, record in enumerate(self.records):
+      if record.row_id == row_id:
+        return i
+    return None
+
+  def Add(self, record):
+    """Appends a newly inserted record, the list feed adds rows at the end."""
+    record.cache = self
+    self.records.append(record)
+    self._IndexRecord(record)
+
+  def Update(self, record):
+    """Replaces the cached copy of a row after it was pushed or pulled."""
+    position = self._Position(record.row_id)
+    if position is None:
+      return
+    self._UnindexRecord(self.records[position])
+    record.cache = self
+    self.records[position] = record
+    self._IndexRecord(record)
+
+  def Remove(self, record):
+    """Drops a deleted row, the rows which follow it move up by one."""
+    position = self._Position(record.row_id)
+    if position is None:
+      return
+    self._UnindexRecord(self.records[position])
+    del self.records[position]
+
+  def GetRecord(self, row_id=None, row_number=None):
+    self.Revalidate()
+    if row_id:
+      position = self._Position(row_id)
+    else:
+      position = int(row_number) - 1
+    if position is None or position < 0 or position >= len(self.records):
+      return None
+    return self.records[position]
+
+  def GetRecords(self, start_row, end_row):
+    """Returns the records between the start and end row numbers inclusive."""
+    self.Revalidate()
+    return self.records[max(int(start_row) - 1, 0):int(end_row)]
+
+  def FindEqual(self, field, value):
+    """Returns the records whose field equals the value, in row order."""
+    self.Revalidate()
+    if field in self.indexes:
+      matches = self.indexes[field].get(value, [])
+      if len(matches) > 1:
+        positions = dict([(id(record), i)
+                          for i, record in enumerate(self.records)])
+        matches = sorted(matches, key=lambda record: positions[id(record)])
+      return list(matches)
+    return [record for record in self.records
+            if record.content.get(field) == value]
+
+  def FindRange(self, field, low=None, high=None, include_low=True,
+                include_high=True):
+    """Returns the records whose field lies between low and high.
+
+    Numeric cell values are compared as numbers. Either bound may be None
+    to leave that side of the range open. Rows with no value in the field
+    never match.
+    """
+    self.Revalidate()
+    if low is not None:
+      low = _ComparableValue(low)
+    if high is not None:
+      high = _ComparableValue(high)
+    matches = []
+    for record in self.records:
+      value = record.content.get(field)
+      if value is None:
+        continue
+      value = _ComparableValue(value)
+      if low is not None and (value < low or (value == low and
+                                              not include_low)):
+        continue
+      if high is not None and (value > high or (value == high and
+                                                not include_high)):
+        continue
+      matches.append(record)
+    return matches
+
+  def FindRecords(self, query_string):
+    """Answers a single comparison structured query from the cache.
+
+    Returns:
+      A list of matching records, or None if the query is too complex to be
+      answered locally and should be sent to the server.
+    """
+    match = _SIMPLE_QUERY_PATTERN.match(query_string)
+    if match is None:
+      return None
+    field, operator, value = match.groups()
+    value = value.strip('"')
+    if operator in ('==', '='):
+      matches = self.FindEqual(field, value)
+      if not matches and _ComparableValue(value) != value:
+        # Compare numerically so that '5' matches a cell containing '5.0'.
+        matches = self.FindRange(field, value, value)
+      return matches
+    if operator in ('!=', '<>'):
+      self.Revalidate()
+      value = _ComparableValue(value)
+      return [record for record in self.records
+              if _ComparableValue(record.content.get(field)) != value]
+    if operator == '<':
+      return self.FindRange(field, high=value, include_high=False)
+    if operator == '<=':
+      return self.FindRange(field, high=value)
+    if operator == '>':
+      return self.FindRange(field, low=value, include_low=False)
+    return self.FindRange(field, low=value)
 
 
 def ConvertStringsToColumnHeaders(proposed_headers):
@@ -2,6 +2,7 @@
 
 import thread
 import time
+from collections import deque
 
 class SessionCache:
     """This class is used by the server to cache TLS sessions.
@@ -95,6 +96,149 @@ class SessionCache:
                 break
         self.firstIndex = index
 
+class ClientSessionCache:
+    """This class is used by clients to cache TLS sessions per server.
+
+    Sessions are stored under the (host, port) of the server they were
+    negotiated with, so that a later connection to the same server can
+    offer the session for resumption instead of performing a full
+    handshake.  The cache holds at most maxEntries sessions, discarding
+    the least recently used one when full, and forgets sessions which
+    are older than maxAge or which are no longer resumable.
+
+    The cache also counts how many of the handshakes reported to it
+    were resumed and how many were full handshakes.
+
+    This class is thread-safe.
+    """
+
+    def __init__(self, maxEntries=1000, maxAge=3600):
+        """Create a new ClientSessionCache.
+
+        @type maxEntries: int
+        @param maxEntries: The maximum number of servers to remember
+        sessions for.  The default is 1000.
+
+        @type maxAge: int
+        @param maxAge: The number of seconds after which a session is
+        no longer offered for resumption.  The default is 3600 (i.e. 1
+        hour), which is shorter than most servers keep sessions for.
+        """
+        self.lock = thread.allocate_lock()
+        self.maxEntries = maxEntries
+        self.maxAge = maxAge
+
+        # Maps (host, port) to (session, timestamp, use) triples
+        self.entriesDict = {}
+
+        # (key, use) pairs, least recently used first.  A key's
+        # use is bumped whenever it's looked up, so pairs whose use
+        # doesn't match entriesDict are stale and are skipped.
+        self.entriesQueue = deque()
+        self.useCounter = 0
+
+        self.resumedHandshakes = 0
+        self.fullHandshakes = 0
+
+    def getSession(self, host, port):
+        """Get the cached session for a server.
+
+        @type host: str
+        @param host: The server's host name.
+
+        @type port: int
+        @param port: The server's port.
+
+        @rtype: L{tlslite.Session.Session} or None
+        @return: A resumable session, or None if there isn't one.
+        """
+        key = (host, port)
+        self.lock.acquire()
+        try:
+            entry = self.entriesDict.get(key)
+            if entry is None:
+                return None
+            session, timestamp, use = entry
+            if time.time() - timestamp > self.maxAge or not session.valid():
+                del(self.entriesDict[key])
+                return None
+            self._touch(key, session, timestamp)
+            return session
+        finally:
+            self.lock.release()
+
+    def setSession(self, host, port, session):
+        """Store the session negotiated with a server.
+
+        Sessions which can't be resumed, such as shared-key sessions,
+        are ignored.
+
+        @type host: str
+        @param host: The server's host name.
+
+        @type port: int
+        @param port: The server's port.
+
+        @type session: L{tlslite.Session.Session}
+        @param session: The session to store.
+        """
+        if not session or not session.resumable:
+            return
+        key = (host, port)
+        self.lock.acquire()
+        try:
+            entry = self.entriesDict.get(key)
+            if entry is not None and entry[0] is session:
+                #A resumed session keeps its original timestamp
+                timestamp = entry[1]
+            else:
+                timestamp = time.time()
+            self._touch(key, session, timestamp)
+            while len(self.entriesDict) > self.maxEntries:
+                oldKey, oldUse = self.entriesQueue.popleft()
+                oldEntry = self.entriesDict.get(oldKey)
+                if oldEntry is not None and oldEntry[2] == oldUse:
+                    del(self.entriesDict[oldKey])
+        finally:
+            self.lock.release()
+
+    def removeSession(self, host, port):
+        """Forget the session for a server, if there is one."""
+        self.lock.acquire()
+        try:
+            self.entriesDict.pop((host, port), None)
+        finally:
+            self.lock.release()
+
+    def recordHandshake(self, resumed):
+        """Count a completed handshake.
+
+        @type resumed: bool
+        @param resumed: Whether the handshake resumed a session.
+        """
+        self.lock.acquire()
+        try:
+            if resumed:
+                self.resumedHandshakes += 1
+            else:
+                self.fullHandshakes += 1
+        finally:
+            self.lock.release()
+
+    def __len__(self):
+        return len(self.entriesDict)
+
+    def _touch(self, key, session, timestamp):
+        #Must be called with the lock held
+        self.useCounter += 1
+        self.entriesDict[key] = (session, timestamp, self.useCounter)
+        self.entriesQueue.append((key, self.useCounter))
+        #Don't let stale queue entries pile up for a few hot servers
+        if len(self.entriesQueue) > 2 * self.maxEntries + 16:
+            self.entriesQueue = deque([(k, entry[2]) for (k, entry) in
+                                       sorted(self.entriesDict.items(),
+                                              key=lambda item: item[1][2])])
+
 def _test():
     import doctest, SessionCache
     return doctest.testmod(SessionCache)
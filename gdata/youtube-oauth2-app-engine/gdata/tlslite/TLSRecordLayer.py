@@ -16,7 +16,13 @@ import sha
 import md5
 import socket
 import errno
+import struct
 import traceback
+from collections import deque
+
+#Size of the socket receive buffer, room for a maximum size record
+#(18432 bytes plus the header) with plenty to spare for reading ahead.
+RECV_BUFFER_SIZE = 32768
 
 class _ConnectionState:
     def __init__(self):
@@ -25,9 +31,7 @@ class _ConnectionState:
         self.seqnum = 0
 
     def getSeqNumStr(self):
-        w = Writer(8)
-        w.add(self.seqnum, 8)
-        seqnumStr = bytesToString(w.bytes)
+        seqnumStr = struct.pack("!Q", self.seqnum)
         self.seqnum += 1
         return seqnumStr
 
@@ -113,7 +117,16 @@ class TLSRecordLayer:
 
         #Buffers for processing messages
         self._handshakeBuffer = []
-        self._readBuffer = ""
+        #Decrypted application data, as a deque of strings
+        self._readBuffer = deque()
+        self._readOffset = 0
+        self._readBufferLength = 0
+
+        #Bytes read from the socket are kept in _recvBuffer, and the
+        #unprocessed ones lie between _recvStart and _recvEnd
+        self._recvBuffer = bytearray(RECV_BUFFER_SIZE)
+        self._recvStart = 0
+        self._recvEnd = 0
 
         #Handshake digests
         self._handshake_md5 = md5.md5()
@@ -196,13 +209,19 @@ class TLSRecordLayer:
         @return: A generator; see above for details.
         """
         try:
-            while len(self._readBuffer)<min and not self.closed:
+            #Besides reading at least 'min' bytes, consume any records
+            #already sitting in the receive buffer
+            while not self.closed and (self._readBufferLength < min or \
+                                       self._recvBufferHasRecord()):
                 try:
                     for result in self._getMsg(ContentType.application_data):
                         if result in (0,1):
                             yield result
                     applicationData = result
-                    self._readBuffer += bytesToString(applicationData.write())
+                    data = applicationData.write()
+                    if data:
+                        self._readBuffer.append(data)
+                        self._readBufferLength += len(data)
                 except TLSRemoteAlert, alert:
                     if alert.description != AlertDescription.close_notify:
                         raise
@@ -213,15 +232,35 @@ class TLSRecordLayer:
                         self._shutdown(True)
 
             if max == None:
-                max = len(self._readBuffer)
+                max = self._readBufferLength
 
-            returnStr = self._readBuffer[:max]
-            self._readBuffer = self._readBuffer[max:]
-            yield returnStr
+            yield self._takeReadBuffer(max)
         except:
             self._shutdown(False)
             raise
 
+    def _takeReadBuffer(self, max):
+        #The first chunk may have been partly returned already; rather than
+        #slicing off the returned part, we remember an offset into it
+        pieces = []
+        remaining = max
+        while remaining > 0 and self._readBuffer:
+            chunk = self._readBuffer[0]
+            available = len(chunk) - self._readOffset
+            if available > remaining:
+                pieces.append(chunk[self._readOffset:self._readOffset+remaining])
+                self._readOffset += remaining
+                remaining = 0
+            else:
+                if self._readOffset:
+                    chunk = chunk[self._readOffset:]
+                pieces.append(chunk)
+                self._readBuffer.popleft()
+                self._readOffset = 0
+                remaining -= available
+        self._readBufferLength -= max - remaining
+        return "".join(pieces)
+
     def write(self, s):
         """Write some data to the TLS connection.
 
@@ -430,7 +469,7 @@ class TLSRecordLayer:
     def _shutdown(self, resumable):
         self._writeState = _ConnectionState()
         self._readState = _ConnectionState()
-        #Don't do this: self._readBuffer = ""
+        #Don't do this: self._readBuffer.clear()
         self.version = (0,0)
         self._versionCheck = False
         self.closed = True
@@ -707,6 +746,51 @@ class TLSRecordLayer:
                 yield result
 
 
+    #Reads from the socket until the receive buffer holds 'needed' bytes
+    def _fillRecvBuffer(self, needed):
+        while self._recvEnd - self._recvStart < needed:
+            buf = self._recvBuffer
+            if self._recvStart + needed > len(buf):
+                #Move the unread bytes to the front of the buffer
+                pending = self._recvEnd - self._recvStart
+                if needed > len(buf):
+                    buf.extend(bytearray(needed - len(buf)))
+                buf[0:pending] = buf[self._recvStart:self._recvEnd]
+                self._recvStart = 0
+                self._recvEnd = pending
+            try:
+                if hasattr(self.sock, "recv_into"):
+                    received = self.sock.recv_into(
+                        memoryview(buf)[self._recvEnd:])
+                else:
+                    s = self.sock.recv(len(buf) - self._recvEnd)
+                    received = len(s)
+                    buf[self._recvEnd:self._recvEnd+received] = s
+            except socket.error, why:
+                if why[0] == errno.EWOULDBLOCK:
+                    yield 0
+                    continue
+                else:
+                    raise
+
+            #If the connection was abruptly closed, raise an error
+            if received == 0:
+                raise TLSAbruptCloseError()
+
+            self._recvEnd += received
+
+    #Whether a whole record is waiting in the receive buffer.  Readers
+    #driven by socket events must consume these, since the socket won't
+    #signal that they are available.
+    def _recvBufferHasRecord(self):
+        start = self._recvStart
+        if self._recvEnd - start < 5:
+            return False
+        if self._recvBuffer[start] not in ContentType.all:
+            return False
+        length = struct.unpack_from("!H", self._recvBuffer, start+3)[0]
+        return self._recvEnd - start >= 5 + length
+
     #Returns next record or next handshake message
     def _getNextRecord(self):
 
@@ -719,41 +803,30 @@ class TLSRecordLayer:
 
         #Otherwise...
         #Read the next record header
-        bytes = createByteArraySequence([])
-        recordHeaderLength = 1
-        ssl2 = False
-        while 1:
-            try:
-                s = self.sock.recv(recordHeaderLength-len(bytes))
-            except socket.error, why:
-                if why[0] == errno.EWOULDBLOCK:
-                    yield 0
-                    continue
-                else:
-                    raise
-
-            #If the connection was abruptly closed, raise an error
-            if len(s)==0:
-                raise TLSAbruptCloseError()
-
-            bytes += stringToBytes(s)
-            if len(bytes)==1:
-                if bytes[0] in ContentType.all:
-                    ssl2 = False
-                    recordHeaderLength = 5
-                elif bytes[0] == 128:
-                    ssl2 = True
-                    recordHeaderLength = 2
-                else:
-                    raise SyntaxError()
-            if len(bytes) == recordHeaderLength:
-                break
+        for result in self._fillRecvBuffer(1):
+            yield result
+        firstByte = self._recvBuffer[self._recvStart]
+        if firstByte in ContentType.all:
+            ssl2 = False
+            recordHeaderLength = 5
+        elif firstByte == 128:
+            ssl2 = True
+            recordHeaderLength = 2
+        else:
+            raise SyntaxError()
+        for result in self._fillRecvBuffer(recordHeaderLength):
+            yield result
 
         #Parse the record header
         if ssl2:
-            r = RecordHeader2().parse(Parser(bytes))
+            headerBytes = createByteArraySequence(
+                self._recvBuffer[self._recvStart:self._recvStart+2])
+            r = RecordHeader2().parse(Parser(headerBytes))
         else:
-            r = RecordHeader3().parse(Parser(bytes))
+            recordType, major, minor, length = struct.unpack_from(
+                "!BBBH", self._recvBuffer, self._recvStart)
+            r = RecordHeader3().create((major, minor), recordType, length)
+        self._recvStart += recordHeaderLength
 
         #Check the record header fields
         if r.length > 18432:
@@ -761,24 +834,10 @@ class TLSRecordLayer:
                 yield result
 
         #Read the record contents
-        bytes = createByteArraySequence([])
-        while 1:
-            try:
-                s = self.sock.recv(r.length - len(bytes))
-            except socket.error, why:
-                if why[0] == errno.EWOULDBLOCK:
-                    yield 0
-                    continue
-                else:
-                    raise
-
-            #If the connection is closed, raise a socket error
-            if len(s)==0:
-                    raise TLSAbruptCloseError()
-
-            bytes += stringToBytes(s)
-            if len(bytes) == r.length:
-                break
+        for result in self._fillRecvBuffer(r.length):
+            yield result
+        data = str(self._recvBuffer[self._recvStart:self._recvStart+r.length])
+        self._recvStart += r.length
 
         #Check the record header fields (2)
         #We do this after reading the contents from the socket, so that
@@ -795,12 +854,20 @@ class TLSRecordLayer:
         #        yield result
 
         #Decrypt the record
-        for result in self._decryptRecord(r.type, bytes):
+        for result in self._decryptRecord(r.type, data):
             if result in (0,1):
                 yield result
             else:
                 break
-        bytes = result
+        data = result
+
+        #Application data is delivered as a string, without converting it
+        #to a byte array
+        if r.type == ContentType.application_data:
+            yield (r, Parser(data))
+            return
+
+        bytes = stringToBytes(data)
         p = Parser(bytes)
 
         #If it doesn't contain handshake messages, we can just return it
@@ -845,27 +912,28 @@ class TLSRecordLayer:
             yield (recordHeader, Parser(bytes))
 
 
-    def _decryptRecord(self, recordType, bytes):
+    def _decryptRecord(self, recordType, data):
         if self._readState.encContext:
 
             #Decrypt if it's a block cipher
             if self._readState.encContext.isBlockCipher:
                 blockLength = self._readState.encContext.block_size
-                if len(bytes) % blockLength != 0:
+                if len(data) % blockLength != 0:
                     for result in self._sendError(\
                             AlertDescription.decryption_failed,
                             "Encrypted data not a multiple of blocksize"):
                         yield result
-                ciphertext = bytesToString(bytes)
-                plaintext = self._readState.encContext.decrypt(ciphertext)
+                data = self._readState.encContext.decrypt(data)
                 if self.version == (3,2): #For TLS 1.1, remove explicit IV
-                    plaintext = plaintext[self._readState.encContext.block_size : ]
-                bytes = stringToBytes(plaintext)
+                    data = data[self._readState.encContext.block_size : ]
 
                 #Check padding
                 paddingGood = True
-                paddingLength = bytes[-1]
-                if (paddingLength+1) > len(bytes):
+                if not data:
+                    paddingLength = 0
+                else:
+                    paddingLength = ord(data[-1])
+                if (paddingLength+1) > len(data):
                     paddingGood=False
                     totalPaddingLength = 0
                 else:
@@ -873,57 +941,51 @@ class TLSRecordLayer:
                         totalPaddingLength = paddingLength+1
                     elif self.version in ((3,1), (3,2)):
                         totalPaddingLength = paddingLength+1
-                        paddingBytes = bytes[-totalPaddingLength:-1]
-                        for byte in paddingBytes:
-                            if byte != paddingLength:
-                                paddingGood = False
-                                totalPaddingLength = 0
+                        paddingBytes = data[-totalPaddingLength:-1]
+                        if paddingBytes != chr(paddingLength) * paddingLength:
+                            paddingGood = False
+                            totalPaddingLength = 0
                     else:
                         raise AssertionError()
 
             #Decrypt if it's a stream cipher
             else:
                 paddingGood = True
-                ciphertext = bytesToString(bytes)
-                plaintext = self._readState.encContext.decrypt(ciphertext)
-                bytes = stringToBytes(plaintext)
+                data = self._readState.encContext.decrypt(data)
                 totalPaddingLength = 0
 
             #Check MAC
             macGood = True
             macLength = self._readState.macContext.digest_size
             endLength = macLength + totalPaddingLength
-            if endLength > len(bytes):
+            if endLength > len(data):
                 macGood = False
             else:
                 #Read MAC
-                startIndex = len(bytes) - endLength
+                startIndex = len(data) - endLength
                 endIndex = startIndex + macLength
-                checkBytes = bytes[startIndex : endIndex]
+                checkString = data[startIndex : endIndex]
 
                 #Calculate MAC
                 seqnumStr = self._readState.getSeqNumStr()
-                bytes = bytes[:-endLength]
-                bytesStr = bytesToString(bytes)
+                data = data[:startIndex]
                 mac = self._readState.macContext.copy()
                 mac.update(seqnumStr)
                 mac.update(chr(recordType))
                 if self.version == (3,0):
-                    mac.update( chr( int(len(bytes)/256) ) )
-                    mac.update( chr( int(len(bytes)%256) ) )
+                    mac.update( chr( int(len(data)/256) ) )
+                    mac.update( chr( int(len(data)%256) ) )
                 elif self.version in ((3,1), (3,2)):
                     mac.update(chr(self.version[0]))
                     mac.update(chr(self.version[1]))
-                    mac.update( chr( int(len(bytes)/256) ) )
-                    mac.update( chr( int(len(bytes)%256) ) )
+                    mac.update( chr( int(len(data)/256) ) )
+                    mac.update( chr( int(len(data)%256) ) )
                 else:
                     raise AssertionError()
-                mac.update(bytesStr)
-                macString = mac.digest()
-                macBytes = stringToBytes(macString)
+                mac.update(data)
 
                 #Compare MACs
-                if macBytes != checkBytes:
+                if mac.digest() != checkString:
                     macGood = False
 
             if not (paddingGood and macGood):
@@ -931,7 +993,7 @@ class TLSRecordLayer:
                                           "MAC failure (or padding failure)"):
                     yield result
 
-        yield bytes
+        yield data
 
     def _handshakeStart(self, client):
         self._client = client
@@ -22,7 +22,7 @@ imports::
     from Checker import Checker
     from HandshakeSettings import HandshakeSettings
     from Session import Session
-    from SessionCache import SessionCache
+    from SessionCache import SessionCache, ClientSessionCache
     from SharedKeyDB import SharedKeyDB
     from TLSConnection import TLSConnection
     from VerifierDB import VerifierDB
@@ -48,7 +48,7 @@ from errors import *
 from Checker import Checker
 from HandshakeSettings import HandshakeSettings
 from Session import Session
-from SessionCache import SessionCache
+from SessionCache import SessionCache, ClientSessionCache
 from SharedKeyDB import SharedKeyDB
 from TLSConnection import TLSConnection
 from VerifierDB import VerifierDB
@@ -3,7 +3,13 @@ A helper class for using TLS Lite with stdlib clients
 (httplib, xmlrpclib, imaplib, poplib).
 """
 
+import socket
+
 from gdata.tlslite.Checker import Checker
+from gdata.tlslite.SessionCache import ClientSessionCache
+
+#Shared by every ClientHelper which isn't given a cache of its own
+defaultSessionCache = ClientSessionCache()
 
 class ClientHelper:
     """This is a helper class used to integrate TLS Lite with various
@@ -15,7 +21,7 @@ class ClientHelper:
               cryptoID=None, protocol=None,
               x509Fingerprint=None,
               x509TrustList=None, x509CommonName=None,
-              settings = None):
+              settings = None, sessionCache = None):
         """
         For client authentication, use one of these argument
         combinations:
@@ -97,6 +103,12 @@ class ClientHelper:
         @param settings: Various settings which can be used to control
         the ciphersuites, certificate types, and SSL/TLS versions
         offered by the client.
+
+        @type sessionCache: L{tlslite.SessionCache.ClientSessionCache}
+        @param sessionCache: The cache used to resume sessions with
+        servers this process has already connected to.  If None,
+        L{defaultSessionCache} is used.  Pass False to only resume
+        this helper's own previous session.
         """
 
         self.username = None
@@ -141,15 +153,42 @@ class ClientHelper:
                                x509TrustList, x509CommonName)
         self.settings = settings
 
+        if sessionCache is None:
+            sessionCache = defaultSessionCache
+        elif sessionCache is False:
+            sessionCache = None
+        self.sessionCache = sessionCache
+        if self.sessionCache is not None:
+            #A cached session may have been checked by another helper
+            #with a different checker, so check resumed sessions too
+            self.checker.checkResumedSession = True
+
         self.tlsSession = None
 
-    def _handshake(self, tlsConnection):
+    def _handshake(self, tlsConnection, address=None):
+        """Perform the handshake, resuming a cached session if possible.
+
+        @type address: tuple
+        @param address: The (host, port) of the server, used as the
+        session cache key.  Defaults to this object's host and port
+        attributes, or else the address the socket is connected to.
+        """
+        cache = self.sessionCache
+        if cache is not None and not self.sharedKey:
+            if address is None:
+                address = self._getAddress(tlsConnection)
+            session = self.tlsSession
+            if session is None and address is not None:
+                session = self._usableSession(cache.getSession(*address))
+        else:
+            session = self.tlsSession
+
         if self.username and self.password:
             tlsConnection.handshakeClientSRP(username=self.username,
                                              password=self.password,
                                              checker=self.checker,
                                              settings=self.settings,
-                                             session=self.tlsSession)
+                                             session=session)
         elif self.username and self.sharedKey:
             tlsConnection.handshakeClientSharedKey(username=self.username,
                                                    sharedKey=self.sharedKey,
@@ -159,5 +198,33 @@ class ClientHelper:
                                               privateKey=self.privateKey,
                                               checker=self.checker,
                                               settings=self.settings,
-                                              session=self.tlsSession)
+                                              session=session)
         self.tlsSession = tlsConnection.session
+
+        if cache is not None and not self.sharedKey:
+            cache.recordHandshake(tlsConnection.resumed)
+            if address is not None:
+                cache.setSession(address[0], address[1],
+                                 tlsConnection.session)
+
+    def _getAddress(self, tlsConnection):
+        host = getattr(self, "host", None)
+        port = getattr(self, "port", None)
+        if host and port:
+            return (host, port)
+        try:
+            return tlsConnection.sock.getpeername()[:2]
+        except (AttributeError, socket.error):
+            return None
+
+    def _usableSession(self, session):
+        #Only offer sessions negotiated with the same credentials
+        if session is None:
+            return None
+        if self.username and self.password:
+            if session.srpUsername != self.username:
+                return None
+        elif session.srpUsername or \
+                session.clientCertChain is not self.certChain:
+            return None
+        return session
@@ -62,7 +62,7 @@ class HTTPTLSConnection(HTTPBaseTLSConnection, ClientHelper):
                  cryptoID=None, protocol=None,
                  x509Fingerprint=None,
                  x509TrustList=None, x509CommonName=None,
-                 settings = None):
+                 settings = None, sessionCache = None):
         """Create a new HTTPTLSConnection.
 
         For client authentication, use one of these argument
@@ -153,6 +153,12 @@ class HTTPTLSConnection(HTTPBaseTLSConnection, ClientHelper):
         @param settings: Various settings which can be used to control
         the ciphersuites, certificate types, and SSL/TLS versions
         offered by the client.
+
+        @type sessionCache: L{tlslite.SessionCache.ClientSessionCache}
+        @param sessionCache: The cache used to resume sessions with
+        servers this process has already connected to.  If None, the
+        cache shared by all L{tlslite.integration.ClientHelper}
+        instances is used.  Pass False to disable caching.
         """
 
         HTTPBaseTLSConnection.__init__(self, host, port)
@@ -163,7 +169,7 @@ class HTTPTLSConnection(HTTPBaseTLSConnection, ClientHelper):
                  cryptoID, protocol,
                  x509Fingerprint,
                  x509TrustList, x509CommonName,
-                 settings)
+                 settings, sessionCache)
 
     def _handshake(self, tlsConnection):
         ClientHelper._handshake(self, tlsConnection)
@@ -15,7 +15,7 @@ class XMLRPCTransport(xmlrpclib.Transport, ClientHelper):
                  cryptoID=None, protocol=None,
                  x509Fingerprint=None,
                  x509TrustList=None, x509CommonName=None,
-                 settings=None):
+                 settings=None, sessionCache=None):
         """Create a new XMLRPCTransport.
 
         An instance of this class can be passed to L{xmlrpclib.ServerProxy}
@@ -108,6 +108,12 @@ class XMLRPCTransport(xmlrpclib.Transport, ClientHelper):
         @param settings: Various settings which can be used to control
         the ciphersuites, certificate types, and SSL/TLS versions
         offered by the client.
+
+        @type sessionCache: L{tlslite.SessionCache.ClientSessionCache}
+        @param sessionCache: The cache used to resume sessions with
+        servers this process has already connected to.  If None, the
+        cache shared by all L{tlslite.integration.ClientHelper}
+        instances is used.  Pass False to disable caching.
         """
 
         ClientHelper.__init__(self,
@@ -116,12 +122,15 @@ class XMLRPCTransport(xmlrpclib.Transport, ClientHelper):
                  cryptoID, protocol,
                  x509Fingerprint,
                  x509TrustList, x509CommonName,
-                 settings)
+                 settings, sessionCache)
 
 
     def make_connection(self, host):
         # create a HTTPS connection object from a host descriptor
         host, extra_headers, x509 = self.get_host_info(host)
+        sessionCache = self.sessionCache
+        if sessionCache is None:
+            sessionCache = False
         http = HTTPTLSConnection(host, None,
                                  self.username, self.password,
                                  self.sharedKey,
@@ -131,7 +140,8 @@ class XMLRPCTransport(xmlrpclib.Transport, ClientHelper):
                                  self.checker.x509Fingerprint,
                                  self.checker.x509TrustList,
                                  self.checker.x509CommonName,
-                                 self.settings)
+                                 self.settings,
+                                 sessionCache)
         http2 = httplib.HTTP()
         http2._setup(http)
         return http2
@@ -1,5 +1,8 @@
 """Classes for reading/writing binary data (such as TLS records)."""
 
+import os
+import struct
+
 from compat import *
 
 class Writer:
@@ -91,4 +94,113 @@ class Parser:
         elif (self.index - self.indexCheck) == self.lengthCheck:
             return True
         else:
-            raise SyntaxError()
\ No newline at end of file
+            raise SyntaxError()
+
+
+#The byte-at-a-time classes above work on any sequence of ints, including
+#the jarrays used on Jython, so they're kept for that platform; everywhere
+#else byte arrays are array.array('B') and the struct codec below is used.
+PortableWriter = Writer
+PortableParser = Parser
+
+#struct format characters for the item sizes that have one
+_structFormats = {1:"B", 2:"H", 4:"I", 8:"Q"}
+
+class StructWriter(PortableWriter):
+    """A Writer which packs integers with struct instead of shifting
+    them out a byte at a time, and copies byte sequences in bulk."""
+
+    def add(self, x, length):
+        bytes = self.bytes
+        if bytes:
+            index = self.index
+            if length == 1:
+                bytes[index] = x & 0xFF
+            elif length == 2:
+                bytes[index] = (x >> 8) & 0xFF
+                bytes[index+1] = x & 0xFF
+            elif length == 3:
+                bytes[index] = (x >> 16) & 0xFF
+                bytes[index+1] = (x >> 8) & 0xFF
+                bytes[index+2] = x & 0xFF
+            elif length in _structFormats:
+                mask = (1 << (8*length)) - 1
+                struct.pack_into(">"+_structFormats[length], bytes, index,
+                                 x & mask)
+            else:
+                PortableWriter.add(self, x, length)
+                return
+        self.index += length
+
+    def addFixSeq(self, seq, length):
+        if self.bytes:
+            count = len(seq)
+            if length == 1:
+                if not isinstance(seq, array.array) or seq.typecode != "B":
+                    seq = array.array("B", [e & 0xFF for e in seq])
+                self.bytes[self.index : self.index+count] = seq
+            elif length in _structFormats:
+                mask = (1 << (8*length)) - 1
+                struct.pack_into(">%d%s" % (count, _structFormats[length]),
+                                 self.bytes, self.index,
+                                 *[e & mask for e in seq])
+            else:
+                PortableWriter.addFixSeq(self, seq, length)
+                return
+        self.index += len(seq)*length
+
+    def addVarSeq(self, seq, length, lengthLength):
+        self.add(len(seq)*length, lengthLength)
+        self.addFixSeq(seq, length)
+
+
+class StructParser(PortableParser):
+    """A Parser which reads integers and lists of integers with struct
+    instead of building them up a byte at a time."""
+
+    def get(self, length):
+        index = self.index
+        if index + length > len(self.bytes):
+            raise SyntaxError()
+        bytes = self.bytes
+        self.index = index + length
+        if length == 1:
+            return bytes[index]
+        elif length == 2:
+            return (bytes[index] << 8) | bytes[index+1]
+        elif length == 3:
+            return (bytes[index] << 16) | (bytes[index+1] << 8) | \
+                   bytes[index+2]
+        elif length in _structFormats:
+            return struct.unpack_from(">"+_structFormats[length], bytes,
+                                      index)[0]
+        self.index = index
+        return PortableParser.get(self, length)
+
+    def getFixList(self, length, lengthList):
+        index = self.index
+        end = index + length*lengthList
+        if end > len(self.bytes):
+            raise SyntaxError()
+        if length == 1:
+            l = self.bytes[index : end].tolist()
+        elif length in _structFormats:
+            l = list(struct.unpack_from(">%d%s" % (lengthList,
+                                                   _structFormats[length]),
+                                        self.bytes, index))
+        else:
+            return PortableParser.getFixList(self, length, lengthList)
+        self.index = end
+        return l
+
+    def getVarList(self, length, lengthLength):
+        lengthList = self.get(lengthLength)
+        if lengthList % length != 0:
+            raise SyntaxError()
+        return self.getFixList(length, int(lengthList/length))
+
+
+if os.name != "java":
+    import array
+    Writer = StructWriter
+    Parser = StructParser
@@ -326,11 +326,18 @@ def makeSieve(n):
     sieve = [x for x in sieve[2:] if x]
     return sieve
 
-sieve = makeSieve(1000)
+#The sieve is only needed to generate keys, so it is built on first use
+sieve = None
+
+def getSieve():
+    global sieve
+    if sieve is None:
+        sieve = makeSieve(1000)
+    return sieve
 
 def isPrime(n, iterations=5, display=False):
     #Trial division with sieve
-    for x in sieve:
+    for x in getSieve():
         if x >= n: return True
         if n % x == 0: return False
     #Passed trial division, proceed to Rabin-Miller
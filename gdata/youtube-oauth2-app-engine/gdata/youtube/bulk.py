@@ -0,0 +1,366 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2011 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Looks up many YouTube videos by ID.
+
+Calling YouTubeService.GetYouTubeVideoEntry for every video makes one
+request at a time. The lookup in this module sends the IDs to the videos
+batch feed, 50 at a time, and runs the batches on a bounded pool of threads.
+Videos which can not be fetched through the batch feed are requested one
+by one on the same pool, with retries and exponential backoff.
+
+  VideoCache: Keeps recently fetched video entries for a short time.
+  VideoLookup: Fetches video entries for an iterable of video IDs.
+
+Example Usage:
+yt_service = gdata.youtube.service.YouTubeService(developer_key=key)
+lookup = gdata.youtube.bulk.VideoLookup(yt_service,
+    cache=gdata.youtube.bulk.VideoCache(ttl=300))
+for video_id, entry in lookup.Fetch(tracked_ids):
+  if entry is None:
+    print video_id, lookup.errors[video_id]
+  else:
+    print video_id, entry.media.title.text
+"""
+
+import httplib
+import Queue
+import socket
+import threading
+import time
+try:
+  from xml.etree import cElementTree as ElementTree
+except ImportError:
+  try:
+    import cElementTree as ElementTree
+  except ImportError:
+    try:
+      from xml.etree import ElementTree
+    except ImportError:
+      from elementtree import ElementTree
+import atom
+import atom.core
+import gdata
+import gdata.data
+import gdata.service
+import gdata.youtube
+import gdata.youtube.service
+
+
+# The videos batch feed accepts up to 50 operations in one request.
+MAX_BATCH_SIZE = 50
+
+_ENTRY_TAG = '{%s}entry' % atom.ATOM_NAMESPACE
+_BATCH_ID_TAG = '{%s}id' % gdata.BATCH_NAMESPACE
+_BATCH_STATUS_TAG = '{%s}status' % gdata.BATCH_NAMESPACE
+_ID_TAG = '{%s}id' % atom.ATOM_NAMESPACE
+
+
+class Error(Exception):
+  pass
+
+
+class VideoCache(object):
+  """Keeps recently fetched video entries for a short time.
+
+  The cache is shared by the lookup threads, so all access goes through a
+  lock. Cached entries are returned as they are, callers which change an
+  entry change the cached copy.
+  """
+
+  def __init__(self, ttl=300, max_entries=10000):
+    """Creates an empty cache.
+
+    Args:
+      ttl: int (optional) The number of seconds an entry is kept.
+      max_entries: int (optional) The number of entries kept. When the cache
+          is full, expired entries are dropped first, then the oldest ones.
+    """
+    self.ttl = ttl
+    self.max_entries = max_entries
+    self._entries = {}
+    self._lock = threading.Lock()
+
+  def Get(self, video_id):
+    """Returns the cached entry for the video, or None."""
+    self._lock.acquire()
+    try:
+      cached = self._entries.get(video_id)
+      if cached is None:
+        return None
+      if cached[1] <= time.time():
+        del self._entries[video_id]
+        return None
+      return cached[0]
+    finally:
+      self._lock.release()
+
+  def Set(self, video_id, entry):
+    self._lock.acquire()
+    try:
+      now = time.time()
+      if (video_id not in self._entries
+          and len(self._entries) >= self.max_entries):
+        self._Evict(now)
+      self._entries[video_id] = (entry, now + self.ttl)
+    finally:
+      self._lock.release()
+
+  def _Evict(self, now):
+    for video_id, cached in self._entries.items():
+      if cached[1] <= now:
+        del self._entries[video_id]
+    if len(self._entries) >= self.max_entries:
+      expiries = sorted([(cached[1], video_id)
+                         for video_id, cached in self._entries.iteritems()])
+      for expires, video_id in expiries[:len(expiries) // 10 + 1]:
+        del self._entries[video_id]
+
+  def Clear(self):
+    self._lock.acquire()
+    try:
+      self._entries.clear()
+    finally:
+      self._lock.release()
+
+  def __len__(self):
+    return len(self._entries)
+
+
+class VideoLookup(object):
+  """Fetches the video entries for many video IDs.
+
+  Attributes:
+    errors: dict Maps each video ID which could not be fetched during the
+        last call to Fetch to the exception describing the failure. A video
+        which does not exist has a gdata.service.RequestError with a 404
+        status.
+  """
+
+  def __init__(self, service, use_batch=True, batch_size=MAX_BATCH_SIZE,
+               max_workers=8, num_retries=3, delay=1, backoff=2, fields=None,
+               cache=None):
+    """Configures the lookup.
+
+    Args:
+      service: gdata.youtube.service.YouTubeService The service used to
+          make the requests. The service is shared by the worker threads.
+      use_batch: boolean (optional) If False, every video is requested on
+          its own.
+      batch_size: int (optional) The number of videos in each batch request,
+          at most MAX_BATCH_SIZE.
+      max_workers: int (optional) The most requests in flight at once.
+      num_retries: int (optional) The number of attempts made for each
+          request which fails with a server or connection error.
+      delay: int (optional) Seconds to wait before the first retry.
+      backoff: int (optional) How much the delay grows after each retry.
+      fields: str (optional) Only the selected parts of each video entry,
+          for example 'id,title,media:group(media:thumbnail)', are parsed.
+          The service makes version 1 requests, which do not support partial
+          responses, so full entries are still downloaded.
+      cache: VideoCache (optional) If set, videos found in the cache are not
+          requested and fetched entries are added to it.
+    """
+    if batch_size > MAX_BATCH_SIZE:
+      raise Error('The batch size can not be more than %i' % MAX_BATCH_SIZE)
+    self.service = service
+    self.use_batch = use_batch
+    self.batch_size = batch_size
+    self.max_workers = max_workers
+    self.num_retries = num_retries
+    self.delay = delay
+    self.backoff = backoff
+    self.fields = fields
+    self.cache = cache
+    self.errors = {}
+    self._projection = None
+    if fields:
+      self._projection = gdata.data.get_fields_projection(fields)
+
+  def Fetch(self, video_ids):
+    """Fetches the entries for the videos.
+
+    Duplicate IDs are fetched once. Cached videos are yielded first, the
+    rest are yielded in the order the requests complete. If the caller
+    stops iterating early, requests which have not started are abandoned
+    and closing the generator waits for those in flight.
+
+    Args:
+      video_ids: iterable of str The IDs of the videos to fetch.
+
+    Yields:
+      (video_id, entry) tuples in which entry is a
+      gdata.youtube.YouTubeVideoEntry, or None if the video could not be
+      fetched. In that case the exception is in self.errors[video_id].
+    """
+    self.errors = {}
+    pending = []
+    seen = set()
+    for video_id in video_ids:
+      if video_id in seen:
+        continue
+      seen.add(video_id)
+      if self.cache is not None:
+        entry = self.cache.Get(video_id)
+        if entry is not None:
+          yield video_id, entry
+          continue
+      pending.append(video_id)
+    if not pending:
+      return
+
+    jobs = Queue.Queue()
+    results = Queue.Queue()
+    stopped = threading.Event()
+    if self.use_batch and len(pending) > 1:
+      for i in xrange(0, len(pending), self.batch_size):
+        jobs.put((self._FetchBatch, pending[i:i + self.batch_size]))
+    else:
+      for video_id in pending:
+        jobs.put((self._FetchOne, [video_id]))
+    outstanding = jobs.qsize()
+    workers = []
+    for i in xrange(min(self.max_workers, len(pending))):
+      worker = threading.Thread(target=self._Work,
+                                args=(jobs, results, stopped))
+      worker.setDaemon(True)
+      worker.start()
+      workers.append(worker)
+    try:
+      while outstanding:
+        outcome = results.get()
+        outstanding -= 1
+        for video_id, entry, error in outcome:
+          if error is _RETRY_ALONE:
+            jobs.put((self._FetchOne, [video_id]))
+            outstanding += 1
+            continue
+          if error is not None:
+            self.errors[video_id] = error
+          elif self.cache is not None:
+            self.cache.Set(video_id, entry)
+          yield video_id, entry
+    finally:
+      stopped.set()
+      for worker in workers:
+        jobs.put(None)
+      # Wait for requests which are in flight so that no thread outlives
+      # the call.
+      for worker in workers:
+        worker.join()
+
+  def _Work(self, jobs, results, stopped):
+    while True:
+      job = jobs.get()
+      if job is None:
+        return
+      if stopped.isSet():
+        continue
+      function, video_ids = job
+      try:
+        outcome = function(video_ids)
+      except Exception, e:
+        outcome = [(video_id, None, e) for video_id in video_ids]
+      results.put(outcome)
+
+  def _FetchOne(self, video_ids):
+    video_id = video_ids[0]
+    uri = '%s/%s' % (gdata.youtube.service.YOUTUBE_VIDEO_URI, video_id)
+    converter = gdata.youtube.YouTubeVideoEntryFromString
+    if self.fields:
+      converter = gdata.service.SparseConverter(
+          gdata.youtube.YouTubeVideoEntry, self.fields)
+    try:
+      entry = self._WithRetries(self.service.Get, uri, converter=converter)
+    except (gdata.service.RequestError, gdata.service.RanOutOfTries), e:
+      return [(video_id, None, e)]
+    return [(video_id, entry, None)]
+
+  def _FetchBatch(self, video_ids):
+    feed = gdata.BatchFeed()
+    for video_id in video_ids:
+      feed.AddQuery(url_string='%s/%s' % (
+                        gdata.youtube.service.YOUTUBE_VIDEO_URI, video_id),
+                    batch_id_string=video_id)
+    try:
+      found = self._WithRetries(self.service.Post, feed,
+                                gdata.youtube.service.YOUTUBE_VIDEO_URI +
+                                '/batch', converter=self._ParseBatchResponse)
+    except (gdata.service.RequestError, gdata.service.RanOutOfTries):
+      # The batch could not be sent, try the videos on their own.
+      return [(video_id, None, _RETRY_ALONE) for video_id in video_ids]
+    outcome = []
+    for video_id in video_ids:
+      if video_id not in found:
+        outcome.append((video_id, None, _RETRY_ALONE))
+        continue
+      entry, status, reason = found[video_id]
+      if status == 200:
+        outcome.append((video_id, entry, None))
+      elif status >= 500:
+        outcome.append((video_id, None, _RETRY_ALONE))
+      else:
+        outcome.append((video_id, None, gdata.service.RequestError(
+            {'status': status, 'reason': reason, 'body': ''})))
+    return outcome
+
+  def _WithRetries(self, function, *args, **kwargs):
+    """Calls the function, retrying server and connection errors.
+
+    Any other error, such as one raised while parsing the response, is
+    raised at once.
+    """
+    delay = self.delay
+    last_error = None
+    for attempt in xrange(self.num_retries):
+      if attempt:
+        time.sleep(delay)
+        delay *= self.backoff
+      try:
+        return function(*args, **kwargs)
+      except gdata.service.RequestError, e:
+        if e[0]['status'] not in [500, 503]:
+          raise
+        last_error = e
+      except (socket.error, httplib.HTTPException), e:
+        last_error = e
+    raise gdata.service.RanOutOfTries('Ran out of tries, the last error was: %r'
+                                      % (last_error,))
+
+  def _ParseBatchResponse(self, xml_string):
+    """Maps the video IDs in a batch response to (entry, status, reason)."""
+    if isinstance(xml_string, unicode):
+      xml_string = xml_string.encode(atom.XML_STRING_ENCODING)
+    found = {}
+    for element in ElementTree.fromstring(xml_string).findall(_ENTRY_TAG):
+      status = element.find(_BATCH_STATUS_TAG)
+      code = int(status.get('code'))
+      batch_id = element.findtext(_BATCH_ID_TAG)
+      if not batch_id:
+        # Fall back to the last part of the entry's ID.
+        batch_id = element.findtext(_ID_TAG, '').split('/')[-1]
+      entry = None
+      if code == 200:
+        if self._projection is not None:
+          atom.core.prune_tree(element, self._projection)
+        entry = atom._CreateClassFromElementTree(
+            gdata.youtube.YouTubeVideoEntry, element)
+      found[batch_id] = (entry, code, status.get('reason'))
+    return found
+
+
+# Marks a video which should be requested again on its own.
+_RETRY_ALONE = object()
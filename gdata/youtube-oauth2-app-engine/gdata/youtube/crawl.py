@@ -0,0 +1,346 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2011 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Crawls the uploads, playlists and comments of YouTube channels.
+
+The crawler keeps a frontier of feed pages which still have to be read.
+Pages are fetched by a pool of worker threads while the thread which runs
+the crawl hands every entry to a sink callback, then adds the next page of
+the feed and the feeds linked from the entries to the frontier. Feed pages
+are only read once, even when several playlists contain the same video.
+
+  ChannelCrawler: Crawls feeds starting from one or more channels.
+
+The crawler can save its frontier to a checkpoint file as it goes. A crawl
+which is restarted with the same checkpoint file continues from the last
+checkpoint and does not fetch the pages which had been handed to the sink
+before it was written. Pages processed after the last checkpoint are
+fetched again, so the sink may see their entries twice.
+
+Example Usage:
+def Sink(kind, entry):
+  print kind, entry.id.text
+
+yt_service = gdata.youtube.service.YouTubeService(developer_key=key)
+crawler = gdata.youtube.crawl.ChannelCrawler(yt_service, Sink,
+    checkpoint_path='/tmp/crawl.checkpoint')
+crawler.AddChannel('GoogleDevelopers')
+crawler.Crawl()
+"""
+
+import cPickle
+import httplib
+import os
+import Queue
+import socket
+import threading
+import time
+import urllib
+import urlparse
+import gdata.ratelimit
+import gdata.service
+import gdata.youtube
+import gdata.youtube.service
+
+
+UPLOADS = 'uploads'
+PLAYLISTS = 'playlists'
+PLAYLIST_VIDEOS = 'playlist_videos'
+COMMENTS = 'comments'
+
+# The converter used to parse each kind of feed page.
+FEED_CONVERTERS = {
+    UPLOADS: gdata.youtube.YouTubeVideoFeedFromString,
+    PLAYLISTS: gdata.youtube.YouTubePlaylistFeedFromString,
+    PLAYLIST_VIDEOS: gdata.youtube.YouTubePlaylistVideoFeedFromString,
+    COMMENTS: gdata.youtube.YouTubeVideoCommentFeedFromString}
+
+# The most entries the YouTube API returns in one page.
+MAX_PAGE_SIZE = 50
+
+
+class Error(Exception):
+  pass
+
+
+def _NormalizeUri(uri):
+  """Returns a form of the URI which does not depend on parameter order."""
+  scheme, netloc, path, query, fragment = urlparse.urlsplit(uri)
+  params = sorted(urlparse.parse_qsl(query, keep_blank_values=True))
+  return urlparse.urlunsplit((scheme.lower(), netloc.lower(), path,
+                              urllib.urlencode(params), ''))
+
+
+def _AddPageSize(uri, page_size):
+  if page_size and 'max-results=' not in uri:
+    if '?' in uri:
+      return '%s&max-results=%i' % (uri, page_size)
+    return '%s?max-results=%i' % (uri, page_size)
+  return uri
+
+
+def _FeedLinkHref(feed_links):
+  for feed_link in feed_links or []:
+    if feed_link.href:
+      return feed_link.href
+  return None
+
+
+class ChannelCrawler(object):
+  """Crawls feeds of YouTube channels and hands every entry to a sink.
+
+  Attributes:
+    errors: dict Maps the URI of each page which could not be fetched to
+        the exception raised for it. The pages are kept in the checkpoint
+        and tried again when the crawl is resumed.
+    pages_fetched: int The number of pages fetched by this crawler.
+    entries_seen: int The number of entries passed to the sink.
+  """
+
+  def __init__(self, service, sink, max_workers=4, requests_per_second=5,
+               burst=5, page_size=MAX_PAGE_SIZE, crawl_playlists=True,
+               crawl_comments=True, num_retries=3, delay=1, backoff=2,
+               checkpoint_path=None, checkpoint_interval=20, limiter=None):
+    """Configures the crawl.
+
+    Args:
+      service: gdata.youtube.service.YouTubeService Used for every request.
+          The service is shared by the worker threads.
+      sink: function Called as sink(kind, entry) for every entry read, from
+          the thread which runs Crawl. kind is one of UPLOADS, PLAYLISTS,
+          PLAYLIST_VIDEOS or COMMENTS.
+      max_workers: int (optional) The most pages fetched at once.
+      requests_per_second: float (optional) The request rate allowed for
+          the service's developer key, if the limiter has no bucket for it
+          yet. Crawls and clients which use the same key and limiter share
+          the limit.
+      burst: int (optional) The number of requests which may be made at once
+          after a quiet period, if the limiter has no bucket for the key.
+      page_size: int (optional) The max-results added to the seed feeds.
+      crawl_playlists: boolean (optional) If True, the videos in each
+          playlist of a channel are crawled.
+      crawl_comments: boolean (optional) If True, the comments of each video
+          are crawled.
+      num_retries: int (optional) Attempts made for a page which fails with
+          a server error, a quota error or a connection error.
+      delay: int (optional) Seconds to wait before the first retry.
+      backoff: int (optional) How much the delay grows after each retry.
+      checkpoint_path: str (optional) The file used to save and resume the
+          crawl. If the file exists when the crawler is created, its
+          frontier is loaded.
+      checkpoint_interval: int (optional) The number of pages processed
+          between checkpoints.
+      limiter: gdata.ratelimit.RateLimiter (optional) Holds the bucket which
+          spaces the requests. Defaults to the limiter installed on the
+          service with gdata.ratelimit.install, or else the default limiter.
+    """
+    self.service = service
+    self.sink = sink
+    self.max_workers = max_workers
+    self.page_size = page_size
+    self.crawl_playlists = crawl_playlists
+    self.crawl_comments = crawl_comments
+    self.num_retries = num_retries
+    self.delay = delay
+    self.backoff = backoff
+    self.checkpoint_path = checkpoint_path
+    self.checkpoint_interval = checkpoint_interval
+    http_client = getattr(service, 'http_client', None)
+    installed = isinstance(http_client,
+                           gdata.ratelimit.RateLimitedV1HttpClient)
+    if limiter is None:
+      if installed:
+        limiter = http_client.limiter
+      else:
+        limiter = gdata.ratelimit.get_default_limiter()
+    # A service with the same limiter installed takes a token for every
+    # request and pauses the bucket on quota errors itself.
+    self._limited_by_service = installed and http_client.limiter is limiter
+    self.rate_limit = limiter.get_bucket(
+        getattr(service, 'server', None) or
+        gdata.youtube.service.YOUTUBE_SERVER,
+        gdata.ratelimit.get_principal(service.additional_headers),
+        requests_per_second, burst)
+    self.errors = {}
+    self.pages_fetched = 0
+    self.entries_seen = 0
+    # The (kind, uri) pairs which still have to be read, and the normalized
+    # URIs which have been added to the frontier at some point.
+    self._frontier = []
+    self._seen = set()
+    if checkpoint_path and os.path.exists(checkpoint_path):
+      self._LoadCheckpoint()
+
+  def Add(self, kind, uri):
+    """Adds a feed page to the frontier.
+
+    Returns:
+      True if the page was added, False if it was already known.
+    """
+    if kind not in FEED_CONVERTERS:
+      raise Error('Unknown feed kind %s' % kind)
+    key = _NormalizeUri(uri)
+    if key in self._seen:
+      return False
+    self._seen.add(key)
+    self._frontier.append((kind, uri))
+    return True
+
+  def AddChannel(self, username):
+    """Adds the uploads and, if enabled, playlists of a channel."""
+    base = '%s/%s' % (gdata.youtube.service.YOUTUBE_USER_FEED_URI, username)
+    self.Add(UPLOADS, _AddPageSize(base + '/uploads', self.page_size))
+    if self.crawl_playlists:
+      self.Add(PLAYLISTS, _AddPageSize(base + '/playlists', self.page_size))
+
+  def Crawl(self):
+    """Crawls until the frontier is empty.
+
+    Pages which fail after all retries are recorded in self.errors and left
+    out of the rest of the crawl.
+    """
+    jobs = Queue.Queue()
+    results = Queue.Queue()
+    workers = []
+    for i in xrange(self.max_workers):
+      worker = threading.Thread(target=self._Work, args=(jobs, results))
+      worker.setDaemon(True)
+      worker.start()
+      workers.append(worker)
+    in_flight = []
+    failed = []
+    since_checkpoint = 0
+    try:
+      while self._frontier or in_flight:
+        while self._frontier and len(in_flight) < self.max_workers:
+          # Taking the newest page first finishes the feeds linked from an
+          # entry before moving on, which keeps the frontier small.
+          page = self._frontier.pop()
+          in_flight.append(page)
+          jobs.put(page)
+        kind, uri, feed, error = results.get()
+        if error is not None:
+          self.errors[uri] = error
+          failed.append((kind, uri))
+        else:
+          self.pages_fetched += 1
+          self._Process(kind, feed)
+        # The page stays in flight until it has been processed, so that it
+        # is checkpointed if the sink raises an exception.
+        in_flight.remove((kind, uri))
+        since_checkpoint += 1
+        if (self.checkpoint_path
+            and since_checkpoint >= self.checkpoint_interval):
+          self._SaveCheckpoint(in_flight + failed)
+          since_checkpoint = 0
+    finally:
+      for worker in workers:
+        jobs.put(None)
+      if self.checkpoint_path:
+        self._SaveCheckpoint(in_flight + failed)
+
+  def _Process(self, kind, feed):
+    """Passes the entries to the sink and adds the feeds they link to."""
+    next_link = feed.GetNextLink()
+    if next_link is not None and next_link.href:
+      self.Add(kind, next_link.href)
+    for entry in feed.entry:
+      self.entries_seen += 1
+      self.sink(kind, entry)
+      if kind == PLAYLISTS:
+        href = _FeedLinkHref(entry.feed_link)
+        if href is None:
+          href = '%s/%s' % (gdata.youtube.service.YOUTUBE_PLAYLIST_FEED_URI,
+                            entry.id.text.split('/')[-1])
+        self.Add(PLAYLIST_VIDEOS, _AddPageSize(href, self.page_size))
+      elif kind in (UPLOADS, PLAYLIST_VIDEOS) and self.crawl_comments:
+        if entry.comments is not None:
+          href = _FeedLinkHref(entry.comments.feed_link)
+          if href is not None:
+            self.Add(COMMENTS, _AddPageSize(href, self.page_size))
+
+  def _Work(self, jobs, results):
+    while True:
+      page = jobs.get()
+      if page is None:
+        return
+      kind, uri = page
+      try:
+        feed = self._Fetch(uri, FEED_CONVERTERS[kind])
+        results.put((kind, uri, feed, None))
+      except Exception, e:
+        results.put((kind, uri, None, e))
+
+  def _Fetch(self, uri, converter):
+    delay = self.delay
+    last_error = None
+    for attempt in xrange(self.num_retries):
+      if attempt:
+        time.sleep(delay)
+        delay *= self.backoff
+      if not self._limited_by_service:
+        self.rate_limit.Acquire()
+      try:
+        return self.service.Get(uri, converter=converter)
+      except gdata.service.RequestError, e:
+        if not _IsRetryable(e):
+          raise
+        if e[0].get('status') != 500 and not self._limited_by_service:
+          # Slow down every crawl which uses the developer key.
+          self.rate_limit.Pause(delay)
+        last_error = e
+      except (socket.error, httplib.HTTPException), e:
+        last_error = e
+    raise gdata.service.RanOutOfTries('Ran out of tries for %s: %s' % (
+        uri, last_error))
+
+  def _SaveCheckpoint(self, unfinished):
+    """Writes the frontier to the checkpoint file.
+
+    Pages in unfinished have been taken from the frontier but not
+    processed, so they are saved as part of it.
+    """
+    state = {'frontier': self._frontier + unfinished, 'seen': self._seen}
+    temp_path = self.checkpoint_path + '.tmp'
+    checkpoint_file = open(temp_path, 'wb')
+    try:
+      cPickle.dump(state, checkpoint_file, cPickle.HIGHEST_PROTOCOL)
+    finally:
+      checkpoint_file.close()
+    # Replace the old checkpoint in one step, so that a crash while saving
+    # leaves the previous checkpoint in place.
+    if os.name == 'nt' and os.path.exists(self.checkpoint_path):
+      os.remove(self.checkpoint_path)
+    os.rename(temp_path, self.checkpoint_path)
+
+  def _LoadCheckpoint(self):
+    checkpoint_file = open(self.checkpoint_path, 'rb')
+    try:
+      state = cPickle.load(checkpoint_file)
+    finally:
+      checkpoint_file.close()
+    self._frontier = list(state['frontier'])
+    self._seen = set(state['seen'])
+
+
+def _IsRetryable(error):
+  """Decides if a failed request should be tried again."""
+  status = error[0].get('status')
+  if status in (500, 503):
+    return True
+  # YouTube reports short term quota errors as a 403.
+  return status == 403 and 'too_many_recent_calls' in str(
+      error[0].get('body', ''))
@@ -35,6 +35,7 @@ except ImportError:
       from elementtree import ElementTree
 import os
 import atom
+import atom.http_core
 import gdata
 import gdata.service
 import gdata.youtube
@@ -171,6 +172,17 @@ class YouTubeService(gdata.service.GDataService):
 
     self.auth_service_url = YOUTUBE_CLIENTLOGIN_AUTHENTICATION_URL
 
+  def _GetSparse(self, uri, target_class, converter):
+    """Retrieves uri, parsing sparsely if it asks for a partial response.
+
+    If the uri has a fields parameter, only the selected elements are
+    converted into the target_class, otherwise converter is used.
+    """
+    fields = gdata.service.GetFieldsParameter(uri)
+    if fields:
+      converter = gdata.service.SparseConverter(target_class, fields)
+    return self.Get(uri, converter=converter)
+
   def GetYouTubeVideoFeed(self, uri):
     """Retrieve a YouTubeVideoFeed.
 
@@ -180,7 +192,8 @@ class YouTubeService(gdata.service.GDataService):
     Returns:
       A YouTubeVideoFeed if successfully retrieved.
     """
-    return self.Get(uri, converter=gdata.youtube.YouTubeVideoFeedFromString)
+    return self._GetSparse(uri, gdata.youtube.YouTubeVideoFeed,
+                           gdata.youtube.YouTubeVideoFeedFromString)
 
   def GetYouTubeVideoEntry(self, uri=None, video_id=None):
     """Retrieve a YouTubeVideoEntry.
@@ -204,7 +217,8 @@ class YouTubeService(gdata.service.GDataService):
                          'to the GetYouTubeVideoEntry() method')
     elif video_id and not uri:
       uri = '%s/%s' % (YOUTUBE_VIDEO_URI, video_id)
-    return self.Get(uri, converter=gdata.youtube.YouTubeVideoEntryFromString)
+    return self._GetSparse(uri, gdata.youtube.YouTubeVideoEntry,
+                           gdata.youtube.YouTubeVideoEntryFromString)
 
   def GetYouTubeContactFeed(self, uri=None, username='default'):
     """Retrieve a YouTubeContactFeed.
@@ -303,7 +317,8 @@ class YouTubeService(gdata.service.GDataService):
                          'to the GetYouTubeUserFeed() method')
     elif username and not uri:
       uri = '%s/%s/%s' % (YOUTUBE_USER_FEED_URI, username, 'uploads')
-    return self.Get(uri, converter=gdata.youtube.YouTubeUserFeedFromString)
+    return self._GetSparse(uri, gdata.youtube.YouTubeUserFeed,
+                           gdata.youtube.YouTubeUserFeedFromString)
 
   def GetYouTubeUserEntry(self, uri=None, username=None):
     """Retrieve a YouTubeUserEntry.
@@ -631,15 +646,21 @@ class YouTubeService(gdata.service.GDataService):
       mediasource = gdata.MediaSource()
       mediasource.setFile(filename_or_handle, content_type)
     elif hasattr(filename_or_handle, 'read'):
-      import StringIO
       if hasattr(filename_or_handle, 'seek'):
         filename_or_handle.seek(0)
       file_handle = filename_or_handle
       name = 'video'
       if hasattr(filename_or_handle, 'name'):
         name = filename_or_handle.name
+      # Measure the video without reading it, so that it is streamed from
+      # the handle as the request is sent.
+      content_length = atom.http_core.get_body_size(file_handle)
+      if content_length is None:
+        raise YouTubeError({'status':YOUTUBE_INVALID_ARGUMENT, 'body':
+            'Unable to determine the size of `filename_or_handle`',
+            'reason':'The file-like object must be seekable'})
       mediasource = gdata.MediaSource(file_handle, content_type,
-          content_length=file_handle.len, file_name=name)
+          content_length=content_length, file_name=name)
     else:
       raise YouTubeError({'status':YOUTUBE_INVALID_ARGUMENT, 'body':
           '`filename_or_handle` must be a path name or a file-like object',
@@ -1340,6 +1361,18 @@ class YouTubeService(gdata.service.GDataService):
                                      'reason': HTTP reason from the server,
                                      'body': HTTP body of the server response})
     """
+    if query.fields:
+      # Convert the partial response directly instead of through an
+      # ElementTree round trip.
+      if isinstance(query, YouTubeUserQuery):
+        return self._GetSparse(query.ToUri(), gdata.youtube.YouTubeUserFeed,
+                               None)
+      elif isinstance(query, YouTubePlaylistQuery):
+        return self._GetSparse(query.ToUri(),
+                               gdata.youtube.YouTubePlaylistFeed, None)
+      elif isinstance(query, YouTubeVideoQuery):
+        return self._GetSparse(query.ToUri(), gdata.youtube.YouTubeVideoFeed,
+                               None)
     result = self.Query(query.ToUri())
     if isinstance(query, YouTubeUserQuery):
       return gdata.youtube.YouTubeUserFeedFromString(result.ToString())
@@ -1387,6 +1420,12 @@ class YouTubeVideoQuery(gdata.service.Query):
         that match to the location entered.
     feed: str (optional) The base URL which is the beginning of the query URL.
           defaults to 'http://%s/feeds/videos' % (YOUTUBE_SERVER)
+    fields: The fields parameter requests a partial response which contains
+        only the selected elements, for example
+        'entry(id,title,media:group(media:description,media:thumbnail))'.
+        The YouTubeService methods parse such responses sparsely. Partial
+        responses are a version 2 feature, and YouTubeService makes version
+        1 requests, so use gdata.youtube.client.YouTubeClient for them.
   """
 
   def __init__(self, video_id=None, feed_type=None, text_query=None,
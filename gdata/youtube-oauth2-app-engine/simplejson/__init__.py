@@ -99,8 +99,8 @@ Using simplejson.tool from the shell to validate and pretty-print::
 """
 __version__ = '2.1.1'
 __all__ = [
-    'dump', 'dumps', 'load', 'loads',
-    'JSONDecoder', 'JSONDecodeError', 'JSONEncoder',
+    'dump', 'dumps', 'load', 'loads', 'iterload',
+    'JSONDecoder', 'JSONDecodeError', 'JSONEncoder', 'JSONStreamDecoder',
     'OrderedDict',
 ]
 
@@ -108,7 +108,7 @@ __author__ = 'Bob Ippolito <bob@redivi.com>'
 
 from decimal import Decimal
 
-from decoder import JSONDecoder, JSONDecodeError
+from decoder import JSONDecoder, JSONDecodeError, JSONStreamDecoder
 from encoder import JSONEncoder
 def _import_OrderedDict():
     import collections
@@ -401,6 +401,32 @@ def loads(s, encoding=None, cls=None, object_hook=None, parse_float=None,
     return cls(encoding=encoding, **kw).decode(s)
 
 
+def iterload(fp, path=None, chunk_size=65536, cls=None, use_decimal=False,
+        **kw):
+    """Iterate over the items of one array in ``fp`` (a ``.read()``-supporting
+    file-like object containing a JSON document) without reading the whole
+    document into memory.
+
+    *path* leads from the root object to the array, as a dotted string like
+    ``'feed.entry'`` or a sequence of keys.  If it is empty or ``None`` the
+    items of the root array are returned.  The rest of the document is
+    skipped.  See :class:`JSONStreamDecoder`.
+
+    *chunk_size* is the number of bytes read from ``fp`` at a time.
+
+    The other arguments are the same as for :func:`load`.
+
+    """
+    if cls is None:
+        cls = JSONDecoder
+    if use_decimal:
+        if kw.get('parse_float') is not None:
+            raise TypeError("use_decimal=True implies parse_float=Decimal")
+        kw['parse_float'] = Decimal
+    decoder = JSONStreamDecoder(path, cls(**kw))
+    return decoder.iterdecode(iter(lambda: fp.read(chunk_size), ''))
+
+
 def _toggle_speedups(enabled):
     import simplejson.decoder as dec
     import simplejson.encoder as enc
@@ -13,7 +13,7 @@ def _import_c_scanstring():
         return None
 c_scanstring = _import_c_scanstring()
 
-__all__ = ['JSONDecoder']
+__all__ = ['JSONDecoder', 'JSONStreamDecoder']
 
 FLAGS = re.VERBOSE | re.MULTILINE | re.DOTALL
 
@@ -419,3 +419,264 @@ class JSONDecoder(object):
         except StopIteration:
             raise JSONDecodeError("No JSON object could be decoded", s, idx)
         return obj, end
+
+
+# Used by JSONStreamDecoder to find where a value ends without decoding it.
+STRUCTURE = re.compile(r'["\[\]{}]')
+STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+SCALAR_END = re.compile(r'[ \t\n\r,\]}]')
+
+# The states of JSONStreamDecoder between two tokens.
+_VALUE, _KEY_FIRST, _KEY, _COLON, _MEMBER_NEXT, _SKIP, _ITEM_FIRST, _ITEM, \
+    _ITEM_NEXT, _DONE = range(10)
+
+
+class JSONStreamDecoder(object):
+    """Incremental decoder for a JSON document holding one large array
+
+    The document is passed to :meth:`feed` in chunks as it arrives, and
+    each item of the array found at *path* is returned as soon as its text
+    is complete, so only the item being read is held in memory.  Items are
+    decoded with the scanner of *decoder* (which uses the C speedups when
+    they are available).  The rest of the document is checked for balanced
+    brackets and skipped.
+
+    *path* is a dotted string such as ``'feed.entry'`` (a trailing ``[*]``
+    is allowed) or a sequence of object keys leading from the root object
+    to the array.  If *path* is empty or ``None`` the root must be an array.
+
+    *decoder* is the :class:`JSONDecoder` used for the items; a default
+    decoder is used if it is not given.
+
+    Error positions are relative to the part of the document which has not
+    been consumed yet.
+
+        >>> decoder = JSONStreamDecoder('feed.entry[*]')
+        >>> chunk = '{"feed": {"title": "a", "entry": [{"n": 1}, {"n"'
+        >>> [item['n'] for item in decoder.feed(chunk)]
+        [1]
+        >>> [item['n'] for item in decoder.feed(': 2}]}}')]
+        [2]
+        >>> decoder.close()
+
+    """
+
+    def __init__(self, path=None, decoder=None):
+        if decoder is None:
+            decoder = JSONDecoder()
+        if path is None:
+            path = ()
+        elif isinstance(path, basestring):
+            if path.endswith('[*]'):
+                path = path[:-3]
+            if path:
+                path = path.split('.')
+            else:
+                path = ()
+        self.path = tuple(path)
+        self.decoder = decoder
+        self._buffer = ''
+        # Where the next token (or the value being scanned) starts.
+        self._pos = 0
+        # The number of keys of path which lead to the current value.
+        self._level = 0
+        self._state = _VALUE
+        self._key = None
+        # [depth, position, in_string] while looking for the end of a value
+        # which continues in the next chunk.
+        self._scan = None
+
+    def feed(self, chunk):
+        """Add the next chunk of the document and return a list of the
+        array items which it completed.
+
+        """
+        if self._pos:
+            self._buffer = self._buffer[self._pos:] + chunk
+            if self._scan is not None:
+                self._scan[1] -= self._pos
+            self._pos = 0
+        else:
+            self._buffer += chunk
+        items = []
+        self._run(items)
+        return items
+
+    def close(self):
+        """Check that the whole document has been fed to the decoder.
+
+        """
+        if self._state != _DONE:
+            raise JSONDecodeError("Unexpected end of document",
+                self._buffer, len(self._buffer))
+
+    def iterdecode(self, chunks):
+        """Feed each of the *chunks* to the decoder and yield the array
+        items as they are completed.
+
+        """
+        for chunk in chunks:
+            for item in self.feed(chunk):
+                yield item
+        self.close()
+
+    def _run(self, items, _w=WHITESPACE.match):
+        s = self._buffer
+        n = len(s)
+        pos = self._pos
+        path = self.path
+        while True:
+            state = self._state
+            if self._scan is None:
+                pos = _w(s, pos).end()
+                if pos == n:
+                    break
+                nextchar = s[pos]
+            if state == _ITEM:
+                if self._scan is None:
+                    # Most items are complete in the buffer, so try them
+                    # before scanning for the end of the item.
+                    try:
+                        value, end = self.decoder.scan_once(s, pos)
+                    except (StopIteration, ValueError):
+                        end = n
+                    if end < n and SCALAR_END.match(s, end):
+                        items.append(value)
+                        pos = end
+                        self._state = _ITEM_NEXT
+                        continue
+                if self._find_end(s, pos) < 0:
+                    break
+                try:
+                    value, end = self.decoder.scan_once(s, pos)
+                except StopIteration:
+                    raise JSONDecodeError("Expecting object", s, pos)
+                items.append(value)
+                pos = end
+                self._state = _ITEM_NEXT
+            elif state == _ITEM_NEXT:
+                if nextchar == ',':
+                    self._state = _ITEM
+                elif nextchar == ']':
+                    self._close()
+                else:
+                    raise JSONDecodeError("Expecting , delimiter", s, pos)
+                pos += 1
+            elif state == _SKIP:
+                end = self._find_end(s, pos)
+                if end < 0:
+                    # Nothing before the scan position is needed again, so
+                    # let feed() drop it rather than keep the whole value.
+                    pos = self._scan[1]
+                    break
+                pos = end
+                self._state = _MEMBER_NEXT
+            elif state == _KEY or state == _KEY_FIRST:
+                if nextchar == '}' and state == _KEY_FIRST:
+                    self._close()
+                    pos += 1
+                    continue
+                if nextchar != '"':
+                    raise JSONDecodeError("Expecting property name", s, pos)
+                end = STRING_BODY.match(s, pos + 1).end()
+                if end == n or s[end] != '"':
+                    break
+                self._key, pos = self.decoder.parse_string(s, pos + 1,
+                    self.decoder.encoding, self.decoder.strict)
+                self._state = _COLON
+            elif state == _COLON:
+                if nextchar != ':':
+                    raise JSONDecodeError("Expecting : delimiter", s, pos)
+                pos += 1
+                if self._key == path[self._level]:
+                    self._level += 1
+                    self._state = _VALUE
+                else:
+                    self._state = _SKIP
+            elif state == _MEMBER_NEXT:
+                if nextchar == ',':
+                    self._state = _KEY
+                elif nextchar == '}':
+                    self._close()
+                else:
+                    raise JSONDecodeError("Expecting , delimiter", s, pos)
+                pos += 1
+            elif state == _ITEM_FIRST:
+                if nextchar == ']':
+                    self._close()
+                    pos += 1
+                else:
+                    self._state = _ITEM
+            elif state == _VALUE:
+                if self._level == len(path):
+                    if nextchar != '[':
+                        raise JSONDecodeError("Expecting array", s, pos)
+                    self._state = _ITEM_FIRST
+                else:
+                    if nextchar != '{':
+                        raise JSONDecodeError("Expecting object", s, pos)
+                    self._state = _KEY_FIRST
+                pos += 1
+            else:
+                raise JSONDecodeError("Extra data", s, pos, n)
+        self._pos = pos
+
+    def _close(self):
+        # Called when the array or an object on the path ends.
+        if self._level == 0:
+            self._state = _DONE
+        else:
+            self._level -= 1
+            self._state = _MEMBER_NEXT
+
+    def _find_end(self, s, start):
+        """Return the index after the value which starts at *start*, or -1
+        if it continues past the end of *s*.
+
+        """
+        n = len(s)
+        if self._scan is None:
+            nextchar = s[start]
+            if nextchar == '{' or nextchar == '[':
+                self._scan = [1, start + 1, False]
+            elif nextchar == '"':
+                self._scan = [0, start + 1, True]
+            else:
+                self._scan = [0, start, False]
+        depth, pos, in_string = self._scan
+        if depth == 0 and not in_string:
+            # Numbers and constants end at the next delimiter.
+            m = SCALAR_END.search(s, pos)
+            if m is None:
+                self._scan[1] = n
+                return -1
+            self._scan = None
+            return m.start()
+        while True:
+            if in_string:
+                pos = STRING_BODY.match(s, pos).end()
+                if pos == n or s[pos] != '"':
+                    # Stopped at the end of the chunk, possibly on a
+                    # backslash whose escaped character is still to come.
+                    self._scan = [depth, pos, True]
+                    return -1
+                pos += 1
+                in_string = False
+                if depth == 0:
+                    break
+            m = STRUCTURE.search(s, pos)
+            if m is None:
+                self._scan = [depth, n, False]
+                return -1
+            pos = m.end()
+            nextchar = m.group()
+            if nextchar == '"':
+                in_string = True
+            elif nextchar == '{' or nextchar == '[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    break
+        self._scan = None
+        return pos
@@ -0,0 +1,112 @@
+import decimal
+from unittest import TestCase
+from StringIO import StringIO
+
+import simplejson as json
+from simplejson import JSONStreamDecoder
+
+FEED = r'''{"version": "1.0", "encoding": "UTF-8", "feed": {
+    "title": {"$t": "a [feed] with {brackets}"},
+    "link": [{"rel": "next", "href": "http://x/?q=\"]}"}, 12.5e3, null],
+    "entry": [
+        {"id": {"$t": "1"}, "title": {"$t": "esc\\aped \"quotes\" \\"}},
+        {"id": {"$t": "2"}, "tags": ["a", "b", []], "n": -1.25e-2},
+        "string item with ] and }",
+        12345.678,
+        true,
+        [1, [2, [3]]],
+        {}
+    ],
+    "openSearch$totalResults": {"$t": 7}
+}}'''
+
+
+class TestStream(TestCase):
+    def decode_in_chunks(self, document, size, path):
+        decoder = JSONStreamDecoder(path)
+        items = []
+        for i in range(0, len(document), size):
+            items.extend(decoder.feed(document[i:i + size]))
+        decoder.close()
+        return items
+
+    def test_chunk_sizes(self):
+        expected = json.loads(FEED)['feed']['entry']
+        for size in range(1, 40) + [len(FEED)]:
+            self.assertEqual(
+                self.decode_in_chunks(FEED, size, 'feed.entry'), expected)
+
+    def test_paths(self):
+        self.assertEqual(
+            self.decode_in_chunks(FEED, 7, 'feed.entry[*]'),
+            json.loads(FEED)['feed']['entry'])
+        self.assertEqual(
+            self.decode_in_chunks(FEED, 7, ['feed', 'link']),
+            json.loads(FEED)['feed']['link'])
+        self.assertEqual(self.decode_in_chunks('[1, 2]', 1, None), [1, 2])
+        self.assertEqual(self.decode_in_chunks(' [ ] ', 1, ''), [])
+        self.assertEqual(self.decode_in_chunks('{"a": []}', 1, 'a'), [])
+
+    def test_missing_path(self):
+        decoder = JSONStreamDecoder('feed.missing')
+        self.assertEqual(decoder.feed(FEED), [])
+        decoder.close()
+
+    def test_split_number(self):
+        decoder = JSONStreamDecoder()
+        self.assertEqual(decoder.feed('[1.'), [])
+        self.assertEqual(decoder.feed('5, 2'), [1.5])
+        self.assertEqual(decoder.feed('0]'), [20])
+        decoder.close()
+
+    def test_skipped_value_is_not_buffered(self):
+        decoder = JSONStreamDecoder('entry')
+        decoder.feed('{"other": {"text": "')
+        for i in range(1000):
+            decoder.feed('a long skipped value, ' * 10)
+            self.assertTrue(len(decoder._buffer) < 1000)
+        decoder.feed('"}, "entry": [1, 2]}')
+        decoder.close()
+        decoder = JSONStreamDecoder('entry')
+        self.assertEqual(decoder.feed('{"other": [1, 2' + ', 3' * 1000), [])
+        self.assertEqual(decoder.feed(', 3'), [])
+        self.assertTrue(len(decoder._buffer) < 10)
+        self.assertEqual(decoder.feed('], "entry": [4]}'), [4])
+        decoder.close()
+
+    def test_unicode(self):
+        document = u'{"items": ["\xe9t\xe9", {"\u1234": "\\u00e9"}]}'
+        expected = [u'\xe9t\xe9', {u'\u1234': u'\xe9'}]
+        self.assertEqual(self.decode_in_chunks(document, 3, 'items'),
+                         expected)
+        # Multibyte characters may be split between chunks.
+        self.assertEqual(
+            self.decode_in_chunks(document.encode('utf-8'), 1, 'items'),
+            expected)
+
+    def test_iterload(self):
+        items = json.iterload(StringIO(FEED), 'feed.entry', chunk_size=5)
+        self.assertEqual(list(items), json.loads(FEED)['feed']['entry'])
+        items = json.iterload(StringIO('[1.1, {"a": 2.5}]'), use_decimal=True)
+        self.assertEqual(list(items),
+                         [decimal.Decimal('1.1'), {'a': decimal.Decimal('2.5')}])
+
+    def test_truncated(self):
+        decoder = JSONStreamDecoder('feed.entry')
+        decoder.feed(FEED[:-10])
+        self.assertRaises(json.JSONDecodeError, decoder.close)
+        self.assertRaises(json.JSONDecodeError,
+                          list, json.iterload(StringIO('[1, 2'), chunk_size=1))
+
+    def test_errors(self):
+        for document, path in [
+                ('{"feed": 1}', 'feed'),
+                ('[]', 'feed'),
+                ('{"feed": [1 2]}', 'feed'),
+                ('{"feed": [{"a" 1}]}', 'feed'),
+                ('{"feed": [], "a" 1}', 'feed'),
+                ('{"feed": []} []', 'feed'),
+                ('{1: []}', 'feed')]:
+            for size in (1, len(document)):
+                self.assertRaises(json.JSONDecodeError,
+                                  self.decode_in_chunks, document, size, path)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for gdata.analytics.columns and AnalyticsClient.get_data_table.
+
+Run from the application directory with:
+  PYTHONPATH=. python tests/gdata_tests/analytics/columns_test.py
+"""
+
+
+import unittest
+
+import atom.core
+import atom.http_core
+import atom.mock_http_core
+import atom.tracing
+import gdata.analytics.client
+import gdata.analytics.columns
+import gdata.analytics.data
+
+
+DATA_FEED = """<?xml version='1.0' encoding='UTF-8'?>
+<feed xmlns='http://www.w3.org/2005/Atom'
+    xmlns:dxp='http://schemas.google.com/analytics/2009'>
+  <id>http://www.google.com/analytics/feeds/data</id>
+  <updated>2011-03-01T00:00:00.000-08:00</updated>
+  <title>Google Analytics Data</title>
+  <dxp:aggregates>
+    <dxp:metric name='ga:visits' type='integer' value='16'/>
+    <dxp:metric name='ga:pageviews' type='integer' value='40'/>
+  </dxp:aggregates>
+  <entry>
+    <id>http://www.google.com/analytics/feeds/data?row=1</id>
+    <updated>2011-03-01T00:00:00.000-08:00</updated>
+    <title>ga:source=google | ga:date=20110301</title>
+    <dxp:dimension name='ga:source' value='google'/>
+    <dxp:dimension name='ga:date' value='20110301'/>
+    <dxp:metric name='ga:visits' type='integer' value='4'/>
+    <dxp:metric name='ga:pageviews' type='integer' value='10'/>
+  </entry>
+  <entry>
+    <id>http://www.google.com/analytics/feeds/data?row=2</id>
+    <updated>2011-03-01T00:00:00.000-08:00</updated>
+    <title>ga:source=twitter | ga:date=20110301</title>
+    <dxp:dimension name='ga:source' value='twitter'/>
+    <dxp:dimension name='ga:date' value='20110301'/>
+    <dxp:metric name='ga:visits' type='integer' value='0'/>
+    <dxp:metric name='ga:pageviews' type='integer' value='0'/>
+  </entry>
+  <entry>
+    <id>http://www.google.com/analytics/feeds/data?row=3</id>
+    <updated>2011-03-02T00:00:00.000-08:00</updated>
+    <title>ga:source=google | ga:date=20110302</title>
+    <dxp:dimension name='ga:source' value='google'/>
+    <dxp:dimension name='ga:date' value='20110302'/>
+    <dxp:metric name='ga:visits' type='integer' value='12'/>
+    <dxp:metric name='ga:pageviews' type='integer' value='30'/>
+  </entry>
+</feed>"""
+
+DATA_FEED_URI = 'https://www.google.com/analytics/feeds/data?ids=ga:1234'
+
+
+class DataTableTest(unittest.TestCase):
+
+  def setUp(self):
+    self.table = gdata.analytics.columns.DataTable.parse(DATA_FEED)
+
+  def testParse(self):
+    self.assertEqual(self.table.dimension_names, ['ga:source', 'ga:date'])
+    self.assertEqual(self.table.metric_names, ['ga:visits', 'ga:pageviews'])
+    self.assertEqual(len(self.table), 3)
+    self.assertEqual(list(self.table.column('ga:visits')), [4.0, 0.0, 12.0])
+    sources = self.table.column('ga:source')
+    self.assertEqual(sources, ['google', 'twitter', 'google'])
+    self.assert_(sources[0] is sources[2])
+
+  def testFromFeedMatchesParse(self):
+    feed = atom.core.parse(DATA_FEED, gdata.analytics.data.DataFeed)
+    table = gdata.analytics.columns.DataTable.from_feed(feed)
+    self.assertEqual(list(table.rows()), list(self.table.rows()))
+
+  def testAddRatio(self):
+    self.table.add_ratio('pagesPerVisit', 'ga:pageviews', 'ga:visits')
+    self.assertEqual(list(self.table.column('pagesPerVisit')),
+                     [2.5, 0.0, 2.5])
+    self.assertEqual(self.table.metric_names[-1], 'pagesPerVisit')
+
+  def testGroupBy(self):
+    grouped = self.table.group_by('ga:source')
+    self.assertEqual(list(grouped.rows()),
+                     [('google', 16.0, 40.0), ('twitter', 0.0, 0.0)])
+    self.assertEqual(list(self.table.group_by().rows()), [(16.0, 40.0)])
+    self.assertEqual(self.table.sum('ga:pageviews'), 40.0)
+
+  def testConcat(self):
+    joined = gdata.analytics.columns.DataTable.concat(
+        [self.table, gdata.analytics.columns.DataTable.parse(DATA_FEED)])
+    self.assertEqual(len(joined), 6)
+    self.assertEqual(list(joined.rows())[3:], list(self.table.rows()))
+    self.assertRaises(ValueError, joined.extend,
+                      self.table.group_by('ga:source'))
+
+  def testEmptyFeed(self):
+    start = DATA_FEED.index('  <entry>')
+    end = DATA_FEED.rindex('</entry>') + len('</entry>')
+    table = gdata.analytics.columns.DataTable.parse(
+        DATA_FEED[:start] + DATA_FEED[end:])
+    self.assertEqual(len(table), 0)
+    self.assertEqual(table.metric_names, ['ga:visits', 'ga:pageviews'])
+
+
+class GetDataTableTest(unittest.TestCase):
+
+  def setUp(self):
+    http_client = atom.mock_http_core.MockHttpClient()
+    http_client.add_response(
+        atom.http_core.HttpRequest(
+            uri=atom.http_core.Uri.parse_uri(DATA_FEED_URI), method='GET'),
+        200, 'OK', {'Content-Type': 'application/atom+xml'}, DATA_FEED)
+    self.client = gdata.analytics.client.AnalyticsClient(
+        http_client=http_client)
+
+  def testGetDataTable(self):
+    table = self.client.get_data_table(DATA_FEED_URI)
+    self.assertEqual(len(table), 3)
+    self.assertEqual(list(table.column('ga:pageviews')), [10.0, 0.0, 30.0])
+    # A recorded response can be replayed again.
+    self.assertEqual(len(self.client.GetDataTable(DATA_FEED_URI)), 3)
+
+  def testGetDataTableTraced(self):
+    tracer = atom.tracing.HistogramTracer()
+    self.client.tracer = tracer
+    table = self.client.get_data_table(DATA_FEED_URI)
+    self.assertEqual(len(table), 3)
+    self.assertEqual(tracer.requests, 1)
+    self.assertEqual(tracer.response_bytes, len(DATA_FEED))
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(DataTableTest, 'test'),
+                             unittest.makeSuite(GetDataTableTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the partial response support of gdata.service.
+
+Run from the application directory with:
+  PYTHONPATH=. python tests/gdata_tests/service_test.py
+"""
+
+
+import unittest
+
+import gdata
+import gdata.service
+import gdata.youtube
+
+
+VIDEO_FEED = """<?xml version='1.0' encoding='UTF-8'?>
+<feed xmlns='http://www.w3.org/2005/Atom'
+    xmlns:openSearch='%s'
+    xmlns:media='http://search.yahoo.com/mrss/'>
+  <id>http://gdata.youtube.com/feeds/api/standardfeeds/top_rated</id>
+  <title type='text'>Top Rated</title>
+  <openSearch:totalResults>100</openSearch:totalResults>
+  <openSearch:startIndex>1</openSearch:startIndex>
+  <entry>
+    <id>http://gdata.youtube.com/feeds/api/videos/abc</id>
+    <title type='text'>A video</title>
+    <media:group>
+      <media:title type='plain'>A video</media:title>
+    </media:group>
+  </entry>
+</feed>"""
+
+FIELDS = 'entry(id,title),openSearch:totalResults'
+
+
+class SparseConverterTest(unittest.TestCase):
+
+  def convert(self, opensearch_namespace):
+    converter = gdata.service.SparseConverter(
+        gdata.youtube.YouTubeVideoFeed, FIELDS)
+    return converter(VIDEO_FEED % opensearch_namespace)
+
+  def testVersion1Feed(self):
+    feed = self.convert(gdata.OPENSEARCH_NAMESPACE)
+    self.assertEqual(feed.total_results.text, '100')
+    self.assertEqual(feed.start_index, None)
+    self.assertEqual(feed.title, None)
+    self.assertEqual(len(feed.entry), 1)
+    self.assertEqual(feed.entry[0].title.text, 'A video')
+    self.assertEqual(feed.entry[0].media.title, None)
+
+  def testVersion2Feed(self):
+    feed = self.convert('http://a9.com/-/spec/opensearch/1.1/')
+    self.assertEqual(
+        [element.tag for element in feed.extension_elements],
+        ['totalResults'])
+    self.assertEqual(feed.entry[0].id.text,
+                     'http://gdata.youtube.com/feeds/api/videos/abc')
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(SparseConverterTest, 'test'),))
+
+
+if __name__ == '__main__':
+  unittest.main()